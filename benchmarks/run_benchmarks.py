@@ -0,0 +1,323 @@
+"""热路径基准测试（合成 500 交易对行情，结果可复现）。
+
+用法：
+    python benchmarks/run_benchmarks.py                      # 运行并与 baseline.json 比较
+    python benchmarks/run_benchmarks.py --save-baseline      # 以本次结果覆盖基线
+    python benchmarks/run_benchmarks.py --only ema_update,ws_parse --tolerance 0.3
+
+每个阶段重复 repeat 次、每次调用 number 次，输出 ops/s（按单次耗时的 10% 分位换算）与 p50/p99（微秒）；
+每次计时后紧接着计时一次固定的参考负载，以“阶段 ops/s ÷ 同期参考负载 ops/s”作为与机器快慢无关的相对速度；
+全部阶段按轮次交替运行 rounds 轮取中位数，与基线的相对速度比较，任一阶段低于基线 (1 - tolerance - 该阶段抖动) 倍时
+以退出码 1 结束；抖动取本次与基线各轮相对速度的四分位距（占中位数比例）中较大者，抖动大的阶段门限相应放宽。
+REPORT_ONLY 中的阶段（受磁盘与线程调度影响）只报告不判定。
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import gc
+import io
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+
+from benchmarks.synthetic import SyntheticClient, SyntheticMarket  # noqa: E402
+from realtime_monitor.close_ring import CloseRing  # noqa: E402
+from realtime_monitor.console import print_boards_side_by_side  # noqa: E402
+from realtime_monitor.ema import EMA, EMASet, detect_cross  # noqa: E402
+from realtime_monitor.events import EventWriter  # noqa: E402
+from realtime_monitor.monitor import SymbolMonitor  # noqa: E402
+from realtime_monitor.symbols import RankBoard, rank_top, secondary_sort_by_delta  # noqa: E402
+from realtime_monitor.ws_client import parse_kline_message  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+N_SYMBOLS = 500
+SEED_MINUTE = 700  # seed 用前 700 根，之后逐分钟推进
+EVENT_BATCH = 500
+# 只报告、不参与回退判定的阶段
+REPORT_ONLY = {"event_writer_drain_500"}
+
+
+def _reference() -> float:
+    """固定的参考负载（纯 Python 浮点循环），其速度反映当前机器/负载下的整体快慢。"""
+    x = 0.0
+    for i in range(1000):
+        x = x * 0.999 + i
+    return x
+
+
+def _measure(fn: Callable[[], Any], *, number: int, repeat: int) -> Dict[str, float]:
+    fn()  # 预热
+    samples: List[float] = []
+    ref: List[float] = []
+    # 与 timeit 相同：计时期间关闭 GC，避免前面阶段留下的垃圾在任意阶段触发回收
+    gc.collect()
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            for _ in range(number):
+                fn()
+            t1 = time.perf_counter()
+            # 每个样本后紧跟一次参考负载：两者处在同一时间窗，机器忽快忽慢时同涨同落
+            _reference()
+            _reference()
+            ref.append((time.perf_counter() - t1) / 2)
+            samples.append((t1 - t0) / number)
+    finally:
+        if enabled:
+            gc.enable()
+    arr = np.array(samples)
+    # 以较快的 10% 分位耗时换算 ops/s：受其他进程/调度抖动影响最小，适合做回归比较
+    p10 = float(np.percentile(arr, 10))
+    ref_p10 = float(np.percentile(ref, 10))
+    return {
+        "ops_per_sec": 1.0 / p10 if p10 > 0 else 0.0,
+        "p50_us": float(np.percentile(arr, 50) * 1e6),
+        "p99_us": float(np.percentile(arr, 99) * 1e6),
+        "reference_ops": 1.0 / ref_p10 if ref_p10 > 0 else 0.0,
+        # 相对速度：阶段 ops/s ÷ 同期参考负载 ops/s
+        "relative": ref_p10 / p10 if p10 > 0 else 0.0,
+    }
+
+
+def _measure_async(loop: asyncio.AbstractEventLoop, make: Callable[[], Any], *, number: int, repeat: int) -> Dict[str, float]:
+    return _measure(lambda: loop.run_until_complete(make()), number=number, repeat=repeat)
+
+
+def build_stages(market: SyntheticMarket, tmpdir: str) -> Dict[str, Callable[[], Dict[str, float]]]:
+    closes = market.data[:, :, 4]
+    sym0 = market.symbols[0]
+    seed_closes = closes[0, :600].tolist()
+    stages: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+    def ema_update() -> Dict[str, float]:
+        ema = EMA(21)
+        ema.seed(seed_closes)
+        it = itertools.cycle(closes[1].tolist())
+        return _measure(lambda: ema.update(next(it)), number=2000, repeat=200)
+
+    def emaset_seed() -> Dict[str, float]:
+        return _measure(lambda: EMASet.create_seeded(seed_closes), number=20, repeat=100)
+
+    def detect_cross_stage() -> Dict[str, float]:
+        es = EMASet.create_seeded(seed_closes)
+        snaps = [es.snapshot()]
+        for c in closes[0, 600:].tolist():
+            snaps.append(es.update(c))
+        pairs = list(zip(snaps[:-1], snaps[1:]))
+        it = itertools.cycle(pairs)
+        return _measure(lambda: detect_cross(*next(it)), number=2000, repeat=200)
+
+    loop = asyncio.new_event_loop()
+
+    def _monitor() -> tuple:
+        client = SyntheticClient(market, now_minute=SEED_MINUTE)
+        mon = SymbolMonitor(client, seed_limit=600)  # type: ignore[arg-type]
+        loop.run_until_complete(mon.ensure_states(market.symbols))
+        return client, mon
+
+    def update_many() -> Dict[str, float]:
+        # 每次调用推进 1 分钟：500 个交易对各取最新收盘K线并推进 EMA/信号判断
+        client, mon = _monitor()
+        client.now_minute += 1  # seed 时已包含当前分钟
+
+        async def step():
+            client.now_minute += 1
+            await mon.update_many(market.symbols)
+
+        return _measure_async(loop, step, number=1, repeat=min(200, market.minutes - client.now_minute - 2))
+
+    def multi_change_map() -> Dict[str, float]:
+        _, mon = _monitor()
+        return _measure(lambda: mon.multi_change_map(market.symbols, [1, 5, 15]), number=10, repeat=100)
+
+    def close_ring_change_map() -> Dict[str, float]:
+        # 共享环形缓冲：500 个交易对 × 5 个窗口（含 4h）一次向量化取数。
+        # 只测长窗口的取数开销；1/5/15 窗口下并不比逐个 deque 快（对比 multi_change_map_500），
+        # 实际运行中的收益来自只对榜单上的交易对计算
+        client = SyntheticClient(market, now_minute=SEED_MINUTE)
+        mon = SymbolMonitor(client, seed_limit=600, close_ring=CloseRing(history=241, capacity=N_SYMBOLS))  # type: ignore[arg-type]
+        loop.run_until_complete(mon.ensure_states(market.symbols))
+        return _measure(lambda: mon.multi_change_map(market.symbols, [1, 5, 15, 60, 240]), number=10, repeat=100)
+
+    prices = market.prices(SEED_MINUTE)
+    baselines = market.baselines()
+    delta = {s: float(d) for s, d in zip(market.symbols, closes[:, SEED_MINUTE] / closes[:, SEED_MINUTE - 1] * 100 - 100)}
+
+    def rank_and_sort() -> Dict[str, float]:
+        def run():
+            g, l = rank_top(market.symbols, baselines, prices, topn=50)
+            secondary_sort_by_delta(g, delta, mode="gainers")
+            secondary_sort_by_delta(l, delta, mode="losers")
+        return _measure(run, number=10, repeat=100)
+
+    def rank_board_update() -> Dict[str, float]:
+        # 增量排名：每次 ticker 推送约 50 个交易对变价后取前/后 50
+        board = RankBoard(baselines)
+        board.update_prices(prices)
+        batches = [market.prices(m) for m in range(SEED_MINUTE + 1, SEED_MINUTE + 21)]
+        updates = itertools.cycle([{s: b[s] for s in market.symbols[i % 10::10]} for i, b in enumerate(batches)])
+
+        def run():
+            board.update_prices(next(updates))
+            board.top(50)
+            board.bottom(50)
+        return _measure(run, number=10, repeat=100)
+
+    def render_boards() -> Dict[str, float]:
+        g, l = rank_top(market.symbols, baselines, prices, topn=50)
+        dm = {s: {1: d, 5: d * 2, 15: d * 3} for s, d in delta.items()}
+        sink = io.StringIO()
+
+        def run():
+            sink.seek(0)
+            sink.truncate()
+            with contextlib.redirect_stdout(sink):
+                print_boards_side_by_side("涨幅榜 Top 50", g, "跌幅榜 Top 50", l, delta_maps=dm, windows=[1, 5, 15], highlight_threshold=1.0)
+        return _measure(run, number=5, repeat=100)
+
+    ev = {
+        "symbol": sym0, "kind": "signal", "direction": "up", "open_time": market.open_time(SEED_MINUTE),
+        "price": 1.0, "ema21": 1.0, "high": 1.0, "low": 1.0, "quote_volume": 1.0, "confirm_candles": 5, "message": "bench",
+    }
+
+    def event_submit() -> Dict[str, float]:
+        # 事件循环一侧的开销：EventWriter.submit 入队（写线程同时在后台落盘）
+        writer = EventWriter(os.path.join(tmpdir, "events-submit"), max_queue=1_000_000).start()
+        try:
+            return _measure(lambda: writer.submit(ev), number=100, repeat=200)
+        finally:
+            writer.close()
+
+    def event_writer_drain() -> Dict[str, float]:
+        # 写线程吞吐：一批 EVENT_BATCH 个事件入队后启动写线程，到全部写完并关闭文件
+        d = os.path.join(tmpdir, "events-drain")
+
+        def run():
+            writer = EventWriter(d, max_queue=EVENT_BATCH + 1)
+            for _ in range(EVENT_BATCH):
+                writer.submit(ev)
+            writer.start().close()
+        return _measure(run, number=1, repeat=30)
+
+    def ws_parse() -> Dict[str, float]:
+        msgs = market.ws_messages(SEED_MINUTE)
+        it = itertools.cycle(msgs)
+        return _measure(lambda: parse_kline_message(next(it)), number=100, repeat=200)
+
+    stages["ema_update"] = ema_update
+    stages["emaset_seed"] = emaset_seed
+    stages["detect_cross"] = detect_cross_stage
+    stages["update_many_500"] = update_many
+    stages["multi_change_map_500"] = multi_change_map
+    stages["close_ring_change_map_500"] = close_ring_change_map
+    stages["rank_top_sort_500"] = rank_and_sort
+    stages["rank_board_update_500"] = rank_board_update
+    stages["render_boards"] = render_boards
+    stages["event_submit"] = event_submit
+    stages["event_writer_drain_500"] = event_writer_drain
+    stages["ws_parse"] = ws_parse
+    return stages
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """按相对速度（阶段 ops/s ÷ 同期参考负载 ops/s）与基线比较，抵消机器整体快慢（降频、邻居负载）的影响。
+
+    每个阶段的门限再放宽其轮间抖动（本次与基线中较大者）。
+    """
+    regressions: List[str] = []
+    base = baseline.get("results", {})
+    for name, r in results.items():
+        b = base.get(name)
+        if not b or not b.get("relative"):
+            continue
+        ratio = r["relative"] / b["relative"]
+        r["vs_baseline"] = ratio
+        if name in REPORT_ONLY:
+            continue
+        if ratio < 1.0 - tolerance - max(r.get("spread", 0.0), b.get("spread", 0.0)):
+            regressions.append(f"{name}: {r['ops_per_sec']:.0f} ops/s，基线 {b['ops_per_sec']:.0f} ops/s（{ratio:.0%}）")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark hot paths on a synthetic 500-symbol market")
+    parser.add_argument("--only", type=str, default=None, help="Comma-separated stage names to run")
+    parser.add_argument("--baseline", type=str, default=BASELINE_PATH, help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Overwrite the baseline with this run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed ops/s drop vs baseline before failing (default 0.25)")
+    parser.add_argument("--rounds", type=int, default=5, help="Run all stages N times, interleaved, and keep the median (default 5)")
+    parser.add_argument("--json", type=str, default=None, help="Also write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    market = SyntheticMarket(N_SYMBOLS, minutes=1000, seed=42)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        stages = build_stages(market, tmpdir)
+        names = [n.strip() for n in args.only.split(",")] if args.only else list(stages)
+        runs: Dict[str, List[Dict[str, float]]] = {n: [] for n in names}
+        # 各阶段按轮交替运行，较长时间尺度上的速度漂移分散到所有阶段，各项取中位数
+        for _ in range(max(1, args.rounds)):
+            for name in names:
+                runs[name].append(stages[name]())
+        results: Dict[str, Dict[str, float]] = {}
+        for name in names:
+            rs = runs[name]
+            results[name] = {k: float(np.median([r[k] for r in rs])) for k in rs[0]}
+            rel = [r["relative"] for r in rs]
+            # 轮间抖动：相对速度四分位距占中位数的比例（单轮时为 0），比极差更不易被单次离群拉大
+            iqr = float(np.percentile(rel, 75) - np.percentile(rel, 25))
+            results[name]["spread"] = iqr / results[name]["relative"] if results[name]["relative"] else 0.0
+        calibration = float(np.median([r["reference_ops"] for rs in runs.values() for r in rs]))
+
+    baseline: Dict[str, Any] = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance) if baseline else []
+
+    print(f"{'stage':<26} {'ops/s':>12} {'p50(us)':>10} {'p99(us)':>10} {'vs base':>8}")
+    for name, r in results.items():
+        vs = f"{r['vs_baseline']:.0%}" if "vs_baseline" in r else "-"
+        note = "  (report only)" if name in REPORT_ONLY else ""
+        print(f"{name:<26} {r['ops_per_sec']:>12,.0f} {r['p50_us']:>10.1f} {r['p99_us']:>10.1f} {vs:>8}{note}")
+
+    payload = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "numpy": np.__version__,
+        "symbols": N_SYMBOLS,
+        "calibration_ops": calibration,
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2)
+            f.write("\n")
+        print(f"基线已保存：{args.baseline}")
+    if regressions:
+        print("性能回退：")
+        for r in regressions:
+            print("  " + r)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
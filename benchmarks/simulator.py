@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import websockets  # noqa: E402
+
+from benchmarks.synthetic import MINUTE_MS, SyntheticMarket  # noqa: E402
+from realtime_monitor.ratelimit import WEIGHT_LIMIT_1M, request_weight  # noqa: E402
+
+
+@dataclass
+class Faults:
+    """故障注入配置（概率按每个请求独立抽样）。"""
+
+    p418: float = 0.0
+    p429: float = 0.0
+    p302: float = 0.0
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    retry_after: int = 5
+    # 按交易所口径统计每分钟权重，超过时返回 429（0 表示不限制）
+    weight_limit: int = WEIGHT_LIMIT_1M
+    # WS 连接平均存活秒数，到期后服务端主动断开（0 表示不断开）
+    ws_drop_seconds: float = 0.0
+
+
+class SimMarket:
+    """以墙钟分钟为索引的合成行情：history 分钟之前到 horizon 分钟之后都有数据。"""
+
+    def __init__(self, n_symbols: int, *, history: int = 1000, horizon: int = 720, seed: int = 42):
+        now_min = int(time.time() * 1000) // MINUTE_MS * MINUTE_MS
+        self.market = SyntheticMarket(n_symbols, minutes=history + horizon, seed=seed, start_ms=now_min - history * MINUTE_MS)
+        self.symbols = self.market.symbols
+        self._symset = set(self.symbols)
+
+    def has(self, symbol: str) -> bool:
+        return symbol in self._symset
+
+    def minute_index(self, now_ms: Optional[float] = None) -> int:
+        now = time.time() * 1000 if now_ms is None else now_ms
+        idx = (int(now) - self.market.start_ms) // MINUTE_MS
+        return max(0, min(idx, self.market.minutes - 1))
+
+    def klines(self, symbol: str, limit: int, start: Optional[int], end: Optional[int]) -> List[List[Any]]:
+        arr = self.market.array(symbol)[: self.minute_index() + 1]
+        t = arr[:, 0]
+        lo = 0 if start is None else int(t.searchsorted(start, side="left"))
+        hi = len(arr) if end is None else int(t.searchsorted(end, side="right"))
+        arr = arr[lo:hi]
+        arr = arr[:limit] if start is not None else arr[-limit:]
+        return [
+            [int(t), f"{o:.8g}", f"{h:.8g}", f"{l:.8g}", f"{c:.8g}", "0", int(t) + MINUTE_MS - 1, f"{qv:.2f}", 0, "0", "0", "0"]
+            for t, o, h, l, c, qv in arr.tolist()
+        ]
+
+    def price(self, symbol: str) -> float:
+        return float(self.market.array(symbol)[self.minute_index(), 4])
+
+    def kline_event(self, symbol: str, idx: int, closed: bool) -> Dict[str, Any]:
+        t, o, h, l, c, qv = self.market.array(symbol)[idx].tolist()
+        return {
+            "e": "kline",
+            "E": int(time.time() * 1000),
+            "s": symbol,
+            "k": {
+                "t": int(t), "T": int(t) + MINUTE_MS - 1, "s": symbol, "i": "1m",
+                "o": f"{o:.8g}", "c": f"{c:.8g}", "h": f"{h:.8g}", "l": f"{l:.8g}",
+                "v": "0", "q": f"{qv:.2f}", "x": closed,
+            },
+        }
+
+
+class BinanceSimulator:
+    """本地币安U本位 REST + 组合流 WebSocket 模拟器，用于压测与长时间运行测试。
+
+    REST：/fapi/v1/exchangeInfo、/fapi/v1/klines、/fapi/v1/ticker/price、/fapi/v1/time，
+    返回 X-MBX-USED-WEIGHT-1M，可注入 418/429/302 与延迟。
+    WS：/stream?streams=...（kline_1m 与 !miniTicker@arr），支持 SUBSCRIBE/UNSUBSCRIBE，
+    每 tick_ms 推送未收盘K线，分钟切换时推送已收盘K线，可按 ws_drop_seconds 随机断开。
+    """
+
+    def __init__(self, market: SimMarket, faults: Optional[Faults] = None, *, tick_ms: int = 1000):
+        self.market = market
+        self.faults = faults or Faults()
+        self.tick_ms = max(50, int(tick_ms))
+        self._weight_minute = 0
+        self._weight_used = 0
+        self._servers: List[Any] = []
+        # 统计
+        self.requests = 0
+        self.status_counts: Dict[int, int] = {}
+        self.ws_connections = 0
+        self.ws_messages = 0
+        self.ws_drops = 0
+
+    # ---- REST ----
+
+    def _use_weight(self, weight: int) -> int:
+        minute = int(time.time()) // 60
+        if minute != self._weight_minute:
+            self._weight_minute, self._weight_used = minute, 0
+        self._weight_used += weight
+        return self._weight_used
+
+    def _route(self, path: str, q: Dict[str, str]) -> Tuple[int, Any]:
+        if path == "/fapi/v1/time":
+            return 200, {"serverTime": int(time.time() * 1000)}
+        if path == "/fapi/v1/exchangeInfo":
+            return 200, {"symbols": [
+                {"symbol": s, "quoteAsset": "USDT", "contractType": "PERPETUAL", "status": "TRADING"}
+                for s in self.market.symbols
+            ]}
+        if path == "/fapi/v1/ticker/price":
+            sym = q.get("symbol")
+            if sym:
+                if not self.market.has(sym):
+                    return 400, {"code": -1121, "msg": "Invalid symbol."}
+                return 200, {"symbol": sym, "price": f"{self.market.price(sym):.8g}"}
+            return 200, [{"symbol": s, "price": f"{self.market.price(s):.8g}"} for s in self.market.symbols]
+        if path == "/fapi/v1/klines":
+            sym = q.get("symbol", "")
+            if not self.market.has(sym):
+                return 400, {"code": -1121, "msg": "Invalid symbol."}
+            if q.get("interval", "1m") != "1m":
+                return 400, {"code": -1120, "msg": "Invalid interval."}
+            limit = max(1, min(int(q.get("limit", 500)), 1500))
+            start = int(q["startTime"]) if "startTime" in q else None
+            end = int(q["endTime"]) if "endTime" in q else None
+            return 200, self.market.klines(sym, limit, start, end)
+        return 404, {"code": -5000, "msg": "Not found."}
+
+    async def _respond(self, target: str) -> Tuple[int, Dict[str, str], bytes]:
+        f = self.faults
+        if f.latency_ms or f.jitter_ms:
+            await asyncio.sleep(max(0.0, f.latency_ms + random.uniform(-f.jitter_ms, f.jitter_ms)) / 1000.0)
+        parts = urlsplit(target)
+        q = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        used = self._use_weight(request_weight(parts.path, q))
+        headers = {"X-MBX-USED-WEIGHT-1M": str(used)}
+        r = random.random()
+        if r < f.p418:
+            headers["Retry-After"] = str(f.retry_after * 10)
+            return 418, headers, b'{"code":-1003,"msg":"IP banned (simulated)."}'
+        if r < f.p418 + f.p429 or (f.weight_limit and used > f.weight_limit):
+            headers["Retry-After"] = str(f.retry_after)
+            return 429, headers, b'{"code":-1003,"msg":"Too many requests (simulated)."}'
+        if r < f.p418 + f.p429 + f.p302:
+            headers["Location"] = "https://www.binance.com/en/error"
+            return 302, headers, b"<html>redirect</html>"
+        status, body = self._route(parts.path, q)
+        return status, headers, json.dumps(body, separators=(",", ":")).encode()
+
+    async def _handle_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    method, target, _ = line.decode("latin-1").split(" ", 2)
+                except ValueError:
+                    break
+                keep_alive = True
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = h.decode("latin-1").partition(":")
+                    if name.strip().lower() == "connection" and value.strip().lower() == "close":
+                        keep_alive = False
+                self.requests += 1
+                if method != "GET":
+                    status, headers, body = 405, {}, b'{"code":-1,"msg":"Method not allowed."}'
+                else:
+                    status, headers, body = await self._respond(target)
+                self.status_counts[status] = self.status_counts.get(status, 0) + 1
+                ctype = "text/html" if status == 302 else "application/json"
+                head = [f"HTTP/1.1 {status} SIM", f"Content-Type: {ctype}", f"Content-Length: {len(body)}"]
+                head += [f"{k}: {v}" for k, v in headers.items()]
+                head.append("Connection: keep-alive" if keep_alive else "Connection: close")
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    # ---- WebSocket ----
+
+    @staticmethod
+    def _parse_streams(path: str) -> Set[str]:
+        q = parse_qs(urlsplit(path).query)
+        return {s for s in (q.get("streams", [""])[-1]).split("/") if s}
+
+    async def _ws_reader(self, ws, streams: Set[str]) -> None:
+        async for raw in ws:
+            try:
+                msg = json.loads(raw)
+            except ValueError:
+                continue
+            method, params = msg.get("method"), msg.get("params") or []
+            if method == "SUBSCRIBE":
+                streams.update(params)
+            elif method == "UNSUBSCRIBE":
+                streams.difference_update(params)
+            await ws.send(json.dumps({"result": None, "id": msg.get("id")}))
+
+    async def _handle_ws(self, ws, path: Optional[str] = None) -> None:
+        if path is None:
+            req = getattr(ws, "request", None)
+            path = req.path if req is not None else getattr(ws, "path", "")
+        streams = self._parse_streams(path or "")
+        self.ws_connections += 1
+        reader = asyncio.create_task(self._ws_reader(ws, streams))
+        drop_at = None
+        if self.faults.ws_drop_seconds > 0:
+            drop_at = time.monotonic() + random.expovariate(1.0 / self.faults.ws_drop_seconds)
+        last_idx = self.market.minute_index()
+        last_ticker = 0.0
+        try:
+            while not reader.done():
+                await asyncio.sleep(self.tick_ms / 1000.0)
+                if drop_at is not None and time.monotonic() >= drop_at:
+                    self.ws_drops += 1
+                    await ws.close(code=1001, reason="simulated disconnect")
+                    break
+                idx = self.market.minute_index()
+                for stream in list(streams):
+                    if stream == "!miniTicker@arr":
+                        if time.monotonic() - last_ticker < 1.0:
+                            continue
+                        last_ticker = time.monotonic()
+                        E = int(time.time() * 1000)
+                        data: Any = [{"e": "24hrMiniTicker", "E": E, "s": s, "c": f"{self.market.price(s):.8g}"} for s in self.market.symbols]
+                    else:
+                        sym = stream.split("@", 1)[0].upper()
+                        if not self.market.has(sym):
+                            continue
+                        if idx != last_idx:
+                            # 分钟切换：先推送上一分钟的已收盘K线
+                            await ws.send(json.dumps({"stream": stream, "data": self.market.kline_event(sym, last_idx, True)}))
+                            self.ws_messages += 1
+                        data = self.market.kline_event(sym, idx, False)
+                    await ws.send(json.dumps({"stream": stream, "data": data}))
+                    self.ws_messages += 1
+                last_idx = idx
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            reader.cancel()
+
+    # ---- 生命周期 ----
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080, ws_port: int = 8081) -> None:
+        self._servers.append(await asyncio.start_server(self._handle_http, host, port))
+        self._servers.append(await websockets.serve(self._handle_ws, host, ws_port, max_size=None))
+
+    async def stop(self) -> None:
+        for srv in self._servers:
+            srv.close()
+            await srv.wait_closed()
+        self._servers.clear()
+
+    def stats(self) -> str:
+        codes = " ".join(f"{k}:{v}" for k, v in sorted(self.status_counts.items()))
+        return (
+            f"[sim] REST 请求{self.requests} ({codes}) 权重{self._weight_used}/min | "
+            f"WS 连接{self.ws_connections} 消息{self.ws_messages} 断开{self.ws_drops}"
+        )
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    market = SimMarket(args.symbols, history=args.history_minutes, horizon=args.horizon_minutes, seed=args.seed)
+    faults = Faults(
+        p418=args.p418,
+        p429=args.p429,
+        p302=args.p302,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        retry_after=args.retry_after,
+        weight_limit=args.weight_limit,
+        ws_drop_seconds=args.ws_drop_seconds,
+    )
+    sim = BinanceSimulator(market, faults, tick_ms=args.tick_ms)
+    await sim.start(args.host, args.port, args.ws_port)
+    print(f"模拟器已启动：{len(market.symbols)} 个交易对")
+    print(f"  BINANCE_BASE_URLS=http://{args.host}:{args.port}")
+    print(f"  BINANCE_WS_URL=ws://{args.host}:{args.ws_port}")
+    try:
+        while True:
+            await asyncio.sleep(args.stats_every)
+            print(sim.stats())
+    finally:
+        await sim.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Local Binance USDT-M REST + WebSocket simulator")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080, help="REST port (default 8080)")
+    parser.add_argument("--ws-port", type=int, default=8081, help="WebSocket port (default 8081)")
+    parser.add_argument("--symbols", type=int, default=500, help="Number of synthetic USDT perpetual symbols")
+    parser.add_argument("--history-minutes", type=int, default=1000, help="Minutes of kline history before now")
+    parser.add_argument("--horizon-minutes", type=int, default=720, help="Minutes of klines generated after start (run length)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tick-ms", type=int, default=1000, help="WS push interval per stream in ms")
+    parser.add_argument("--p418", type=float, default=0.0, help="Probability of a 418 response per request")
+    parser.add_argument("--p429", type=float, default=0.0, help="Probability of a 429 response per request")
+    parser.add_argument("--p302", type=float, default=0.0, help="Probability of a 302 redirect per request")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added REST latency in ms")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +/- jitter on the added latency")
+    parser.add_argument("--retry-after", type=int, default=5, help="Retry-After seconds on 429 (x10 on 418)")
+    parser.add_argument("--weight-limit", type=int, default=WEIGHT_LIMIT_1M, help="Per-minute request weight before 429 (0 = unlimited)")
+    parser.add_argument("--ws-drop-seconds", type=float, default=0.0, help="Mean WS connection lifetime before a forced disconnect (0 = never)")
+    parser.add_argument("--stats-every", type=float, default=10.0, help="Print server stats every N seconds")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+MINUTE_MS = 60_000
+
+
+class SyntheticMarket:
+    """确定性的合成行情：n 个交易对的 1m K线（同一 seed 结果完全一致）。
+
+    收盘价为带趋势切换的对数随机游走，趋势每隔数十分钟随机翻转，保证 EMA 交叉与
+    确认窗口逻辑有足够多的触发；高低价、成交额由同一随机源派生。
+    数组列与 klines_to_array 一致：openTime, open, high, low, close, quoteVolume。
+    """
+
+    def __init__(self, n_symbols: int = 500, minutes: int = 1500, *, seed: int = 42, start_ms: int = 1_767_225_600_000):
+        rng = np.random.default_rng(seed)
+        self.symbols: List[str] = [f"SYN{i:03d}USDT" for i in range(n_symbols)]
+        self.start_ms = int(start_ms) // MINUTE_MS * MINUTE_MS
+        self.minutes = int(minutes)
+
+        vol = rng.uniform(0.001, 0.006, size=(n_symbols, 1))
+        regime_len = rng.integers(20, 120, size=(n_symbols, 1))
+        steps = np.arange(minutes)[None, :] // regime_len
+        drift_sign = np.where((steps + rng.integers(0, 2, size=(n_symbols, 1))) % 2 == 0, 1.0, -1.0)
+        drift = drift_sign * vol * 0.3
+        rets = drift + vol * rng.standard_normal((n_symbols, minutes))
+        start_price = np.exp(rng.uniform(np.log(0.01), np.log(50_000.0), size=(n_symbols, 1)))
+        close = start_price * np.exp(np.cumsum(rets, axis=1))
+        open_ = np.concatenate([start_price, close[:, :-1]], axis=1)
+        wick = np.abs(rng.standard_normal((n_symbols, minutes, 2))) * vol[:, :, None] * 0.5
+        high = np.maximum(open_, close) * (1.0 + wick[:, :, 0])
+        low = np.minimum(open_, close) * (1.0 - wick[:, :, 1])
+        qv = np.exp(rng.normal(11.0, 1.5, size=(n_symbols, minutes)))
+        t = (self.start_ms + np.arange(minutes) * MINUTE_MS).astype(np.float64)
+
+        self.data = np.empty((n_symbols, minutes, 6), dtype=np.float64)
+        self.data[:, :, 0] = t[None, :]
+        self.data[:, :, 1] = open_
+        self.data[:, :, 2] = high
+        self.data[:, :, 3] = low
+        self.data[:, :, 4] = close
+        self.data[:, :, 5] = qv
+        self._index = {s: i for i, s in enumerate(self.symbols)}
+
+    def open_time(self, minute: int) -> int:
+        return self.start_ms + int(minute) * MINUTE_MS
+
+    def array(self, symbol: str) -> np.ndarray:
+        return self.data[self._index[symbol]]
+
+    def prices(self, minute: int) -> Dict[str, float]:
+        return {s: float(p) for s, p in zip(self.symbols, self.data[:, minute, 4])}
+
+    def baselines(self) -> Dict[str, float]:
+        return {s: float(p) for s, p in zip(self.symbols, self.data[:, 0, 4])}
+
+    def ws_messages(self, minute: int) -> List[str]:
+        """该分钟全部交易对的组合流 kline 消息（已收盘）。"""
+        out: List[str] = []
+        event_ms = self.open_time(minute) + MINUTE_MS
+        for s, row in zip(self.symbols, self.data[:, minute, :].tolist()):
+            t, o, h, l, c, qv = row
+            out.append(json.dumps({
+                "stream": f"{s.lower()}@kline_1m",
+                "data": {
+                    "e": "kline", "E": event_ms, "s": s,
+                    "k": {
+                        "t": int(t), "T": int(t) + MINUTE_MS - 1, "s": s, "i": "1m",
+                        "o": repr(o), "c": repr(c), "h": repr(h), "l": repr(l),
+                        "v": "0", "q": repr(qv), "x": True,
+                    },
+                },
+            }))
+        return out
+
+
+class SyntheticClient:
+    """基于 SyntheticMarket 的客户端替身，行为与交易所接口一致：
+
+    now_minute 为虚拟时钟，klines 返回 openTime <= 当前分钟的K线（最后一根视为未收盘）。
+    """
+
+    def __init__(self, market: SyntheticMarket, now_minute: int = 0):
+        self.market = market
+        self.now_minute = int(now_minute)
+        self.calls = 0
+
+    async def klines(
+        self,
+        symbol: str,
+        interval: str = "1m",
+        limit: int = 500,
+        startTime: Optional[int] = None,
+        endTime: Optional[int] = None,
+        *,
+        hedge: bool = False,
+    ) -> List[List[Any]]:
+        self.calls += 1
+        arr = self.market.array(symbol)[: self.now_minute + 1]
+        t = arr[:, 0]
+        lo = 0 if startTime is None else int(np.searchsorted(t, startTime, side="left"))
+        hi = len(arr) if endTime is None else int(np.searchsorted(t, endTime, side="right"))
+        arr = arr[lo:hi]
+        arr = arr[: int(limit)] if startTime is not None else arr[-int(limit):]
+        return [[int(t), o, h, l, c, 0.0, int(t) + MINUTE_MS - 1, qv] for t, o, h, l, c, qv in arr.tolist()]
+
+    async def ticker_price_all(self) -> List[Dict[str, str]]:
+        self.calls += 1
+        return [{"symbol": s, "price": repr(p)} for s, p in self.market.prices(self.now_minute).items()]
+
+    async def aclose(self) -> None:
+        pass
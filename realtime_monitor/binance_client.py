@@ -2,16 +2,22 @@ from __future__ import annotations
 
 import asyncio
 import os
-from typing import Any, Dict, List, Optional, Tuple
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import httpx
+import numpy as np
 from tenacity import retry, stop_after_attempt, wait_random_exponential
 import random
+from urllib.parse import urlsplit
+
+from .endpoints import Endpoint, EndpointPool
+from .ratelimit import WeightLimiter, request_weight
 
 # 仅在显式设置环境变量时使用，否则为 None
 BASE_URL = os.getenv("BINANCE_BASE_URL")
 
-# 备用端点轮换列表（仅在显式配置 BASE_URL 时启用完整轮换）
+# 备用端点列表（端点池按健康度在其中选择，靠前者优先）
 DEFAULT_BASE_URLS: List[str] = [
     "https://fapi.binance.com",
     "https://fapi2.binance.com",
@@ -19,10 +25,46 @@ DEFAULT_BASE_URLS: List[str] = [
     "https://fapi4.binance.com",
 ]
 
+# 显式给出完整端点列表（逗号分隔）时替代内置列表，例如指向本地模拟器：
+# BINANCE_BASE_URLS=http://127.0.0.1:8080
+_BASE_URLS_ENV = [u.strip() for u in os.getenv("BINANCE_BASE_URLS", "").split(",") if u.strip()]
+
+
+def _is_binance_host(url: str) -> bool:
+    host = (urlsplit(url).hostname or "").lower()
+    return host == "binance.com" or host.endswith(".binance.com")
+
+
+# 各端点默认缓存时长（秒）
+DEFAULT_CACHE_TTL: Dict[str, float] = {
+    "/fapi/v1/exchangeInfo": 300.0,
+    "/fapi/v1/ticker/price": 1.0,
+    "/fapi/v1/klines": 3600.0,
+}
+
+
+def _retry_after(r: httpx.Response, default: float) -> float:
+    try:
+        return max(0.0, float(r.headers.get("Retry-After", "")))
+    except ValueError:
+        return default
+
 
 class BinanceFuturesClient:
-    def __init__(self, *, timeout: float = 15.0, max_connections: int = 50):
+    def __init__(
+        self,
+        *,
+        timeout: float = 15.0,
+        max_connections: int = 50,
+        max_in_flight: int = 20,
+        limiter: Optional[WeightLimiter] = None,
+        hedge_delay: Optional[float] = None,
+        cache_ttl: Optional[Dict[str, float]] = None,
+        log: Callable[[str], None] = print,
+    ):
         self._timeout = timeout
+        # 所有调用方共享的权重限流器（按端点权重与响应头调度请求，并限制并发）
+        self.limiter = limiter or WeightLimiter(max_in_flight=max_in_flight)
         self._limits = httpx.Limits(max_keepalive_connections=max_connections, max_connections=max_connections)
         # 通过常见浏览器 UA 与合理的 Accept 头，降低被风控命中的概率；
         # 同时启用 HTTP/2 提升长连接复用效率（可选）。
@@ -58,21 +100,33 @@ class BinanceFuturesClient:
             os.environ["HTTP_PROXY"] = self._proxy_url
             os.environ["ALL_PROXY"] = self._proxy_url
 
-        # 端点轮换：若指定了 BINANCE_BASE_URL，则将其置于列表首位；
-        # 否则仅用 fapi 主端点，避免轮换到可能被 429 的备用端点
+        # 端点池：若指定了 BINANCE_BASE_URL，则将其置于列表首位，其后为内置备用端点；
+        # 每个端点保持一个长连接客户端，按延迟/失败率/冷却状态选择，靠后的端点带顺序惩罚，
+        # 主端点健康时不会被分流到可能被 429 的备用端点。
+        # BINANCE_BASE_URL 指向非交易所主机（本地模拟器、代理网关）时不追加内置端点，
+        # 否则注入的 418/429/302 会把请求切到真实交易所。
         self._base_urls: List[str] = []
         if BASE_URL:
             self._base_urls.append(BASE_URL)
-            # 若显式配置了端点，也加入其他备用以便轮换
-            for u in DEFAULT_BASE_URLS:
-                if u not in self._base_urls:
-                    self._base_urls.append(u)
-        else:
-            # 未配置时，仅用主端点 fapi，备用暂不加入（避免频繁 429）
-            self._base_urls.append("https://fapi.binance.com")
-        self._base_idx = 0
+        fallbacks = _BASE_URLS_ENV or (DEFAULT_BASE_URLS if not BASE_URL or _is_binance_host(BASE_URL) else [])
+        for u in fallbacks:
+            if u not in self._base_urls:
+                self._base_urls.append(u)
+        self._pool = EndpointPool(self._base_urls, self._build_client, log=log)
+        # 对延迟敏感的调用可开启对冲请求：首个请求超过该时长未返回时向次优端点再发一次
+        self.hedge_delay = hedge_delay
 
-        self._client = self._build_client(self._base_urls[self._base_idx])
+        # 请求合并与短期缓存：path -> TTL 秒（0 表示不缓存；K线另按分钟边界失效）
+        self.cache_ttl: Dict[str, float] = dict(DEFAULT_CACHE_TTL)
+        if cache_ttl:
+            self.cache_ttl.update(cache_ttl)
+        self.cache_max_entries = 4096
+        self._cache: Dict[Tuple[Any, ...], Tuple[float, Any]] = {}
+        self._inflight: Dict[Tuple[Any, ...], asyncio.Future] = {}
+        self.cache_hits = 0
+        self.coalesced = 0
+        # 每个 REST 请求完成后回调 (base_url, path, status 或 None(无响应), 耗时秒)
+        self._request_listeners: List[Callable[[str, str, Optional[int], float], None]] = []
 
     def _build_client(self, base_url: str) -> httpx.AsyncClient:
         return httpx.AsyncClient(
@@ -84,31 +138,142 @@ class BinanceFuturesClient:
             trust_env=True,  # 允许使用 HTTP(S)_PROXY 等系统代理
         )
 
-    async def _rotate_base(self, reason: str = "") -> None:
-        try:
-            await self._client.aclose()
-        except Exception:
-            pass
-        prev = str(self._client.base_url)
-        self._base_idx = (self._base_idx + 1) % len(self._base_urls)
-        new = self._base_urls[self._base_idx]
-        # 记录轮换原因，便于排障
-        print(f"[binance] rotate base: {prev} -> {new} (reason={reason})")
-        self._client = self._build_client(new)
+    def endpoint_stats(self) -> List[Dict[str, Any]]:
+        return self._pool.stats()
+
+    def ban_counts(self) -> Dict[Tuple[str, str], int]:
+        return dict(self._pool.ban_counts)
+
+    def add_request_listener(self, fn: Callable[[str, str, Optional[int], float], None]) -> None:
+        self._request_listeners.append(fn)
 
     async def aclose(self):
-        await self._client.aclose()
+        await self._pool.aclose()
+
+    async def _send(self, ep: Endpoint, path: str, params: Optional[Dict[str, Any]], weight: int) -> httpx.Response:
+        async with self.limiter.slot(weight):
+            t0 = time.monotonic()
+            try:
+                r = await ep.client.get(path, params=params)
+            except asyncio.CancelledError:
+                # 对冲落败被取消：已耗时是其延迟的下界，只计入延迟以便后续少选该端点，不算作成功
+                self._pool.record_latency(ep, time.monotonic() - t0)
+                raise
+            except Exception:
+                dt = time.monotonic() - t0
+                self._pool.record(ep, dt, ok=False)
+                for fn in self._request_listeners:
+                    fn(ep.base_url, path, None, dt)
+                raise
+        dt = time.monotonic() - t0
+        # 200 但非 JSON（WAF 拦截页）同样记为失败，调用方不再重复记录
+        ok = r.status_code == 200 and "json" in r.headers.get("Content-Type", "").lower()
+        self._pool.record(ep, dt, ok=ok, status=r.status_code)
+        for fn in self._request_listeners:
+            fn(ep.base_url, path, r.status_code, dt)
+        self.limiter.observe(r.headers.get("X-MBX-USED-WEIGHT-1M"))
+        return r
+
+    async def _send_hedged(self, path: str, params: Optional[Dict[str, Any]], weight: int) -> Tuple[Endpoint, httpx.Response]:
+        """向最优端点发起请求；超过 hedge_delay 未返回则向次优端点并发再发一次，取先成功者。"""
+        primary = self._pool.pick()
+        assert primary is not None
+        first = asyncio.create_task(self._send(primary, path, params, weight))
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_delay)
+        secondary = None if done else self._pool.pick(exclude=[primary])
+        if secondary is None or secondary.banned(time.monotonic()):
+            return primary, await first
+        second = asyncio.create_task(self._send(secondary, path, params, weight))
+        owner = {first: primary, second: secondary}
+        pending = {first, second}
+        try:
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is None and t.result().status_code == 200:
+                        return owner[t], t.result()
+                if not pending:
+                    # 两路都未成功：交给调用方按状态码/异常处理
+                    t = done.pop()
+                    return owner[t], t.result()
+        finally:
+            for t in pending:
+                t.cancel()
+
+    def _cache_expiry(self, path: str, params: Optional[Dict[str, Any]], value: Any, now: float) -> Optional[float]:
+        """响应可缓存到的时刻（time.time() 秒）；None 表示不缓存。"""
+        ttl = self.cache_ttl.get(path)
+        if not ttl:
+            return None
+        if path != "/fapi/v1/klines":
+            return now + ttl
+        minute_start = int(now * 1000) // 60_000 * 60_000
+        end_time = (params or {}).get("endTime")
+        if end_time is not None and int(end_time) < minute_start:
+            # 区间全部已收盘，内容不会再变
+            return now + ttl
+        # 含最新K线：若本分钟K线已出现，则在下一个分钟边界前已收盘部分不变；
+        # 否则交易所尚未滚动到新分钟，只做短暂缓存避免整分钟读到旧数据
+        if isinstance(value, list) and value and int(value[-1][0]) >= minute_start:
+            return (minute_start + 60_000) / 1000.0
+        return now + 1.0
+
+    def _cache_put(self, key: Tuple[Any, ...], expires: float, value: Any) -> None:
+        self._cache[key] = (expires, value)
+        if len(self._cache) > self.cache_max_entries:
+            now = time.time()
+            for k in [k for k, (exp, _) in self._cache.items() if exp <= now]:
+                del self._cache[k]
+            while len(self._cache) > self.cache_max_entries:
+                del self._cache[next(iter(self._cache))]
+
+    async def _get_json(self, path: str, *, params: Optional[Dict[str, Any]] = None, allow_rotate: bool = True, hedge: bool = False) -> Any:
+        """带短期缓存与请求合并的 GET：
+        - 相同 path+params 的并发请求合并为一次实际请求（single-flight），不重复消耗权重；
+        - 响应按 cache_ttl 缓存，K线按分钟边界失效。
+        """
+        key = (path, tuple(sorted((params or {}).items())))
+        hit = self._cache.get(key)
+        if hit is not None and hit[0] > time.time():
+            self.cache_hits += 1
+            return hit[1]
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_json(path, params=params, allow_rotate=allow_rotate, hedge=hedge))
+            self._inflight[key] = task
 
-    async def _get_json(self, path: str, *, params: Optional[Dict[str, Any]] = None, allow_rotate: bool = True) -> Any:
-        """基础 GET 封装：在遇到 302/403/418/451/429 时尝试端点轮换并重试。
+            def _done(t: asyncio.Future) -> None:
+                self._inflight.pop(key, None)
+                if t.cancelled() or t.exception() is not None:
+                    return
+                expires = self._cache_expiry(path, params, t.result(), time.time())
+                if expires is not None:
+                    self._cache_put(key, expires, t.result())
+
+            task.add_done_callback(_done)
+        else:
+            self.coalesced += 1
+        # shield：单个调用方被取消时，不影响其他等待同一请求的调用方
+        return await asyncio.shield(task)
+
+    async def _fetch_json(self, path: str, *, params: Optional[Dict[str, Any]] = None, allow_rotate: bool = True, hedge: bool = False) -> Any:
+        """基础 GET 封装：按健康度选择端点；遇到 302/403/418/451/429 时让该端点冷却并换端点重试。
         注意：不使用 follow_redirects，以便识别到重定向到 www.binance.com 的风控场景。
         """
         attempts = 0
         max_attempts = len(self._base_urls) * 3  # 每个端点最多尝试3次，提升韧性
         last_exc: Optional[Exception] = None
+        weight = request_weight(path, params)
+        can_rotate = allow_rotate and len(self._pool) > 1
+        ep: Optional[Endpoint] = None
         while attempts < max_attempts:
             try:
-                r = await self._client.get(path, params=params)
+                if hedge and self.hedge_delay is not None and can_rotate:
+                    ep, r = await self._send_hedged(path, params, weight)
+                else:
+                    ep = self._pool.pick() if can_rotate or ep is None else ep
+                    assert ep is not None
+                    r = await self._send(ep, path, params, weight)
                 # 明确拦截风控/跳转/限流
                 sc = r.status_code
                 if sc == 200:
@@ -116,59 +281,53 @@ class BinanceFuturesClient:
                     ctype = r.headers.get("Content-Type", "").lower()
                     if "application/json" in ctype or "json" in ctype:
                         return r.json()
-                    # 非 JSON 内容，视为风控，切换端点
-                    if allow_rotate and len(self._base_urls) > 1:
-                        # 记录为最后异常，便于抛出更有信息量的错误
-                        try:
-                            preview = r.text[:160]
-                        except Exception:
-                            preview = "<no-body>"
-                        cur = str(self._client.base_url)
-                        last_exc = RuntimeError(
-                            f"Non-JSON 200 from {cur}{path} content-type={ctype} preview={preview!r}"
-                        )
-                        await self._rotate_base("non-json-200")
-                        attempts += 1
-                        await asyncio.sleep(random.uniform(0.2, 0.6))
-                        continue
-                    r.raise_for_status()
+                    # 非 JSON 内容，视为风控：该端点冷却，记录为最后异常，便于抛出更有信息量的错误
+                    try:
+                        preview = r.text[:160]
+                    except Exception:
+                        preview = "<no-body>"
+                    last_exc = RuntimeError(
+                        f"Non-JSON 200 from {ep.base_url}{path} content-type={ctype} preview={preview!r}"
+                    )
+                    self._pool.ban(ep, 60, "non-json-200")
+                    attempts += 1
+                    if not can_rotate:
+                        raise last_exc
+                    continue
                 elif sc in (301, 302, 307, 308, 403, 451):
-                    if allow_rotate and len(self._base_urls) > 1:
-                        await self._rotate_base(f"status-{sc}")
+                    if can_rotate:
+                        self._pool.ban(ep, 60, f"status-{sc}")
                         attempts += 1
-                        await asyncio.sleep(random.uniform(0.3, 0.9))
                         continue
                     r.raise_for_status()
                 elif sc == 418:
-                    # 418: "I'm a teapot"通常是 WAF 轻量限流，优先本端点重试并退避
-                    # 若反复 418 再考虑轮换，避免把正常端点标记为不可用
-                    await asyncio.sleep(random.uniform(1.5, 3.0))
+                    # 418: "I'm a teapot"通常是 WAF 轻量限流；IP 级别暂停，并让该端点短暂冷却
+                    retry_after = _retry_after(r, random.uniform(1.5, 3.0))
+                    self.limiter.penalize(retry_after)
+                    self._pool.ban(ep, max(retry_after, 10.0), "status-418")
                     attempts += 1
-                    if attempts % 3 == 0 and allow_rotate and len(self._base_urls) > 1:
-                        await self._rotate_base(f"status-418-after-retry")
                     continue
                 elif sc == 429:
-                    # 限流，退避更长时间；若当前端点多次 429，考虑轮换
-                    await asyncio.sleep(random.uniform(2.0, 4.0))
+                    # 限流，按 Retry-After 暂停全部请求，并让该端点冷却
+                    retry_after = _retry_after(r, random.uniform(2.0, 4.0))
+                    self.limiter.penalize(retry_after)
+                    self._pool.ban(ep, max(retry_after, 10.0), "status-429")
                     attempts += 1
-                    if attempts % 2 == 0 and allow_rotate and len(self._base_urls) > 1:
-                        await self._rotate_base(f"status-429-after-retry")
                     continue
                 else:
                     r.raise_for_status()
             except httpx.HTTPStatusError as e:
                 last_exc = e
-                if allow_rotate and len(self._base_urls) > 1:
-                    await self._rotate_base("HTTPStatusError")
+                if can_rotate and ep is not None:
+                    self._pool.ban(ep, 10, "HTTPStatusError")
                     attempts += 1
-                    await asyncio.sleep(random.uniform(0.3, 0.9))
                     continue
                 raise
             except (httpx.ConnectError, httpx.ReadTimeout, httpx.ConnectTimeout, httpx.ReadError) as e:
                 last_exc = e
-                # 连接/读取/超时异常：短暂等待后重试，必要时轮换
-                if allow_rotate and len(self._base_urls) > 1:
-                    await self._rotate_base(f"net-error-{type(e).__name__}")
+                # 连接/读取/超时异常：该端点短暂冷却后重试
+                if can_rotate and ep is not None:
+                    self._pool.ban(ep, 5, f"net-error-{type(e).__name__}")
                 attempts += 1
                 await asyncio.sleep(random.uniform(0.5, 1.2))
                 continue
@@ -176,29 +335,29 @@ class BinanceFuturesClient:
         # 仍失败：抛出最后一次异常或通用错误
         if last_exc:
             raise last_exc
-        cur = str(self._client.base_url)
+        cur = ep.base_url if ep is not None else "-"
         raise RuntimeError(f"Failed to fetch JSON from Binance after rotating endpoints. last_base={cur} path={path}")
 
     @retry(wait=wait_random_exponential(multiplier=0.5, max=5), stop=stop_after_attempt(3))
     async def exchange_info(self) -> Dict[str, Any]:
-        # 小抖动，避免多实例同步打点
-        await asyncio.sleep(random.uniform(0.03, 0.08))
         return await self._get_json("/fapi/v1/exchangeInfo")
 
     @retry(wait=wait_random_exponential(multiplier=0.5, max=5), stop=stop_after_attempt(3))
-    async def klines(self, symbol: str, interval: str = "1m", limit: int = 500, startTime: Optional[int] = None, endTime: Optional[int] = None) -> List[List[Any]]:
+    async def klines(self, symbol: str, interval: str = "1m", limit: int = 500, startTime: Optional[int] = None, endTime: Optional[int] = None, *, hedge: bool = False) -> List[List[Any]]:
         params: Dict[str, Any] = {"symbol": symbol.upper(), "interval": interval, "limit": limit}
         if startTime is not None:
             params["startTime"] = startTime
         if endTime is not None:
             params["endTime"] = endTime
-        # 为密集请求增加细微抖动，避免模式化触发 WAF；不影响总体吞吐。
-        await asyncio.sleep(random.uniform(0.03, 0.12))
-        return await self._get_json("/fapi/v1/klines", params=params)
+        return await self._get_json("/fapi/v1/klines", params=params, hedge=hedge)
+
+    @retry(wait=wait_random_exponential(multiplier=0.5, max=5), stop=stop_after_attempt(3))
+    async def server_time(self) -> int:
+        data = await self._get_json("/fapi/v1/time")
+        return int(data["serverTime"])
 
     @retry(wait=wait_random_exponential(multiplier=0.5, max=5), stop=stop_after_attempt(3))
     async def ticker_price_all(self) -> List[Dict[str, str]]:
-        await asyncio.sleep(random.uniform(0.02, 0.06))
         return await self._get_json("/fapi/v1/ticker/price")
 
 
@@ -231,7 +390,7 @@ async def fetch_midnight_close(client: BinanceFuturesClient, symbol: str, midnig
 
 async def fetch_latest_closed_kline(client: BinanceFuturesClient, symbol: str) -> Optional[Tuple[int, float, float, float, float, float]]:
     # 取最近2根，第一根是已收盘的倒数第二根，第二根可能未收盘
-    kl = await client.klines(symbol, interval="1m", limit=2)
+    kl = await client.klines(symbol, interval="1m", limit=2, hedge=True)
     if not kl:
         return None
     if len(kl) == 1:
@@ -246,3 +405,57 @@ async def fetch_latest_closed_kline(client: BinanceFuturesClient, symbol: str) -
 async def fetch_recent_closes(client: BinanceFuturesClient, symbol: str, limit: int = 600) -> List[Tuple[int, float]]:
     kl = await client.klines(symbol, interval="1m", limit=limit)
     return [(int(k[0]), float(k[4])) for k in kl]
+
+
+# klines_to_array 输出列：openTime, open, high, low, close, quoteVolume
+KLINE_FIELDS: Tuple[int, ...] = (0, 1, 2, 3, 4, 7)
+
+
+def klines_to_array(kl: List[List[Any]], *, closed_before_ms: Optional[int] = None) -> np.ndarray:
+    """将 /fapi/v1/klines 原始返回直接解析为 (n, 6) float64 数组。
+
+    - 列依次为 (t, o, h, l, c, qv)，与 ws/REST 统一的K线元组顺序一致；
+    - 若给出 closed_before_ms，则丢弃在该时刻仍未收盘的K线（通常是最后一根）。
+    """
+    if not kl:
+        return np.empty((0, len(KLINE_FIELDS)), dtype=np.float64)
+    arr = np.array([[k[i] for i in KLINE_FIELDS] for k in kl], dtype=np.float64)
+    if closed_before_ms is not None:
+        arr = arr[arr[:, 0] + 60_000 <= closed_before_ms]
+    return arr
+
+
+async def fetch_recent_klines(client: BinanceFuturesClient, symbol: str, limit: int = 600, *, closed_before_ms: Optional[int] = None) -> np.ndarray:
+    kl = await client.klines(symbol, interval="1m", limit=limit)
+    return klines_to_array(kl, closed_before_ms=closed_before_ms)
+
+
+async def fetch_klines_since(
+    client: BinanceFuturesClient,
+    symbol: str,
+    start_ms: int,
+    *,
+    end_ms: Optional[int] = None,
+    closed_before_ms: int,
+    page: int = 1500,
+) -> np.ndarray:
+    """按 startTime 分页拉取 [start_ms, end_ms] 区间内已收盘的1m K线，返回 (n, 6) 数组。
+
+    limit 按缺失根数计算，补几根时只产生最低 weight 的小请求。
+    """
+    stop_ms = closed_before_ms if end_ms is None else min(closed_before_ms, int(end_ms) + 60_000)
+    chunks: List[np.ndarray] = []
+    start = int(start_ms)
+    while start + 60_000 <= stop_ms:
+        limit = int(min(page, max(1, (stop_ms - start) // 60_000)))
+        kl = await client.klines(symbol, interval="1m", limit=limit, startTime=start, endTime=stop_ms - 1)
+        arr = klines_to_array(kl, closed_before_ms=stop_ms)
+        if len(arr) == 0:
+            break
+        chunks.append(arr)
+        start = int(arr[-1, 0]) + 60_000
+        if len(kl) < limit:
+            break
+    if not chunks:
+        return np.empty((0, len(KLINE_FIELDS)), dtype=np.float64)
+    return np.concatenate(chunks)
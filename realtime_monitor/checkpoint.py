@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import os
+from collections import deque
+from dataclasses import asdict
+from typing import Any, Collection, Dict, List, Optional
+
+import numpy as np
+
+from .ema import EMASet
+from .monitor import CrossWatch, SymbolMonitor, SymbolState
+from .time_utils import now_ms_utc
+
+CHECKPOINT_VERSION = 1
+
+
+def dump_monitor(monitor: SymbolMonitor) -> Dict[str, Any]:
+    """导出 SymbolMonitor 的完整运行状态（可 JSON 序列化）。"""
+    states: Dict[str, Any] = {}
+    for sym, st in monitor.states.items():
+        if st.last_open_time is None:
+            continue  # 无法按时间校验的状态不保存，重启时重新 seed
+        states[sym] = {
+            "ema": list(st.ema.snapshot()),
+            "last_open_time": st.last_open_time,
+            "prev_snapshot": list(st.prev_snapshot) if st.prev_snapshot else None,
+            "watch": asdict(st.watch) if st.watch else None,
+            "prev_close": st.prev_close,
+            "last_close": st.last_close,
+            "recent_closes": list(st.recent_closes),
+            "last_quote_volume": st.last_quote_volume,
+        }
+        if monitor.close_ring is not None and monitor.close_ring.history > 64 and monitor.store is None:
+            # recent_closes 只有 64 根，更长的 Δ% 窗口需要整段环形缓冲；有K线仓库时恢复时从仓库重读，不必保存。
+            # 收盘价按 float64 原始字节 base64 编码，比逐个浮点数的 JSON 小且快
+            ring = monitor.close_ring.export(sym)
+            if ring is not None:
+                states[sym]["ring"] = {
+                    "last_open_time": ring[0],
+                    "closes": base64.b64encode(ring[1].astype("<f8").tobytes()).decode("ascii"),
+                }
+    return {
+        "version": CHECKPOINT_VERSION,
+        "saved_at": now_ms_utc(),
+        "confirm_candles": monitor.confirm_candles,
+        "last_alert_at": dict(monitor._last_alert_at),
+        "states": states,
+    }
+
+
+def restore_monitor(
+    monitor: SymbolMonitor,
+    data: Dict[str, Any],
+    *,
+    max_age_ms: Optional[int] = None,
+    symbols: Optional[Collection[str]] = None,
+) -> List[str]:
+    """将检查点写回 monitor，返回成功恢复的交易对。
+
+    - 版本或 confirm_candles 不一致时整体放弃（观察窗口含义已变化）；
+    - 单个交易对的 last_open_time 早于 max_age_ms（默认 seed_limit 分钟）时放弃，交由常规 seed；
+    - Δ% 窗口超过 63 分钟时，收盘缓冲从K线仓库重读，没有仓库时用检查点中保存的整段缓冲，否则只用 recent_closes 回填；
+    - 给出 symbols 时只恢复其中的交易对（多进程分片变化后，其余交易对已归其他工作进程）；
+    - 恢复后需调用 monitor.catch_up() 补推缺失的分钟。
+    """
+    if data.get("version") != CHECKPOINT_VERSION:
+        return []
+    if int(data.get("confirm_candles", -1)) != monitor.confirm_candles:
+        return []
+    if max_age_ms is None:
+        max_age_ms = monitor.seed_limit * 60_000
+    oldest = now_ms_utc() - int(max_age_ms)
+
+    restored: List[str] = []
+    wanted = set(symbols) if symbols is not None else None
+    for sym, d in (data.get("states") or {}).items():
+        if wanted is not None and sym not in wanted:
+            continue
+        try:
+            last_open_time = int(d["last_open_time"])
+            if last_open_time < oldest:
+                continue
+            if monitor.ema_engine is not None:
+                ema = monitor.ema_engine.add(sym, d["ema"])
+            else:
+                ema = EMASet.from_values(d["ema"])
+            w = d.get("watch")
+            ps = d.get("prev_snapshot")
+            monitor.states[sym] = SymbolState(
+                symbol=sym,
+                ema=ema,
+                last_open_time=last_open_time,
+                prev_snapshot=tuple(ps) if ps else None,
+                watch=CrossWatch(**w) if w else None,
+                prev_close=d.get("prev_close"),
+                last_close=d.get("last_close"),
+                recent_closes=deque((float(c) for c in d.get("recent_closes") or []), maxlen=64),
+                last_quote_volume=d.get("last_quote_volume"),
+            )
+            if monitor.close_ring is not None:
+                ring = d.get("ring")
+                history = monitor.close_ring.history
+                if monitor.store is not None and history > 64:
+                    arr = monitor.store.range(sym, last_open_time - (history - 1) * 60_000, last_open_time)
+                    monitor.close_ring.load(sym, arr[:, 0], arr[:, 4])
+                elif ring:
+                    closes = np.frombuffer(base64.b64decode(ring["closes"]), dtype="<f8")
+                    monitor.close_ring.load_export(sym, int(ring["last_open_time"]), closes)
+                else:
+                    rc = monitor.states[sym].recent_closes
+                    monitor.close_ring.load(sym, [last_open_time - (len(rc) - 1 - i) * 60_000 for i in range(len(rc))], list(rc))
+            restored.append(sym)
+        except (KeyError, TypeError, ValueError):
+            continue
+    for key, ts in (data.get("last_alert_at") or {}).items():
+        # 冷却键为 symbol@strategy
+        if wanted is not None and key.split("@", 1)[0] not in wanted:
+            continue
+        monitor._last_alert_at[key] = max(int(ts), monitor._last_alert_at.get(key, 0))
+    return restored
+
+
+def save_checkpoint(monitor: SymbolMonitor, path: str) -> None:
+    write_checkpoint(dump_monitor(monitor), path)
+
+
+async def save_checkpoint_async(monitor: SymbolMonitor, path: str) -> None:
+    """在事件循环中导出状态（dump_monitor 只做拷贝，很快），JSON 序列化与写文件放到线程中，不阻塞行情处理。"""
+    data = dump_monitor(monitor)
+    await asyncio.to_thread(write_checkpoint, data, path)
+
+
+def write_checkpoint(data: Dict[str, Any], path: str) -> None:
+    """原子写入：先写临时文件再替换，避免中途退出留下半个文件。"""
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
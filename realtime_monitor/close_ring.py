@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+MINUTE_MS = 60_000
+
+
+class CloseRing:
+    """全部交易对共享的 1m 收盘价环形缓冲（capacity × history），按分钟对齐。
+
+    - 交易对占一行，openTime 所在分钟 m 写入第 m % history 列，缺失的分钟为 NaN；
+    - change_map() 对一组交易对与全部窗口一次性做向量化取数：Δ% = (最新收盘 - w 分钟前收盘) / w 分钟前收盘；
+    - history 决定可用的最长窗口（history - 1 分钟），一天的窗口只需 1441 列。
+    """
+
+    def __init__(self, history: int = 1441, capacity: int = 512):
+        self.history = max(2, int(history))
+        self.closes = np.full((max(1, int(capacity)), self.history), np.nan, dtype=np.float64)
+        self.last_minute = np.full(self.closes.shape[0], -1, dtype=np.int64)
+        self._index: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._next = 0
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._index
+
+    def _alloc(self) -> int:
+        if self._free:
+            return self._free.pop()
+        if self._next >= self.closes.shape[0]:
+            n = self.closes.shape[0]
+            grown = np.full((n * 2, self.history), np.nan, dtype=np.float64)
+            grown[:n] = self.closes
+            self.closes = grown
+            last = np.full(n * 2, -1, dtype=np.int64)
+            last[:n] = self.last_minute
+            self.last_minute = last
+        idx = self._next
+        self._next += 1
+        return idx
+
+    def _row(self, symbol: str) -> int:
+        idx = self._index.get(symbol)
+        if idx is None:
+            idx = self._alloc()
+            self._index[symbol] = idx
+            self.closes[idx] = np.nan
+            self.last_minute[idx] = -1
+        return idx
+
+    def load(self, symbol: str, open_times: Sequence[float], closes: Sequence[float]) -> None:
+        """以一段按时间升序的K线（openTime ms, close）重置该交易对的历史。"""
+        idx = self._row(symbol)
+        self.closes[idx] = np.nan
+        self.last_minute[idx] = -1
+        t = np.asarray(open_times, dtype=np.float64)[-self.history:]
+        if len(t) == 0:
+            return
+        c = np.asarray(closes, dtype=np.float64)[-self.history:]
+        m = (t // MINUTE_MS).astype(np.int64)
+        keep = m > m[-1] - self.history
+        self.closes[idx, m[keep] % self.history] = c[keep]
+        self.last_minute[idx] = m[-1]
+
+    def export(self, symbol: str) -> Optional[Tuple[int, np.ndarray]]:
+        """导出 (最新分钟的 openTime ms, 按时间升序的 history 列收盘价)，缺失分钟为 NaN；用 load_export() 写回。"""
+        idx = self._index.get(symbol)
+        if idx is None or self.last_minute[idx] < 0:
+            return None
+        last = int(self.last_minute[idx])
+        m = np.arange(last - self.history + 1, last + 1, dtype=np.int64)
+        return last * MINUTE_MS, self.closes[idx, m % self.history].copy()
+
+    def load_export(self, symbol: str, last_open_time: int, closes: np.ndarray) -> None:
+        """写回 export() 的结果（列数不同时按分钟对齐截取）。"""
+        c = np.asarray(closes, dtype=np.float64)
+        t = int(last_open_time) - (len(c) - 1 - np.arange(len(c))) * MINUTE_MS
+        keep = ~np.isnan(c) & (t >= 0)
+        self.load(symbol, t[keep], c[keep])
+
+    def push(self, symbol: str, open_time: int, close: float) -> None:
+        """追加一根收盘K线；跳过的分钟置为 NaN，早于最新分钟的K线忽略。"""
+        idx = self._row(symbol)
+        m = int(open_time) // MINUTE_MS
+        last = int(self.last_minute[idx])
+        if last >= 0 and m < last:
+            return
+        row = self.closes[idx]
+        if last >= 0 and m - last > 1:
+            if m - last >= self.history:
+                row[:] = np.nan
+            else:
+                gap = np.arange(last + 1, m) % self.history
+                row[gap] = np.nan
+        row[m % self.history] = close
+        self.last_minute[idx] = m
+
+    def remove(self, symbol: str) -> None:
+        idx = self._index.pop(symbol, None)
+        if idx is not None:
+            self._free.append(idx)
+
+    def change_map(self, symbols: Sequence[str], windows: Sequence[int]) -> Dict[str, Dict[int, float]]:
+        """返回 {symbol: {window: pct}}；窗口起点缺数据的项省略，与逐个计算的结果形状一致。"""
+        ws = np.array(sorted({int(w) for w in windows if 0 < int(w) < self.history}), dtype=np.int64)
+        index = self._index
+        syms = [s for s in symbols if s in index]
+        if not syms or len(ws) == 0:
+            return {}
+        idx = np.fromiter((index[s] for s in syms), dtype=np.intp, count=len(syms))
+        last = self.last_minute[idx]
+        cur = self.closes[idx, last % self.history]
+        base = self.closes[idx[:, None], (last[:, None] - ws[None, :]) % self.history]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct = (cur[:, None] - base) / base * 100.0
+        # 尚无数据的行（last_minute=-1）整行为 NaN，随无效项一并剔除
+        valid = np.isfinite(pct) & (base != 0)
+        out: Dict[str, Dict[int, float]] = {}
+        wl = ws.tolist()
+        full = valid.all(axis=1).tolist()
+        for i, (s, row) in enumerate(zip(syms, pct.tolist())):
+            if full[i]:
+                out[s] = dict(zip(wl, row))
+                continue
+            # 仅部分窗口有数据（历史不足或有缺口）
+            mp = {w: v for w, v, k in zip(wl, row, valid[i].tolist()) if k}
+            if mp:
+                out[s] = mp
+        return out
+
+    def last_close(self, symbol: str) -> Optional[float]:
+        idx = self._index.get(symbol)
+        if idx is None or self.last_minute[idx] < 0:
+            return None
+        v = self.closes[idx, self.last_minute[idx] % self.history]
+        return None if np.isnan(v) else float(v)
@@ -0,0 +1,422 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import multiprocessing as mp
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .binance_client import BinanceFuturesClient
+from .checkpoint import load_checkpoint, restore_monitor, save_checkpoint_async
+from .close_ring import CloseRing
+from .ema_vec import EMAMatrix
+from .kline_store import KlineStore
+from .metrics import observe_request, rest_request_histogram
+from .monitor import SymbolMonitor
+from .ratelimit import COORDINATOR_WEIGHT_SHARE, WeightLimiter
+from .scheduler import MinuteScheduler, ServerClock
+from .strategies import StrategySpec, build_engine
+from .timeframes import build_aggregator
+from .time_utils import local_midnight_utc_ms
+from .ws_client import BinanceKlineWS
+
+# 工作进程 -> 协调进程的消息均为元组，首两项为 (类型, 工作进程序号)：
+#   ("ready", i, 已建立状态数)        ("round", i, 本轮耗时ms)
+#   ("events", i, [event, ...])      ("deltas", i, {symbol: {window: pct}}, [已移除的 symbol])
+#   ("stats", i, {...})              ("kline", i, symbol, kline)  —— 仅本地0点那根，用于跨日切换基准
+#   ("error", i, 描述)               ("exit", i)                  —— 管道关闭（由协调进程的读线程生成）
+#   ("log", i, 文本)                                              —— 冷却/调度失败等提示，由协调进程统一输出
+# 协调进程 -> 工作进程：("stop",)
+
+
+@dataclass
+class WorkerConfig:
+    index: int
+    symbols: List[str]
+    windows: List[int]
+    interval_seconds: float = 20.0
+    once: bool = False
+    ws: bool = False
+    ws_shard_size: int = 200
+    event_driven: bool = False
+    minute_sync: bool = False
+    concurrency: int = 20
+    weight_share: float = 1.0
+    vector_ema: bool = False
+    kline_store: Optional[str] = None
+    checkpoint: Optional[str] = None
+    checkpoint_every: float = 60.0
+    report_interval: float = 1.0
+    timeframes: List[str] = field(default_factory=list)
+    strategies: List[StrategySpec] = field(default_factory=list)
+    monitor_kwargs: Dict[str, Any] = field(default_factory=dict)
+
+
+class _WorkerLink:
+    """工作进程一侧的管道封装：只在事件循环线程中发送，收到 stop 后置位 stopped。"""
+
+    def __init__(self, index: int, conn: Any):
+        self.index = index
+        self.conn = conn
+        self.stopped = asyncio.Event()
+        self._last_deltas: Dict[str, Dict[int, float]] = {}
+
+    def send(self, kind: str, *payload: Any) -> None:
+        try:
+            self.conn.send((kind, self.index, *payload))
+        except (BrokenPipeError, EOFError, OSError):
+            # 协调进程已退出
+            self.stopped.set()
+
+    def poll_stop(self) -> None:
+        try:
+            while self.conn.poll():
+                if self.conn.recv()[0] == "stop":
+                    self.stopped.set()
+        except (EOFError, OSError):
+            self.stopped.set()
+
+    def send_deltas(self, current: Dict[str, Dict[int, float]]) -> None:
+        # 只发送与上次不同的交易对，Δ% 每分钟才变化一次，多数轮次几乎为空
+        last = self._last_deltas
+        changed = {s: m for s, m in current.items() if last.get(s) != m}
+        removed = [s for s in last if s not in current]
+        if changed or removed:
+            self.send("deltas", changed, removed)
+        self._last_deltas = current
+
+
+async def _worker_async(cfg: WorkerConfig, conn: Any) -> None:
+    link = _WorkerLink(cfg.index, conn)
+
+    def _log(text: str) -> None:
+        # 工作进程与协调进程共用终端，提示交给协调进程输出，避免打乱榜单画面
+        link.send("log", text)
+
+    # 交易所权重按 IP 计，各工作进程平分额度与并发
+    client = BinanceFuturesClient(
+        max_in_flight=cfg.concurrency,
+        limiter=WeightLimiter(max_in_flight=cfg.concurrency, share=cfg.weight_share),
+        log=_log,
+    )
+    # REST 延迟按 path/状态码累计，随 stats 转发给协调进程的 /metrics
+    rest_seconds = rest_request_histogram()
+    client.add_request_listener(functools.partial(observe_request, rest_seconds))
+    store = KlineStore(cfg.kline_store, log=_log).start() if cfg.kline_store else None
+    ws_cache: Dict[str, tuple] = {}
+    queue: Optional[asyncio.Queue] = asyncio.Queue() if (cfg.ws and cfg.event_driven) else None
+    ws_feed: Optional[BinanceKlineWS] = None
+    tasks: List[asyncio.Task] = []
+    monitor = SymbolMonitor(
+        client,
+        ws_cache=ws_cache if cfg.ws else None,
+        ema_engine=EMAMatrix(capacity=len(cfg.symbols)) if cfg.vector_ema else None,
+        close_ring=CloseRing(history=max(cfg.windows) + 1, capacity=len(cfg.symbols)),
+        store=store,
+        timeframes=build_aggregator(cfg.timeframes, cfg.monitor_kwargs, store=store, strategies=cfg.strategies),
+        strategies=build_engine(cfg.strategies, store=store),
+        **cfg.monitor_kwargs,
+    )
+
+    def _forward_midnight(symbol: str, k: tuple) -> None:
+        # 跨日切换基准由协调进程完成，这里只转发新0点那根K线
+        if int(k[0]) == local_midnight_utc_ms():
+            link.send("kline", symbol, tuple(k))
+
+    monitor.add_kline_listener(_forward_midnight)
+    try:
+        if cfg.ws:
+            ws_feed = BinanceKlineWS(cfg.symbols, ws_cache, shard_size=cfg.ws_shard_size, queue=queue)
+            await ws_feed.run_in_background()
+        if cfg.checkpoint:
+            data = load_checkpoint(cfg.checkpoint)
+            # 只恢复分配给本进程的交易对：工作进程数或交易对列表变化后，检查点里的其余交易对
+            # 已归其他工作进程，若一并补推会产生重复告警
+            restored = restore_monitor(monitor, data, symbols=cfg.symbols) if data else []
+            if restored:
+                missed = await monitor.catch_up(restored)
+                if missed:
+                    link.send("events", missed)
+        await monitor.ensure_states(cfg.symbols)
+        link.send("ready", len(monitor.states))
+        tracked = set(cfg.symbols)
+        rounds = 0
+        klines = 0
+        events_sent = 0
+        last_round_ms = 0.0
+        last_checkpoint = time.monotonic()
+
+        async def _emit(events: List[dict]) -> None:
+            nonlocal events_sent
+            if events:
+                events_sent += len(events)
+                link.send("events", events)
+
+        def _report() -> None:
+            link.send_deltas(monitor.multi_change_map(cfg.symbols, cfg.windows))
+            ws_stats = ws_feed.stats() if ws_feed is not None else []
+            lags = [st["lag_ms"] for st in ws_stats if st.get("lag_ms") is not None]
+            link.send("stats", {
+                "pid": os.getpid(),
+                "symbols": len(monitor.states),
+                "rounds": rounds,
+                "klines": klines,
+                "events": events_sent,
+                "last_round_ms": last_round_ms,
+                "requests": sum(int(st["requests"]) for st in client.endpoint_stats()),
+                "ws_msg_rate": sum(float(st["msg_rate"]) for st in ws_stats),
+                "ws_lag_ms": max(lags) if lags else None,
+                "ws_reconnects": sum(int(st["reconnects"]) for st in ws_stats),
+                "rest_seconds": rest_seconds.snapshot(),
+                "ban_counts": client.ban_counts(),
+            })
+
+        async def _consume() -> None:
+            # 事件驱动：与单进程模式相同，收盘K线到达即推进
+            nonlocal klines
+            assert queue is not None
+            while True:
+                sym, k, _event_ms = await queue.get()
+                if sym not in tracked:
+                    continue
+                klines += 1
+                try:
+                    await _emit(await monitor.update_symbol(sym, kline=k))
+                except Exception as e:
+                    link.send("error", f"{sym} 处理失败: {e!r}")
+
+        async def _poll_rounds() -> None:
+            nonlocal rounds, last_round_ms
+            while True:
+                t0 = time.monotonic()
+                await _emit(await monitor.update_many(cfg.symbols))
+                last_round_ms = (time.monotonic() - t0) * 1000
+                rounds += 1
+                _report()
+                link.send("round", last_round_ms)
+                if cfg.once:
+                    return
+                await asyncio.sleep(max(1.0, float(cfg.interval_seconds)))
+
+        if queue is not None:
+            tasks.append(asyncio.create_task(_consume()))
+        elif cfg.minute_sync and not cfg.once:
+            scheduler = MinuteScheduler(monitor, ServerClock(client), log=_log)
+            tasks.append(asyncio.create_task(scheduler.run(lambda: tracked, _emit)))
+        else:
+            tasks.append(asyncio.create_task(_poll_rounds()))
+        if queue is not None or (cfg.minute_sync and not cfg.once):
+            # 后台推进模式没有“轮次”，就绪即视为完成首轮
+            link.send("round", 0.0)
+
+        while not link.stopped.is_set():
+            link.poll_stop()
+            for t in tasks:
+                if t.done() and not t.cancelled() and t.exception() is not None:
+                    raise t.exception()  # type: ignore[misc]
+            _report()
+            if cfg.checkpoint and time.monotonic() - last_checkpoint >= cfg.checkpoint_every:
+                await save_checkpoint_async(monitor, cfg.checkpoint)
+                last_checkpoint = time.monotonic()
+            try:
+                await asyncio.wait_for(link.stopped.wait(), timeout=cfg.report_interval)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        for t in tasks:
+            t.cancel()
+        if cfg.checkpoint:
+            await save_checkpoint_async(monitor, cfg.checkpoint)
+        if ws_feed is not None:
+            await ws_feed.stop()
+        await client.aclose()
+        if store is not None:
+            await asyncio.to_thread(store.close)
+
+
+def worker_main(cfg: WorkerConfig, conn: Any) -> None:
+    """工作进程入口（spawn 启动，需可被 pickle）。"""
+    try:
+        asyncio.run(_worker_async(cfg, conn))
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        try:
+            conn.send(("error", cfg.index, repr(e)))
+        except Exception:
+            pass
+    finally:
+        conn.close()
+
+
+class ClusterCoordinator:
+    """多进程分片：交易对按轮询切成 N 份，每个工作进程各自持有 WS 分片、REST 客户端与 SymbolMonitor，
+    通过管道把事件与变化的 Δ% 发给协调进程；协调进程只负责排名、榜单与事件落盘。
+
+    - 每个管道由一个读线程阻塞接收，再经 call_soon_threadsafe 投递到事件循环（Windows 同样适用）；
+    - 交易所权重按 IP 计，协调进程保留 coordinator_share（其客户端需 set_share 到同一比例），
+      其余额度与并发在工作进程间平分；
+    - 工作进程退出（异常或被结束）时在统计中标记，不自动重启。
+    """
+
+    def __init__(
+        self,
+        symbols: List[str],
+        workers: int,
+        *,
+        windows: List[int],
+        concurrency: int = 20,
+        coordinator_share: float = COORDINATOR_WEIGHT_SHARE,
+        checkpoint: Optional[str] = None,
+        log: Callable[[str], None] = print,
+        **worker_options: Any,
+    ):
+        self.symbols = list(symbols)
+        self.log = log
+        self.workers = max(1, min(int(workers), len(self.symbols) or 1))
+        self.configs = [
+            WorkerConfig(
+                index=i,
+                symbols=self.symbols[i::self.workers],
+                windows=list(windows),
+                concurrency=max(1, int(concurrency) // self.workers),
+                weight_share=(1.0 - coordinator_share) / self.workers,
+                checkpoint=f"{checkpoint}.w{i}" if checkpoint else None,
+                **worker_options,
+            )
+            for i in range(self.workers)
+        ]
+        self.deltas: Dict[str, Dict[int, float]] = {}
+        self.worker_stats: List[Dict[str, Any]] = [{} for _ in range(self.workers)]
+        self.alive: List[bool] = [False] * self.workers
+        self.ready: List[int] = [0] * self.workers
+        self.rounds: List[int] = [0] * self.workers
+        self.errors: List[str] = []
+        self._procs: List[Any] = []
+        self._conns: List[Any] = []
+        self._readers: List[threading.Thread] = []
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._round_event: Optional[asyncio.Event] = None
+        self._on_events: Optional[Callable[[List[dict]], Awaitable[None]]] = None
+        self._on_kline: Optional[Callable[[str, tuple], None]] = None
+
+    async def start(
+        self,
+        on_events: Callable[[List[dict]], Awaitable[None]],
+        on_kline: Optional[Callable[[str, tuple], None]] = None,
+    ) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._round_event = asyncio.Event()
+        self._on_events = on_events
+        self._on_kline = on_kline
+        ctx = mp.get_context("spawn")
+        for cfg in self.configs:
+            parent, child = ctx.Pipe(duplex=True)
+            proc = ctx.Process(target=worker_main, args=(cfg, child), name=f"monitor-worker-{cfg.index}", daemon=True)
+            proc.start()
+            child.close()
+            self.alive[cfg.index] = True
+            reader = threading.Thread(target=self._reader, args=(cfg.index, parent), name=f"cluster-reader-{cfg.index}", daemon=True)
+            reader.start()
+            self._procs.append(proc)
+            self._conns.append(parent)
+            self._readers.append(reader)
+        self._task = asyncio.create_task(self._dispatch())
+
+    def _reader(self, index: int, conn: Any) -> None:
+        assert self._loop is not None and self._queue is not None
+        while True:
+            try:
+                msg = conn.recv()
+            except (EOFError, OSError):
+                msg = ("exit", index)
+            try:
+                self._loop.call_soon_threadsafe(self._queue.put_nowait, msg)
+            except RuntimeError:
+                return  # 事件循环已关闭
+            if msg[0] == "exit":
+                return
+
+    async def _dispatch(self) -> None:
+        assert self._queue is not None and self._round_event is not None
+        while True:
+            msg = await self._queue.get()
+            kind, idx = msg[0], msg[1]
+            if kind == "events":
+                if self._on_events is not None:
+                    await self._on_events(msg[2])
+            elif kind == "deltas":
+                self.deltas.update(msg[2])
+                for s in msg[3]:
+                    self.deltas.pop(s, None)
+            elif kind == "stats":
+                self.worker_stats[idx] = msg[2]
+            elif kind == "round":
+                self.rounds[idx] += 1
+                self._round_event.set()
+            elif kind == "ready":
+                self.ready[idx] = int(msg[2])
+            elif kind == "kline":
+                if self._on_kline is not None:
+                    self._on_kline(msg[2], msg[3])
+            elif kind == "error":
+                self.errors.append(f"#{idx} {msg[2]}")
+                self.log(f"[cluster] 工作进程 #{idx} 异常: {msg[2]}")
+            elif kind == "log":
+                self.log(f"[w{idx}] {msg[2]}")
+            elif kind == "exit":
+                self.alive[idx] = False
+                self._round_event.set()
+
+    async def wait_rounds(self, n: int = 1, timeout: Optional[float] = None) -> bool:
+        """等待每个存活的工作进程至少完成 n 轮（--once 时用于等待首轮结果）。"""
+        assert self._round_event is not None
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not all(r >= n or not a for r, a in zip(self.rounds, self.alive)):
+            self._round_event.clear()
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._round_event.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    def change_map(self, symbols: List[str]) -> Dict[str, Dict[int, float]]:
+        deltas = self.deltas
+        return {s: deltas[s] for s in symbols if s in deltas}
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [
+            {"worker": i, "alive": self.alive[i], "assigned": len(cfg.symbols), **self.worker_stats[i]}
+            for i, cfg in enumerate(self.configs)
+        ]
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        for conn in self._conns:
+            try:
+                conn.send(("stop",))
+            except (BrokenPipeError, EOFError, OSError):
+                pass
+        for proc in self._procs:
+            await asyncio.to_thread(proc.join, timeout)
+            if proc.is_alive():
+                proc.terminate()
+                await asyncio.to_thread(proc.join, 2.0)
+        if self._task is not None:
+            # 处理完已到达的消息（末尾的事件）后再停止分发
+            while self._queue is not None and not self._queue.empty():
+                await asyncio.sleep(0)
+            self._task.cancel()
+        for conn in self._conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
@@ -1,7 +1,12 @@
 from __future__ import annotations
 
 import re
-from typing import Iterable, List, Tuple, Dict
+import shutil
+import sys
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional, TextIO, Tuple
 from colorama import Fore, Style, init as colorama_init
 
 colorama_init(autoreset=True)
@@ -26,7 +31,16 @@ def _pad_visual(s: str, total: int) -> str:
     return s
 
 
-def _format_row(
+Cell = Tuple[str, int]  # (带颜色的文本, 可见宽度)
+
+
+def _colored(text: str, width: int, color: str) -> Cell:
+    # 先按可见长度补齐再着色，免去对 ANSI 序列做正则剥离
+    pad = " " * (width - len(text)) if len(text) < width else ""
+    return color + text + Style.RESET_ALL + pad, max(width, len(text))
+
+
+def _row_cells(
     symbol: str,
     price: float,
     pct: float,
@@ -35,30 +49,48 @@ def _format_row(
     *,
     colorize: bool = True,
     highlight_threshold: float | None = None,
-) -> str:
+) -> List[Cell]:
+    """一行榜单拆成若干单元格：[Symbol+Price, Change%, Δ%...]，单元格之间以一个空格分隔。"""
+    left = f"{symbol:<{SYM_W}} {price:>{PRICE_W}.6f} "
+    cells: List[Cell] = [(left, len(left))]
     # 百分比包含符号，右对齐
     pct_str = f"{pct:+.3f}%"
     if colorize:
-        pct_str = (Fore.RED if pct < 0 else Fore.GREEN) + pct_str + Style.RESET_ALL
-    left = f"{symbol:<{SYM_W}} {price:>{PRICE_W}.6f} "
-    mid = _pad_visual(pct_str, PCT_W)
+        cells.append(_colored(pct_str, PCT_W, Fore.RED if pct < 0 else Fore.GREEN))
+    else:
+        cells.append((f"{pct_str:<{PCT_W}}", max(PCT_W, len(pct_str))))
     # 多窗口Δ%
-    pieces: List[str] = []
     for w in (windows or []):
         val = None if not deltas else deltas.get(w)
         if val is None:
-            pieces.append(" " * DELTA_W)
+            cells.append((" " * DELTA_W, DELTA_W))
             continue
         dstr = f"{val:+.3f}%"
-        is_highlight = highlight_threshold is not None and abs(val) >= float(highlight_threshold)
         if colorize:
             color = Fore.RED if val < 0 else Fore.GREEN
-            if is_highlight:
-                dstr = Style.BRIGHT + color + dstr + Style.RESET_ALL
-            else:
-                dstr = color + dstr + Style.RESET_ALL
-        pieces.append(_pad_visual(dstr, DELTA_W))
-    return left + mid + " " + " ".join(pieces)
+            if highlight_threshold is not None and abs(val) >= float(highlight_threshold):
+                color = Style.BRIGHT + color
+            cells.append(_colored(dstr, DELTA_W, color))
+        else:
+            cells.append((f"{dstr:<{DELTA_W}}", max(DELTA_W, len(dstr))))
+    return cells
+
+
+def _join_row(cells: List[Cell]) -> str:
+    return cells[0][0] + cells[1][0] + " " + " ".join(c for c, _ in cells[2:])
+
+
+def _format_row(
+    symbol: str,
+    price: float,
+    pct: float,
+    deltas: Dict[int, float] | None = None,
+    windows: List[int] | None = None,
+    *,
+    colorize: bool = True,
+    highlight_threshold: float | None = None,
+) -> str:
+    return _join_row(_row_cells(symbol, price, pct, deltas, windows, colorize=colorize, highlight_threshold=highlight_threshold))
 
 
 def print_board(
@@ -81,7 +113,17 @@ def print_board(
         print(_format_row(s, p, pct, deltas=dmap, windows=wlist, colorize=True, highlight_threshold=highlight_threshold))
 
 
-def print_boards_side_by_side(
+def _cells_line(cells: List[Cell], sep: str = " ") -> List[Cell]:
+    """把单元格按分隔符展开成一行（分隔符本身也是单元格，便于按列定位）。"""
+    out: List[Cell] = []
+    for i, c in enumerate(cells):
+        if i:
+            out.append((sep, len(sep)))
+        out.append(c)
+    return out
+
+
+def board_lines(
     left_title: str,
     left_rows: List[Tuple[str, float, float]],
     right_title: str,
@@ -90,32 +132,208 @@ def print_boards_side_by_side(
     windows: List[int] | None = None,
     *,
     highlight_threshold: float | None = None,
-):
-    # 标题行
+) -> List[List[Cell]]:
+    """并排榜单的逐行单元格表示（首行为空行，与 print 输出一致）。"""
     wlist = windows or []
     extras = " ".join([f"{str(w)+'mΔ%':>{DELTA_W}}" for w in wlist])
     head = f"{'Symbol':<{SYM_W}} {'Price':>{PRICE_W}} {'Change%':>{PCT_W}} {extras}"
     board_w = _visual_len(head)
     left_head = f"{left_title}".center(board_w)
     right_head = f"{right_title}".center(board_w)
-    print(f"\n{Style.BRIGHT}{left_head}{Style.RESET_ALL}   |   {Style.BRIGHT}{right_head}{Style.RESET_ALL}")
-
-    # 列头
-    print(f"{head}   |   {head}")
-    print(f"{'-' * len(head)}   |   {'-' * len(head)}")
-
-    n = max(len(left_rows), len(right_rows))
-    for i in range(n):
-        if i < len(left_rows):
-            ls, lp, lpc = left_rows[i]
-            ldmap = (delta_maps or {}).get(ls)
-            ltxt = _format_row(ls, lp, lpc, deltas=ldmap, windows=wlist, colorize=True, highlight_threshold=highlight_threshold)
-        else:
-            ltxt = " " * board_w
-        if i < len(right_rows):
-            rs, rp, rpc = right_rows[i]
-            rdmap = (delta_maps or {}).get(rs)
-            rtxt = _format_row(rs, rp, rpc, deltas=rdmap, windows=wlist, colorize=True, highlight_threshold=highlight_threshold)
-        else:
-            rtxt = " " * board_w
-        print(f"{ltxt}   |   {rtxt}")
+    sep: Cell = ("   |   ", 7)
+    lines: List[List[Cell]] = [
+        [],
+        [(f"{Style.BRIGHT}{left_head}{Style.RESET_ALL}", len(left_head)), sep, (f"{Style.BRIGHT}{right_head}{Style.RESET_ALL}", len(right_head))],
+        [(head, len(head)), sep, (head, len(head))],
+        [("-" * len(head), len(head)), sep, ("-" * len(head), len(head))],
+    ]
+    dm = delta_maps or {}
+    blank: List[Cell] = [(" " * board_w, board_w)]
+
+    def _side(rows: List[Tuple[str, float, float]], i: int) -> List[Cell]:
+        if i >= len(rows):
+            return blank
+        s, p, pc = rows[i]
+        cells = _row_cells(s, p, pc, deltas=dm.get(s), windows=wlist, colorize=True, highlight_threshold=highlight_threshold)
+        # 与 _join_row 相同的拼接：Symbol+Price 与 Change% 紧邻，其后各列以空格分隔
+        return [cells[0], cells[1], (" ", 1), *_cells_line(cells[2:])]
+
+    for i in range(max(len(left_rows), len(right_rows))):
+        lines.append([*_side(left_rows, i), sep, *_side(right_rows, i)])
+    return lines
+
+
+def line_text(cells: List[Cell]) -> str:
+    return "".join(c for c, _ in cells)
+
+
+def print_boards_side_by_side(
+    left_title: str,
+    left_rows: List[Tuple[str, float, float]],
+    right_title: str,
+    right_rows: List[Tuple[str, float, float]],
+    delta_maps: Dict[str, Dict[int, float]] | None = None,
+    windows: List[int] | None = None,
+    *,
+    highlight_threshold: float | None = None,
+):
+    lines = board_lines(
+        left_title, left_rows, right_title, right_rows,
+        delta_maps=delta_maps, windows=windows, highlight_threshold=highlight_threshold,
+    )
+    print("\n".join(line_text(cells) for cells in lines))
+
+
+Frame = List[List[Cell]]
+
+
+class BoardRenderer:
+    """后台线程渲染榜单：事件循环只提交一帧的构建函数，格式化与写终端都在渲染线程完成。
+
+    - 帧率上限 max_fps：两帧之间不足 1/max_fps 秒时等待，期间提交的新帧覆盖旧帧（只画最新一帧）；
+    - 终端（TTY）下保留上一帧的屏幕缓冲，逐单元格比较，只把变化的单元格用光标定位重写；
+      单元格宽度变化或行结构变化时整行重写；
+    - 非终端（重定向到文件、systemd 日志）下按原样整帧输出，不写任何光标控制序列；
+    - log() 输出告警等消息：TTY 下保留最近 log_lines 条显示在榜单下方，否则直接按行输出；
+      终端行数不够时截掉榜单末尾的行，消息区始终可见。
+    """
+
+    def __init__(
+        self,
+        stream: Optional[TextIO] = None,
+        *,
+        max_fps: float = 2.0,
+        ansi: Optional[bool] = None,
+        log_lines: int = 10,
+    ):
+        self.stream = stream if stream is not None else sys.stdout
+        if ansi is None:
+            try:
+                ansi = bool(self.stream.isatty())
+            except Exception:
+                ansi = False
+        self.ansi = ansi
+        self.min_interval = 1.0 / max_fps if max_fps and max_fps > 0 else 0.0
+        self._cond = threading.Condition()
+        self._pending: Optional[Callable[[], Frame]] = None
+        self._logs: Deque[str] = deque()
+        self._recent: Deque[str] = deque(maxlen=max(0, int(log_lines)))
+        self._screen: Frame = []
+        self._board: Frame = []  # 最近一帧榜单（未截断），只有消息时据此重画
+        self._last_draw = 0.0
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+        self.stats: Dict[str, int] = {"frames": 0, "superseded": 0, "cells": 0, "lines": 0, "bytes": 0}
+
+    def start(self) -> "BoardRenderer":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="board-renderer", daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, build: Callable[[], Frame]) -> None:
+        """提交一帧（不阻塞）；build 在渲染线程中调用，应只引用本轮的快照数据。"""
+        with self._cond:
+            if self._pending is not None:
+                self.stats["superseded"] += 1
+            self._pending = build
+            self._cond.notify()
+
+    def log(self, text: str) -> None:
+        with self._cond:
+            self._logs.append(text)
+            self._cond.notify()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """画完最后一帧后退出渲染线程。"""
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while self._pending is None and not self._logs and not self._stop:
+                    self._cond.wait()
+                if self._pending is not None and not self._stop:
+                    # 帧率上限：等待期间到来的新帧直接替换
+                    wait = self._last_draw + self.min_interval - time.monotonic()
+                    while wait > 0 and not self._stop:
+                        self._cond.wait(wait)
+                        wait = self._last_draw + self.min_interval - time.monotonic()
+                build, self._pending = self._pending, None
+                logs = list(self._logs)
+                self._logs.clear()
+                stop = self._stop
+            try:
+                self._draw(build, logs)
+            except Exception as e:  # 渲染失败不影响监控
+                try:
+                    self.stream.write(f"[render] 渲染失败: {e!r}\n")
+                except Exception:
+                    pass
+            if stop:
+                if self.ansi and self._screen:
+                    self._write(f"\x1b[{len(self._screen) + 1};1H\n")
+                return
+
+    def _write(self, out: str) -> None:
+        self.stream.write(out)
+        self.stream.flush()
+        self.stats["bytes"] += len(out)
+
+    def _draw(self, build: Optional[Callable[[], Frame]], logs: List[str]) -> None:
+        if not self.ansi:
+            parts = list(logs)
+            if build is not None:
+                parts.extend(line_text(cells) for cells in build())
+                self.stats["frames"] += 1
+                self._last_draw = time.monotonic()
+            if parts:
+                self._write("\n".join(parts) + "\n")
+            return
+        self._recent.extend(logs)
+        if build is None and not logs:
+            return
+        if build is not None:
+            self._board = build()
+            self.stats["frames"] += 1
+            self._last_draw = time.monotonic()
+        # 为消息区预留行（空行 + 最近消息），榜单只用剩余的行，超出部分截掉
+        avail = max(1, shutil.get_terminal_size((200, 60)).lines - 1)
+        tail: Frame = []
+        if self._recent:
+            tail = [[], *([(t, _visual_len(t))] for t in self._recent)][-avail:]
+        frame = self._board[: avail - len(tail)] + tail
+        self._write(self._diff(frame))
+        self._screen = frame
+
+    def _diff(self, frame: Frame) -> str:
+        out: List[str] = []
+        if not self._screen:
+            out.append("\x1b[2J")
+        old = self._screen
+        for i, cells in enumerate(frame):
+            prev = old[i] if i < len(old) else None
+            if prev == cells:
+                continue
+            row = i + 1
+            if prev is not None and len(prev) == len(cells) and all(a[1] == b[1] for a, b in zip(prev, cells)):
+                # 结构不变：只重写变化的单元格
+                col = 1
+                for a, b in zip(prev, cells):
+                    if a[0] != b[0]:
+                        out.append(f"\x1b[{row};{col}H{b[0]}")
+                        self.stats["cells"] += 1
+                    col += b[1]
+            else:
+                out.append(f"\x1b[{row};1H{line_text(cells)}\x1b[K")
+                self.stats["lines"] += 1
+        for i in range(len(frame), len(old)):
+            out.append(f"\x1b[{i + 1};1H\x1b[K")
+        if out:
+            out.append(f"\x1b[{len(frame) + 1};1H")
+        return "".join(out)
@@ -62,6 +62,17 @@ class EMASet:
         e83.seed(closes)
         return cls(e13, e21, e72, e83)
 
+    @classmethod
+    def from_values(cls, values: Iterable[float]) -> "EMASet":
+        """由已算好的 (EMA13, EMA21, EMA72, EMA83) 直接构造（如向量化seed的结果）。"""
+        v13, v21, v72, v83 = (float(v) for v in values)
+        return cls(
+            EMA(13, value=v13, _seeded=True),
+            EMA(21, value=v21, _seeded=True),
+            EMA(72, value=v72, _seeded=True),
+            EMA(83, value=v83, _seeded=True),
+        )
+
     def update(self, close: float) -> Tuple[float, float, float, float]:
         return (
             self.ema13.update(close),
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 与 ema.EMASet 对应的四条均线周期（列顺序固定）
+PERIODS: Tuple[int, int, int, int] = (13, 21, 72, 83)
+
+# detect_cross_batch 返回码 -> detect_cross 的字符串结果
+CROSS_NAMES: Dict[int, str] = {1: "up", -1: "down"}
+
+
+@lru_cache(maxsize=16)
+def _seed_weights(n: int) -> np.ndarray:
+    """长度为 n 的收盘序列 -> 四条EMA最终值的线性权重矩阵 (n, 4)。
+
+    EMA.seed 先取前 p 根的SMA，再逐根递推 v = (c - v) * k + v，
+    展开后最终值是收盘价的线性组合：
+      前 p 根权重 (1-k)^m / p，第 p+i 根权重 k * (1-k)^(m-1-i)，其中 m = n - p。
+    """
+    w = np.zeros((n, len(PERIODS)), dtype=np.float64)
+    for j, p in enumerate(PERIODS):
+        k = 2.0 / (p + 1.0)
+        m = n - p
+        w[:p, j] = (1.0 - k) ** m / p
+        w[p:, j] = k * (1.0 - k) ** np.arange(m - 1, -1, -1, dtype=np.float64)
+    w.setflags(write=False)
+    return w
+
+
+def seed_ema_batch(closes: np.ndarray) -> np.ndarray:
+    """一次性计算 SMA 初始化的 EMA13/21/72/83。
+
+    closes 为 (L,) 或 (n, L)（多个交易对等长序列）的收盘价，
+    返回 (4,) 或 (n, 4)，与 EMASet.create_seeded 的结果一致（浮点舍入误差内）。
+    """
+    c = np.asarray(closes, dtype=np.float64)
+    n = c.shape[-1]
+    if n < max(PERIODS):
+        raise ValueError(f"初始化EMA需要至少{max(PERIODS)}根1m收盘价")
+    return c @ _seed_weights(n)
+
+
+def detect_cross_batch(prev: np.ndarray, cur: np.ndarray) -> np.ndarray:
+    """detect_cross 的向量化版本。
+
+    prev/cur 为 (n, 4) 矩阵（列依次为 EMA13/21/72/83），
+    返回 int8 数组：1 表示上穿，-1 表示下穿，0 表示无交叉。
+    """
+    p_fast_min = np.minimum(prev[:, 0], prev[:, 1])
+    p_fast_max = np.maximum(prev[:, 0], prev[:, 1])
+    p_slow_min = np.minimum(prev[:, 2], prev[:, 3])
+    p_slow_max = np.maximum(prev[:, 2], prev[:, 3])
+    c_fast_min = np.minimum(cur[:, 0], cur[:, 1])
+    c_fast_max = np.maximum(cur[:, 0], cur[:, 1])
+    c_slow_min = np.minimum(cur[:, 2], cur[:, 3])
+    c_slow_max = np.maximum(cur[:, 2], cur[:, 3])
+
+    up = (p_fast_min <= p_slow_max) & (c_fast_min > c_slow_max)
+    # 与标量版保持一致：上穿优先判断
+    down = ~up & (p_fast_max >= p_slow_min) & (c_fast_max < c_slow_min)
+    return up.astype(np.int8) - down.astype(np.int8)
+
+
+class EMARow:
+    """EMAMatrix 中单个交易对的视图，接口与 EMASet 的 update/snapshot 一致。"""
+
+    __slots__ = ("_matrix", "_idx")
+
+    def __init__(self, matrix: "EMAMatrix", idx: int):
+        self._matrix = matrix
+        self._idx = idx
+
+    def update(self, close: float) -> Tuple[float, float, float, float]:
+        row = self._matrix.values[self._idx]
+        row += (float(close) - row) * self._matrix.k
+        return self.snapshot()
+
+    def snapshot(self) -> Tuple[float, float, float, float]:
+        r = self._matrix.values[self._idx]
+        return (float(r[0]), float(r[1]), float(r[2]), float(r[3]))
+
+
+class EMAMatrix:
+    """以连续数组保存全部交易对的 EMA13/21/72/83，并按批推进。
+
+    - values 为 (capacity, 4) 的 float64 矩阵，每个交易对占一行；
+    - step() 对本分钟有新收盘的所有交易对做一次矩阵运算，并返回交叉掩码；
+    - 递推公式与 EMA.update 完全相同，结果逐位一致。
+    """
+
+    def __init__(self, capacity: int = 512):
+        self.k = np.array([2.0 / (p + 1.0) for p in PERIODS], dtype=np.float64)
+        self.values = np.zeros((max(1, int(capacity)), len(PERIODS)), dtype=np.float64)
+        self._index: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._next = 0
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._index
+
+    def _alloc(self) -> int:
+        if self._free:
+            return self._free.pop()
+        if self._next >= self.values.shape[0]:
+            grown = np.zeros((self.values.shape[0] * 2, self.values.shape[1]), dtype=np.float64)
+            grown[: self.values.shape[0]] = self.values
+            self.values = grown
+        idx = self._next
+        self._next += 1
+        return idx
+
+    def add(self, symbol: str, values: Sequence[float]) -> EMARow:
+        """登记（或覆盖）一个交易对的当前EMA值，返回其行视图。"""
+        idx = self._index.get(symbol)
+        if idx is None:
+            idx = self._alloc()
+            self._index[symbol] = idx
+        self.values[idx] = np.asarray(values, dtype=np.float64)
+        return EMARow(self, idx)
+
+    def remove(self, symbol: str) -> None:
+        idx = self._index.pop(symbol, None)
+        if idx is not None:
+            self._free.append(idx)
+
+    def row(self, symbol: str) -> Optional[EMARow]:
+        idx = self._index.get(symbol)
+        return EMARow(self, idx) if idx is not None else None
+
+    def step(self, symbols: Sequence[str], closes: Sequence[float]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """用一批收盘价推进对应交易对的EMA。
+
+        返回 (prev, cur, cross)：prev/cur 为 (len(symbols), 4)，cross 见 detect_cross_batch。
+        同一批内每个交易对只能出现一次。
+        """
+        idx = np.fromiter((self._index[s] for s in symbols), dtype=np.intp, count=len(symbols))
+        c = np.asarray(closes, dtype=np.float64)
+        prev = self.values[idx]
+        cur = (c[:, None] - prev) * self.k + prev
+        self.values[idx] = cur
+        return prev, cur, detect_cross_batch(prev, cur)
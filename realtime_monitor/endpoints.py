@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+# 尚无延迟样本时的假定延迟（秒）
+_DEFAULT_LATENCY = 0.3
+# 列表中靠后的端点按序号加罚，健康状况相近时优先使用主端点
+_ORDER_PENALTY = 0.25
+
+
+class Endpoint:
+    """单个 REST 端点：一个长连接客户端 + 滚动健康统计。"""
+
+    def __init__(self, base_url: str, client: httpx.AsyncClient, order: int):
+        self.base_url = base_url
+        self.client = client
+        self.order = order
+        self.latency: Optional[float] = None  # 成功请求延迟的 EWMA（秒）
+        self.error_rate = 0.0  # 失败率 EWMA
+        self.banned_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.bans = 0
+        self.last_status: Optional[int] = None
+
+    def banned(self, now: float) -> bool:
+        return now < self.banned_until
+
+    def score(self) -> float:
+        lat = self.latency if self.latency is not None else _DEFAULT_LATENCY
+        return lat * (1.0 + 4.0 * self.error_rate) * (1.0 + _ORDER_PENALTY * self.order)
+
+
+class EndpointPool:
+    """多端点连接池：每个 base URL 保持一个长连接客户端，按健康度路由请求。
+
+    - 健康度 = 延迟 EWMA × 失败率惩罚 × 顺序惩罚，冷却中的端点不参与选择；
+    - 遇到风控/限流时只让该端点冷却，不关闭连接，恢复后可直接复用已建立的连接；
+    - 全部端点都在冷却时，选择最早解除冷却的那个。
+    """
+
+    def __init__(
+        self,
+        base_urls: Iterable[str],
+        build_client: Callable[[str], httpx.AsyncClient],
+        *,
+        alpha: float = 0.2,
+        log: Callable[[str], None] = print,
+    ):
+        self._alpha = alpha
+        # 冷却等提示的输出（有榜单渲染器时由其统一输出，避免打乱差量重绘的屏幕）
+        self.log = log
+        self.endpoints: List[Endpoint] = [Endpoint(u, build_client(u), i) for i, u in enumerate(base_urls)]
+        # (base_url, 冷却原因) -> 次数，如 status-429 / status-418 / net-error-ReadTimeout
+        self.ban_counts: Dict[Tuple[str, str], int] = {}
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    def pick(self, exclude: Iterable[Endpoint] = ()) -> Optional[Endpoint]:
+        skip = set(id(e) for e in exclude)
+        cands = [e for e in self.endpoints if id(e) not in skip]
+        if not cands:
+            return None
+        now = time.monotonic()
+        healthy = [e for e in cands if not e.banned(now)]
+        if healthy:
+            return min(healthy, key=lambda e: e.score())
+        return min(cands, key=lambda e: e.banned_until)
+
+    def record(self, ep: Endpoint, latency: float, *, ok: bool, status: Optional[int] = None) -> None:
+        a = self._alpha
+        ep.requests += 1
+        ep.last_status = status
+        if ok:
+            ep.latency = latency if ep.latency is None else (1 - a) * ep.latency + a * latency
+            ep.error_rate = (1 - a) * ep.error_rate
+        else:
+            ep.errors += 1
+            ep.error_rate = (1 - a) * ep.error_rate + a
+
+    def record_latency(self, ep: Endpoint, latency: float) -> None:
+        """只记延迟、不计成败（如对冲落败被取消的请求：已耗时是其延迟的下界，只会拉高估计）。"""
+        ep.requests += 1
+        if ep.latency is None or latency > ep.latency:
+            a = self._alpha
+            ep.latency = latency if ep.latency is None else (1 - a) * ep.latency + a * latency
+
+    def ban(self, ep: Endpoint, seconds: float, reason: str = "") -> None:
+        ep.bans += 1
+        key = (ep.base_url, reason or "-")
+        self.ban_counts[key] = self.ban_counts.get(key, 0) + 1
+        ep.banned_until = max(ep.banned_until, time.monotonic() + max(0.0, float(seconds)))
+        # 记录冷却原因，便于排障
+        self.log(f"[binance] cooldown {ep.base_url} {seconds:.0f}s (reason={reason})")
+
+    def stats(self) -> List[Dict[str, object]]:
+        now = time.monotonic()
+        return [
+            {
+                "base_url": e.base_url,
+                "latency_ms": e.latency * 1000 if e.latency is not None else None,
+                "error_rate": e.error_rate,
+                "requests": e.requests,
+                "errors": e.errors,
+                "bans": e.bans,
+                "cooldown_s": max(0.0, e.banned_until - now),
+                "last_status": e.last_status,
+            }
+            for e in self.endpoints
+        ]
+
+    async def aclose(self) -> None:
+        for e in self.endpoints:
+            try:
+                await e.client.aclose()
+            except Exception:
+                pass
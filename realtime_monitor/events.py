@@ -3,8 +3,15 @@ from __future__ import annotations
 import os
 import json
 import csv
-from datetime import datetime, timezone
-from typing import Dict, Any
+import queue
+import threading
+import time
+from datetime import date, datetime, timezone
+from typing import Callable, Dict, Any, IO, Optional
+
+CSV_FIELDS = [
+    "ts","ts_iso","symbol","timeframe","strategy","kind","direction","open_time","price","ema21","high","low","quote_volume","confirm_candles","message"
+]
 
 
 def _ensure_dir(path: str) -> None:
@@ -24,13 +31,44 @@ def _ts_iso(ts: int) -> str:
     return datetime.fromtimestamp(ts, tz=timezone.utc).astimezone().isoformat()
 
 
-async def append_event(dir_path: str, ev: Dict[str, Any]) -> None:
-    _ensure_dir(dir_path)
-    # enrich
+def _enrich(ev: Dict[str, Any]) -> Dict[str, Any]:
     ev = dict(ev)
     ts = int(ev.get("ts") or (ev.get("open_time", 0) // 1000))
     ev["ts"] = ts
     ev["ts_iso"] = _ts_iso(ts)
+    # 早期事件没有周期字段，均为 1m
+    if not ev.get("timeframe"):
+        ev["timeframe"] = "1m"
+    # 未标策略的事件来自内置的 EMA 交叉规则
+    if not ev.get("strategy"):
+        ev["strategy"] = "ema_cross"
+    return ev
+
+
+def _archive_stale_csv(cpath: str) -> None:
+    """已有 alerts.csv 的表头与当前字段不一致（字段有增减）时归档旧文件，避免新旧列错位。"""
+    try:
+        if not os.path.exists(cpath) or os.path.getsize(cpath) == 0:
+            return
+        with open(cpath, "r", encoding="utf-8", newline="") as f:
+            header = next(csv.reader(f), [])
+    except (OSError, UnicodeDecodeError):
+        return
+    if header == CSV_FIELDS:
+        return
+    base, ext = os.path.splitext(cpath)
+    dst = f"{base}.{datetime.now().strftime('%Y%m%d-%H%M%S')}{ext}"
+    n = 1
+    while os.path.exists(dst):
+        dst = f"{base}.{datetime.now().strftime('%Y%m%d-%H%M%S')}-{n}{ext}"
+        n += 1
+    os.replace(cpath, dst)
+
+
+async def append_event(dir_path: str, ev: Dict[str, Any]) -> None:
+    _ensure_dir(dir_path)
+    # enrich
+    ev = _enrich(ev)
 
     # JSONL append
     jpath = _jsonl_path(dir_path)
@@ -39,13 +77,214 @@ async def append_event(dir_path: str, ev: Dict[str, Any]) -> None:
 
     # CSV append
     cpath = _csv_path(dir_path)
-    fieldnames = [
-        "ts","ts_iso","symbol","kind","direction","open_time","price","ema21","high","low","quote_volume","confirm_candles","message"
-    ]
+    _archive_stale_csv(cpath)
     write_header = not os.path.exists(cpath) or os.path.getsize(cpath) == 0
     with open(cpath, "a", newline="", encoding="utf-8") as cf:
-        writer = csv.DictWriter(cf, fieldnames=fieldnames)
+        writer = csv.DictWriter(cf, fieldnames=CSV_FIELDS)
         if write_header:
             writer.writeheader()
-        row = {k: ev.get(k) for k in fieldnames}
+        row = {k: ev.get(k) for k in CSV_FIELDS}
         writer.writerow(row)
+
+
+_STOP = object()
+
+
+class EventWriter:
+    """后台线程批量写事件，事件循环中只做一次非阻塞入队。
+
+    - 有界队列：队满时丢弃新事件并计数，不阻塞行情处理；
+    - 文件句柄常开，每批写完后 flush；flush_interval > 0 时按间隔 flush，fsync=True 时 flush 后落盘；
+    - max_bytes 超过时、或 rotate_daily 且跨日时，将 alerts.jsonl/alerts.csv 重命名为带后缀的归档再新建；
+    - stats() 返回已写/丢弃数量与队列高水位，用于观察背压；
+    - history_db 指定时，每批事件同时写入 SQLite 告警历史（见 history.AlertHistory）。
+    """
+
+    def __init__(
+        self,
+        dir_path: str,
+        *,
+        max_queue: int = 10_000,
+        flush_interval: float = 0.0,
+        fsync: bool = False,
+        max_bytes: Optional[int] = None,
+        rotate_daily: bool = False,
+        history_db: Optional[str] = None,
+        log: Callable[[str], None] = print,
+    ):
+        self.dir_path = dir_path
+        # 写线程的提示经 log 输出（终端榜单模式下为渲染器，直接 print 会打乱光标定位的画面）
+        self.log = log
+        self.flush_interval = float(flush_interval)
+        self.fsync = fsync
+        self.max_bytes = int(max_bytes) if max_bytes else None
+        self.rotate_daily = rotate_daily
+        self.history_db = history_db
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._thread: Optional[threading.Thread] = None
+        self._jf: Optional[IO[str]] = None
+        self._cf: Optional[IO[str]] = None
+        self._csv: Optional[csv.DictWriter] = None
+        self._day: Optional[date] = None
+        self._last_flush = 0.0
+        self._dirty = False
+        # 统计
+        self.written = 0
+        self.dropped = 0
+        self.high_water = 0
+        self.batches = 0
+        self.rotations = 0
+        self.errors = 0
+
+    def start(self) -> "EventWriter":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="event-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, ev: Dict[str, Any]) -> bool:
+        """非阻塞入队；队满返回 False。"""
+        try:
+            self._queue.put_nowait(ev)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.high_water = max(self.high_water, self._queue.qsize())
+        return True
+
+    def close(self, timeout: float = 5.0) -> None:
+        """写完队列中剩余事件后关闭文件。"""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize(),
+            "high_water": self.high_water,
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "rotations": self.rotations,
+            "errors": self.errors,
+        }
+
+    # ---- 以下在写线程中执行 ----
+
+    def _open(self) -> None:
+        _ensure_dir(self.dir_path)
+        self._jf = open(_jsonl_path(self.dir_path), "a", encoding="utf-8")
+        _archive_stale_csv(_csv_path(self.dir_path))
+        self._cf = open(_csv_path(self.dir_path), "a", newline="", encoding="utf-8")
+        self._csv = csv.DictWriter(self._cf, fieldnames=CSV_FIELDS)
+        if self._cf.tell() == 0:
+            self._csv.writeheader()
+        self._day = date.today()
+
+    def _close_files(self) -> None:
+        for f in (self._jf, self._cf):
+            if f is not None:
+                try:
+                    f.close()
+                except OSError:
+                    pass
+        self._jf = self._cf = None
+        self._csv = None
+
+    def _rotate(self, suffix: str) -> None:
+        self._close_files()
+        for src in (_jsonl_path(self.dir_path), _csv_path(self.dir_path)):
+            if not os.path.exists(src) or os.path.getsize(src) == 0:
+                continue
+            base, ext = os.path.splitext(src)
+            dst = f"{base}.{suffix}{ext}"
+            n = 1
+            while os.path.exists(dst):
+                dst = f"{base}.{suffix}-{n}{ext}"
+                n += 1
+            os.replace(src, dst)
+        self.rotations += 1
+        self._open()
+
+    def _maybe_rotate(self) -> None:
+        assert self._jf is not None
+        if self.rotate_daily and self._day is not None and date.today() != self._day:
+            self._rotate(self._day.strftime("%Y%m%d"))
+        elif self.max_bytes and self._jf.tell() >= self.max_bytes:
+            self._rotate(datetime.now().strftime("%Y%m%d-%H%M%S"))
+
+    def _flush(self, force: bool = False) -> None:
+        if not self._dirty:
+            return
+        now = time.monotonic()
+        if not force and self.flush_interval > 0 and now - self._last_flush < self.flush_interval:
+            return
+        for f in (self._jf, self._cf):
+            if f is None:
+                continue
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self._last_flush = now
+        self._dirty = False
+
+    def _write(self, ev: Dict[str, Any]) -> None:
+        if self._jf is None:
+            self._open()
+        self._maybe_rotate()
+        assert self._jf is not None and self._csv is not None
+        ev = _enrich(ev)
+        self._jf.write(json.dumps(ev, ensure_ascii=False) + "\n")
+        self._csv.writerow({k: ev.get(k) for k in CSV_FIELDS})
+        self.written += 1
+        self._dirty = True
+
+    def _run(self) -> None:
+        timeout = self.flush_interval if self.flush_interval > 0 else None
+        history = None
+        if self.history_db:
+            from .history import AlertHistory
+            try:
+                history = AlertHistory(self.history_db)
+            except Exception as e:
+                self.errors += 1
+                self.log(f"[events] 打开告警历史库失败: {e!r}")
+        stop = False
+        while not stop:
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._flush(force=True)
+                continue
+            # 取出当前积压的全部事件，合并为一批写入
+            batch = [item]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            events = [ev for ev in batch if ev is not _STOP]
+            stop = len(events) != len(batch)
+            for ev in events:
+                try:
+                    self._write(ev)
+                except Exception:
+                    self.errors += 1
+            if history is not None and events:
+                try:
+                    history.insert_many(events)
+                except Exception:
+                    self.errors += 1
+            self.batches += 1
+            try:
+                self._flush(force=stop)
+            except OSError:
+                self.errors += 1
+        self._close_files()
+        if history is not None:
+            history.close()
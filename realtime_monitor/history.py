@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from .events import CSV_FIELDS, _enrich
+from .time_utils import parse_time_ms
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY,
+    ts INTEGER,
+    ts_iso TEXT,
+    symbol TEXT NOT NULL,
+    timeframe TEXT NOT NULL DEFAULT '1m',
+    strategy TEXT NOT NULL DEFAULT 'ema_cross',
+    kind TEXT NOT NULL,
+    direction TEXT NOT NULL DEFAULT '',
+    open_time INTEGER NOT NULL,
+    price REAL,
+    ema21 REAL,
+    high REAL,
+    low REAL,
+    quote_volume REAL,
+    confirm_candles INTEGER,
+    message TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS alerts_uniq_key ON alerts (symbol, timeframe, strategy, kind, direction, open_time);
+CREATE INDEX IF NOT EXISTS alerts_open_time ON alerts (open_time);
+CREATE INDEX IF NOT EXISTS alerts_kind_dir_time ON alerts (kind, direction, open_time);
+"""
+
+# 后加的列（旧库打开时补齐）与被取代的唯一索引
+_ADDED_COLUMNS = {
+    "timeframe": "TEXT NOT NULL DEFAULT '1m'",
+    "strategy": "TEXT NOT NULL DEFAULT 'ema_cross'",
+}
+_LEGACY_UNIQUE_INDEXES = ("alerts_uniq", "alerts_uniq_tf")
+
+_COLUMNS = list(CSV_FIELDS)
+_INSERT = f"INSERT OR IGNORE INTO alerts ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' for _ in _COLUMNS)})"
+
+_NUMERIC = {
+    "ts": int,
+    "open_time": int,
+    "confirm_candles": int,
+    "price": float,
+    "ema21": float,
+    "high": float,
+    "low": float,
+    "quote_volume": float,
+}
+
+
+def _row(ev: Dict[str, Any]) -> tuple:
+    out = []
+    for k in _COLUMNS:
+        v = ev.get(k)
+        if v == "":
+            v = None
+        if v is None and k == "direction":
+            v = ""  # 唯一索引视 NULL 互不相同，无方向的告警存 '' 才能去重
+        if v is not None and k in _NUMERIC:
+            try:
+                v = _NUMERIC[k](float(v))
+            except (TypeError, ValueError):
+                v = None
+        out.append(v)
+    return tuple(out)
+
+
+class AlertHistory:
+    """告警历史的 SQLite 存储，与 CSV/JSONL 并存。
+
+    - 唯一索引 (symbol, timeframe, strategy, kind, direction, open_time)，重复写入/重复导入自动忽略；
+      无方向的告警 direction 存 ''（NULL 在唯一索引中互不相等，会被重复导入）；
+    - 旧库（无 timeframe / strategy 列）打开时自动加列（已有记录视为 1m、内置规则）并重建唯一索引；
+    - 按 symbol / kind+direction / open_time 建索引，常见筛选无需全表扫描；
+    - 连接只能在创建它的线程中使用（EventWriter 在写线程中创建）。
+    """
+
+    def __init__(self, path: str):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+        self._conn.executescript(_SCHEMA)
+
+    def _migrate(self) -> None:
+        cols = {r[1] for r in self._conn.execute("PRAGMA table_info(alerts)")}
+        if not cols:
+            return
+        missing = [c for c in _ADDED_COLUMNS if c not in cols]
+        if missing:
+            with self._conn:
+                for c in missing:
+                    self._conn.execute(f"ALTER TABLE alerts ADD COLUMN {c} {_ADDED_COLUMNS[c]}")
+                for idx in _LEGACY_UNIQUE_INDEXES:
+                    self._conn.execute(f"DROP INDEX IF EXISTS {idx}")
+        if self._conn.execute("SELECT 1 FROM alerts WHERE direction IS NULL LIMIT 1").fetchone():
+            # 旧库中 direction 为 NULL 的行：去掉重复导入的副本后改为 ''
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM alerts WHERE direction IS NULL AND id NOT IN ("
+                    "SELECT MIN(id) FROM alerts WHERE direction IS NULL GROUP BY symbol, timeframe, strategy, kind, open_time)"
+                )
+                self._conn.execute("UPDATE OR IGNORE alerts SET direction = '' WHERE direction IS NULL")
+                self._conn.execute("DELETE FROM alerts WHERE direction IS NULL")
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def insert_many(self, events: Iterable[Dict[str, Any]]) -> int:
+        """写入一批事件（单个事务），返回新增行数。"""
+        before = self._conn.total_changes
+        with self._conn:
+            self._conn.executemany(_INSERT, (_row(_enrich(ev)) for ev in events))
+        return self._conn.total_changes - before
+
+    def import_file(self, path: str, *, batch: int = 5000) -> int:
+        """批量导入已有的 alerts.jsonl / alerts.csv，返回新增行数。"""
+        added = 0
+        buf: List[Dict[str, Any]] = []
+        for ev in _iter_file(path):
+            buf.append(ev)
+            if len(buf) >= batch:
+                added += self.insert_many(buf)
+                buf.clear()
+        if buf:
+            added += self.insert_many(buf)
+        return added
+
+    def query(
+        self,
+        *,
+        symbol: Optional[str] = None,
+        timeframe: Optional[str] = None,
+        strategy: Optional[str] = None,
+        kind: Optional[str] = None,
+        direction: Optional[str] = None,
+        since_ms: Optional[int] = None,
+        until_ms: Optional[int] = None,
+        min_quote_volume: Optional[float] = None,
+        limit: Optional[int] = 1000,
+    ) -> List[Dict[str, Any]]:
+        """按条件查询，按 open_time 倒序返回。"""
+        where: List[str] = []
+        args: List[Any] = []
+        for col, val in (
+            ("symbol", symbol.upper() if symbol else None),
+            ("timeframe", timeframe),
+            ("strategy", strategy),
+            ("kind", kind),
+            ("direction", direction),
+        ):
+            if val is not None:
+                where.append(f"{col} = ?")
+                args.append(val)
+        if since_ms is not None:
+            where.append("open_time >= ?")
+            args.append(int(since_ms))
+        if until_ms is not None:
+            where.append("open_time < ?")
+            args.append(int(until_ms))
+        if min_quote_volume is not None:
+            where.append("quote_volume >= ?")
+            args.append(float(min_quote_volume))
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM alerts"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY open_time DESC"
+        if limit:
+            sql += " LIMIT ?"
+            args.append(int(limit))
+        return [dict(r) for r in self._conn.execute(sql, args)]
+
+    def count(self) -> int:
+        return int(self._conn.execute("SELECT COUNT(*) FROM alerts").fetchone()[0])
+
+
+def _iter_file(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Query or import the alert history database")
+    parser.add_argument("--db", type=str, default="logs/alerts.db", help="SQLite database path (default logs/alerts.db)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_imp = sub.add_parser("import", help="Bulk import alerts.jsonl / alerts.csv files")
+    p_imp.add_argument("files", nargs="+")
+
+    p_q = sub.add_parser("query", help="Query alerts")
+    p_q.add_argument("--symbol", type=str, default=None)
+    p_q.add_argument("--timeframe", type=str, default=None, help="Candle timeframe of the alert, e.g. 1m, 5m, 1h")
+    p_q.add_argument("--strategy", type=str, default=None, help="Strategy id of the alert (built-in rule: ema_cross)")
+    p_q.add_argument("--kind", choices=["tip", "signal"], default=None)
+    p_q.add_argument("--direction", choices=["up", "down"], default=None)
+    p_q.add_argument("--since", type=str, default=None, help="open_time lower bound (ms or ISO date/time, local)")
+    p_q.add_argument("--until", type=str, default=None, help="open_time upper bound, exclusive (ms or ISO date/time, local)")
+    p_q.add_argument("--min-quote-volume", type=float, default=None)
+    p_q.add_argument("--limit", type=int, default=100)
+    p_q.add_argument("--json", action="store_true", help="Print rows as JSON lines")
+
+    args = parser.parse_args(argv)
+    hist = AlertHistory(args.db)
+    try:
+        if args.cmd == "import":
+            for path in args.files:
+                added = hist.import_file(path)
+                print(f"{path}: 新增 {added} 条")
+            print(f"共 {hist.count()} 条")
+            return
+        rows = hist.query(
+            symbol=args.symbol,
+            timeframe=args.timeframe,
+            strategy=args.strategy,
+            kind=args.kind,
+            direction=args.direction,
+            since_ms=parse_time_ms(args.since),
+            until_ms=parse_time_ms(args.until),
+            min_quote_volume=args.min_quote_volume,
+            limit=args.limit,
+        )
+        for r in rows:
+            if args.json:
+                print(json.dumps(r, ensure_ascii=False))
+            else:
+                print(f"{r['ts_iso']}  {r['symbol']:<14} {r['timeframe']:<4} {r['kind']:<6} {r['direction'] or '-':<4} {r['message']}")
+    finally:
+        hist.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+from collections import deque
+from datetime import datetime
+from typing import Callable, Deque, Dict, Optional, Type
+
+from tzlocal import get_localzone
+
+from .time_utils import local_midnight_utc_ms
+
+DAY_MS = 86_400_000
+
+
+class Indicator:
+    """逐根增量计算的指标：每根已收盘K线调用一次 update，预热完成前 value 为 None。
+
+    key 为规范化的规格字符串（如 "ema:21"、"rsi:14"、"vwap"），同一交易对上相同 key 的指标只算一次，
+    由所有声明了它的策略共享。warmup 为建议的预热根数（seed 时据此决定取多少历史）。
+    """
+
+    name = ""
+
+    def __init__(self) -> None:
+        self.value: Optional[float] = None
+
+    @property
+    def key(self) -> str:
+        return self.name
+
+    @property
+    def warmup(self) -> int:
+        return 1
+
+    def update(self, t: int, o: float, h: float, l: float, c: float, qv: float) -> Optional[float]:
+        raise NotImplementedError
+
+
+INDICATORS: Dict[str, Type[Indicator]] = {}
+
+
+def register_indicator(name: str) -> Callable[[Type[Indicator]], Type[Indicator]]:
+    """注册指标类；name 即规格字符串中冒号前的部分。"""
+    def deco(cls: Type[Indicator]) -> Type[Indicator]:
+        cls.name = name
+        INDICATORS[name] = cls
+        return cls
+    return deco
+
+
+def create_indicator(spec: str) -> Indicator:
+    """按规格字符串 "name[:period]" 创建指标；未知指标或参数非法时抛 ValueError。"""
+    name, _, arg = str(spec).strip().lower().partition(":")
+    cls = INDICATORS.get(name)
+    if cls is None:
+        raise ValueError(f"未知指标 {name}（可选：{', '.join(sorted(INDICATORS))}）")
+    if not arg:
+        return cls()
+    try:
+        period = int(arg)
+    except ValueError:
+        raise ValueError(f"指标 {spec} 的周期须为整数") from None
+    if period <= 0:
+        raise ValueError(f"指标 {spec} 的周期须为正数")
+    return cls(period)  # type: ignore[call-arg]
+
+
+def indicator_key(spec: str) -> str:
+    """规范化规格字符串（"EMA:021" -> "ema:21"），同时校验其合法。"""
+    return create_indicator(spec).key
+
+
+class _Periodic(Indicator):
+    default_period = 14
+
+    def __init__(self, period: Optional[int] = None) -> None:
+        super().__init__()
+        self.period = int(period or self.default_period)
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}:{self.period}"
+
+
+@register_indicator("ema")
+class EMAIndicator(_Periodic):
+    """与 ema.EMA.seed 相同的口径：前 period 根取 SMA 作为起点，之后逐根递推。"""
+
+    default_period = 21
+
+    def __init__(self, period: Optional[int] = None) -> None:
+        super().__init__(period)
+        self._k = 2.0 / (self.period + 1.0)
+        self._sum = 0.0
+        self._n = 0
+
+    @property
+    def warmup(self) -> int:
+        return self.period * 4
+
+    def update(self, t, o, h, l, c, qv):
+        if self.value is not None:
+            self.value = (c - self.value) * self._k + self.value
+            return self.value
+        self._sum += c
+        self._n += 1
+        if self._n >= self.period:
+            self.value = self._sum / self.period
+        return self.value
+
+
+@register_indicator("rsi")
+class RSIIndicator(_Periodic):
+    """Wilder RSI：前 period 个涨跌幅取均值作为起点，之后按 1/period 平滑。"""
+
+    def __init__(self, period: Optional[int] = None) -> None:
+        super().__init__(period)
+        self._prev: Optional[float] = None
+        self._gain = 0.0
+        self._loss = 0.0
+        self._n = 0
+
+    @property
+    def warmup(self) -> int:
+        return self.period * 10
+
+    def update(self, t, o, h, l, c, qv):
+        prev, self._prev = self._prev, c
+        if prev is None:
+            return self.value
+        d = c - prev
+        gain, loss = (d, 0.0) if d > 0 else (0.0, -d)
+        p = self.period
+        if self._n < p:
+            self._gain += gain
+            self._loss += loss
+            self._n += 1
+            if self._n < p:
+                return self.value
+            self._gain /= p
+            self._loss /= p
+        else:
+            self._gain = (self._gain * (p - 1) + gain) / p
+            self._loss = (self._loss * (p - 1) + loss) / p
+        if self._loss == 0:
+            self.value = 100.0 if self._gain > 0 else 50.0
+        else:
+            self.value = 100.0 - 100.0 / (1.0 + self._gain / self._loss)
+        return self.value
+
+
+@register_indicator("atr")
+class ATRIndicator(_Periodic):
+    """Wilder ATR：真实波幅 max(H-L, |H-前收|, |L-前收|)，首根用 H-L；前 period 根取均值后按 1/period 平滑。"""
+
+    def __init__(self, period: Optional[int] = None) -> None:
+        super().__init__(period)
+        self._prev: Optional[float] = None
+        self._sum = 0.0
+        self._n = 0
+
+    @property
+    def warmup(self) -> int:
+        return self.period * 10
+
+    def update(self, t, o, h, l, c, qv):
+        prev, self._prev = self._prev, c
+        tr = h - l if prev is None else max(h - l, abs(h - prev), abs(l - prev))
+        if self.value is not None:
+            self.value = (self.value * (self.period - 1) + tr) / self.period
+            return self.value
+        self._sum += tr
+        self._n += 1
+        if self._n >= self.period:
+            self.value = self._sum / self.period
+        return self.value
+
+
+@register_indicator("vwap")
+class VWAPIndicator(Indicator):
+    """成交量加权均价。
+
+    - "vwap"：当日（本地时区 0 点起）累计；只有从 0 点那根开始完整累计后才给出数值，
+      中途接入（历史不足一天）的交易对要等到下一个 0 点；
+    - "vwap:N"：最近 N 根的滚动 VWAP。
+
+    K线只带报价成交额（USDT），成交量按 成交额 / 典型价((H+L+C)/3) 折算，
+    即 VWAP = Σ成交额 / Σ(成交额/典型价)。
+    """
+
+    def __init__(self, period: Optional[int] = None) -> None:
+        super().__init__()
+        self.period = int(period) if period else None
+        self._quote = 0.0
+        self._base = 0.0
+        self._window: Deque[tuple] = deque()
+        self._day_end: Optional[int] = None
+        self._session_ok = False
+
+    @property
+    def key(self) -> str:
+        return f"vwap:{self.period}" if self.period else "vwap"
+
+    @property
+    def warmup(self) -> int:
+        return self.period if self.period else DAY_MS // 60_000
+
+    def update(self, t, o, h, l, c, qv):
+        tp = (h + l + c) / 3.0
+        base = qv / tp if tp > 0 else 0.0
+        if self.period:
+            self._window.append((qv, base))
+            self._quote += qv
+            self._base += base
+            if len(self._window) > self.period:
+                oq, ob = self._window.popleft()
+                self._quote -= oq
+                self._base -= ob
+            if len(self._window) < self.period:
+                return self.value
+        else:
+            if self._day_end is None or t >= self._day_end:
+                start = local_midnight_utc_ms(datetime.fromtimestamp(t / 1000, get_localzone()))
+                self._day_end = start + DAY_MS
+                self._session_ok = t == start
+                self._quote = self._base = 0.0
+                self.value = None
+            if not self._session_ok:
+                return self.value
+            self._quote += qv
+            self._base += base
+        self.value = self._quote / self._base if self._base > 0 else self.value
+        return self.value
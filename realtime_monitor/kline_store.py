@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from .binance_client import BinanceFuturesClient, KLINE_FIELDS, fetch_klines_since
+from .time_utils import now_ms_utc
+
+MINUTE_MS = 60_000
+# 单次 /fapi/v1/klines 允许的最大 limit
+MAX_PAGE = 1500
+# 每条记录的列数，与 klines_to_array 一致：(t, o, h, l, c, qv)
+NCOLS = len(KLINE_FIELDS)
+_ROW_BYTES = NCOLS * 8
+
+
+class KlineStore:
+    """本地 1m K线仓库：每个交易对一个定长记录文件，按 openTime 严格递增追加。
+
+    - 文件为原始 float64 (n, 6) 行，读取时以 np.memmap 映射，不做解析；
+    - 只存已收盘K线，允许中间有缺口，但不允许回写或插入更早的K线；
+    - 按 openTime 的查询使用二分定位；
+    - 各交易对最后一根的 openTime 缓存在内存中，追加时不再读文件；
+    - 行情路径用 append_row()：start() 后只在内存中排队，由后台线程每 flush_interval 秒按交易对成批写入，
+      读取某个交易对前先写出它的排队行；未 start() 时立即写入；
+    - 写入失败时截掉写了一半的行，排队行放回队列等下次重试，不会在仓库中留下无人补拉的缺口。
+    """
+
+    def __init__(self, root: str, *, flush_interval: float = 1.0, log: Callable[[str], None] = print):
+        self.root = root
+        self.flush_interval = float(flush_interval)
+        self.log = log
+        os.makedirs(root, exist_ok=True)
+        self._last: Dict[str, Optional[int]] = {}
+        self._pending: Dict[str, List[List[float]]] = {}
+        # _lock 只保护 _pending/_last（持有时间极短，事件循环上的 append_row 不等文件写入）；
+        # _write_lock 串行化文件写入，保证批量写出与 append() 的先后顺序
+        self._lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.errors = 0
+
+    def start(self) -> "KlineStore":
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="kline-store", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self, timeout: float = 5.0) -> None:
+        """停止写线程并写出全部排队行。"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError as e:
+                self.errors += 1
+                self.log(f"[kline-store] 写入失败: {e!r}")
+
+    def _path(self, symbol: str) -> str:
+        return os.path.join(self.root, f"{symbol.upper()}.1m.bin")
+
+    def symbols(self) -> List[str]:
+        return sorted(n[: -len(".1m.bin")] for n in os.listdir(self.root) if n.endswith(".1m.bin"))
+
+    def count(self, symbol: str) -> int:
+        self._flush_symbol(symbol)
+        try:
+            return os.path.getsize(self._path(symbol)) // _ROW_BYTES
+        except OSError:
+            return 0
+
+    def read(self, symbol: str) -> np.ndarray:
+        """整个文件的只读映射，(n, 6)。"""
+        n = self.count(symbol)
+        if n == 0:
+            return np.empty((0, NCOLS), dtype=np.float64)
+        return np.memmap(self._path(symbol), dtype=np.float64, mode="r", shape=(n, NCOLS))
+
+    def last_open_time(self, symbol: str) -> Optional[int]:
+        """本地最后一根（含尚未写出的排队行）的 openTime。"""
+        with self._lock:
+            return self._last_locked(symbol)
+
+    def _last_locked(self, symbol: str) -> Optional[int]:
+        # 调用方已持有 _lock；首次访问时从文件末行读取
+        if symbol in self._last:
+            return self._last[symbol]
+        last = None
+        try:
+            n = os.path.getsize(self._path(symbol)) // _ROW_BYTES
+        except OSError:
+            n = 0
+        if n:
+            with open(self._path(symbol), "rb") as f:
+                f.seek((n - 1) * _ROW_BYTES)
+                last = int(np.frombuffer(f.read(8), dtype=np.float64)[0])
+        self._last[symbol] = last
+        return last
+
+    def append(self, symbol: str, rows: np.ndarray) -> int:
+        """追加K线（(n, 6) 数组或单行），自动丢弃不晚于本地最后一根的行，返回写入根数。"""
+        arr = np.asarray(rows, dtype=np.float64).reshape(-1, NCOLS)
+        with self._write_lock:
+            self._flush_symbol(symbol)
+            last = self.last_open_time(symbol)
+            if last is not None:
+                arr = arr[arr[:, 0] > last]
+            if len(arr) == 0:
+                return 0
+            if len(arr) > 1 and np.any(np.diff(arr[:, 0]) <= 0):
+                raise ValueError(f"{symbol} K线 openTime 非严格递增，拒绝写入")
+            self._write(symbol, arr)
+            with self._lock:
+                self._last[symbol] = max(int(arr[-1, 0]), self._last.get(symbol) or 0)
+            return len(arr)
+
+    def append_row(self, symbol: str, row: List[float]) -> bool:
+        """追加一根已收盘K线（行情路径）；不晚于本地最后一根时忽略并返回 False。"""
+        with self._lock:
+            last = self._last_locked(symbol)
+            if last is not None and row[0] <= last:
+                return False
+            self._pending.setdefault(symbol, []).append([float(v) for v in row])
+            self._last[symbol] = int(row[0])
+        if self._thread is None:
+            self._flush_symbol(symbol)
+        return True
+
+    def flush(self) -> None:
+        """写出全部排队行，每个交易对一次打开、一次写入；有交易对写入失败时在其余写完后抛出。"""
+        with self._write_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            failed: Optional[OSError] = None
+            for symbol, rows in batch.items():
+                try:
+                    self._write(symbol, np.array(rows, dtype=np.float64))
+                except OSError as e:
+                    self._requeue(symbol, rows)
+                    failed = e
+            if failed is not None:
+                raise failed
+
+    def _flush_symbol(self, symbol: str) -> None:
+        with self._write_lock:
+            with self._lock:
+                rows = self._pending.pop(symbol, None)
+            if not rows:
+                return
+            try:
+                self._write(symbol, np.array(rows, dtype=np.float64))
+            except OSError:
+                self._requeue(symbol, rows)
+                raise
+
+    def _requeue(self, symbol: str, rows: List[List[float]]) -> None:
+        # 放回队首，写出期间新排队的行接在后面
+        with self._lock:
+            self._pending[symbol] = rows + self._pending.get(symbol, [])
+
+    def _write(self, symbol: str, arr: np.ndarray) -> None:
+        path = self._path(symbol)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = None
+        try:
+            with open(path, "ab") as f:
+                f.write(np.ascontiguousarray(arr).tobytes())
+        except OSError:
+            if size is not None:
+                # 截掉写了一半的行，文件保持整行
+                try:
+                    os.truncate(path, size)
+                except OSError:
+                    pass
+            raise
+
+    def range(self, symbol: str, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> np.ndarray:
+        """openTime 位于 [start_ms, end_ms] 的K线。"""
+        data = self.read(symbol)
+        if len(data) == 0:
+            return data
+        t = data[:, 0]
+        lo = 0 if start_ms is None else int(np.searchsorted(t, start_ms, side="left"))
+        hi = len(data) if end_ms is None else int(np.searchsorted(t, end_ms, side="right"))
+        return data[lo:hi]
+
+    def tail(self, symbol: str, n: int) -> np.ndarray:
+        data = self.read(symbol)
+        return data[-int(n):] if n > 0 else data[:0]
+
+    def close_at(self, symbol: str, open_time: int) -> Optional[float]:
+        """openTime == open_time 那根的收盘价；若缺失则取其后第一根（与 fetch_midnight_close 一致）。"""
+        data = self.read(symbol)
+        if len(data) == 0:
+            return None
+        i = int(np.searchsorted(data[:, 0], open_time, side="left"))
+        if i >= len(data):
+            return None
+        return float(data[i, 4])
+
+
+async def sync_tail(
+    client: BinanceFuturesClient,
+    store: KlineStore,
+    symbol: str,
+    *,
+    since_ms: int,
+    now_ms: Optional[int] = None,
+) -> int:
+    """只拉取本地缺失的尾部：从本地最后一根之后（或 since_ms）起按 startTime 分页补齐已收盘K线。
+
+    返回新增根数。本地数据早于 since_ms 且中间断档时，直接从 since_ms 开始（保留缺口）。
+    """
+    now_ms = now_ms_utc() if now_ms is None else int(now_ms)
+    last = store.last_open_time(symbol)
+    start = int(since_ms) if last is None or last + MINUTE_MS < since_ms else last + MINUTE_MS
+    arr = await fetch_klines_since(client, symbol, start, closed_before_ms=now_ms, page=MAX_PAGE)
+    return store.append(symbol, arr)
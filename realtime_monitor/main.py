@@ -1,15 +1,31 @@
 from __future__ import annotations
 
 import asyncio
+import functools
+import time
 from datetime import datetime
 from typing import Dict, List, Tuple
 
 from colorama import Fore, Style
 
-from .binance_client import BinanceFuturesClient
-from .symbols import build_midnight_baseline, rank_top, secondary_sort_by_delta
+from .binance_client import DEFAULT_CACHE_TTL, BinanceFuturesClient
+from .symbols import MidnightRollover, RankBoard, build_midnight_baseline, secondary_sort_by_delta
+from .time_utils import local_midnight_utc_ms
 from .monitor import SymbolMonitor
-from .ws_client import BinanceKlineWS
+from .ema_vec import EMAMatrix
+from .close_ring import CloseRing
+from .stats import RollingQuantiles
+from .kline_store import KlineStore
+from .checkpoint import load_checkpoint, restore_monitor, save_checkpoint_async
+from .scheduler import MinuteScheduler, ServerClock
+from .events import EventWriter
+from .cluster import ClusterCoordinator
+from .ratelimit import COORDINATOR_WEIGHT_SHARE
+from .timeframes import build_aggregator, parse_timeframes, seed_shortfall
+from .strategies import StrategySpec, build_engine, load_strategy_specs
+from .console import BoardRenderer, board_lines
+from .metrics import MetricsServer, MonitorMetrics, RoundTimer
+from .ws_client import BinanceKlineWS, BinanceTickerWS
 
 
 async def prices_map(client: BinanceFuturesClient) -> Dict[str, float]:
@@ -23,6 +39,173 @@ async def prices_map(client: BinanceFuturesClient) -> Dict[str, float]:
     return out
 
 
+def format_ws_stats(stats: List[dict]) -> str:
+    parts = []
+    for st in stats:
+        lag = st.get("lag_ms")
+        lag_s = f"{lag:.0f}ms" if lag is not None else "-"
+        flag = "" if st.get("connected") else "(断开)"
+        parts.append(f"#{st['shard']}{flag} {st['streams']}流 {st['msg_rate']:.1f}条/s 延迟{lag_s} 重连{st['reconnects']}")
+    return "[ws] " + " | ".join(parts)
+
+
+async def emit_alerts(
+    alerts: List[dict],
+    *,
+    beep: bool = False,
+    writer: EventWriter | None = None,
+    renderer: BoardRenderer | None = None,
+    metrics: MonitorMetrics | None = None,
+) -> None:
+    if metrics is not None:
+        metrics.count_events(alerts)
+    # 有渲染器时消息交给渲染线程输出，避免与差量重绘的屏幕互相覆盖
+    say = renderer.log if renderer is not None else print
+    for ev in alerts:
+        msg = ev.get("message", "")
+        if ev.get("kind") == "signal":
+            say(f"{Style.BRIGHT}{Fore.YELLOW}★ {msg}{Style.RESET_ALL}")
+            if beep:
+                try:
+                    import winsound
+                    winsound.Beep(1200, 250); winsound.Beep(1200, 250)
+                except Exception:
+                    pass
+        else:
+            say(f"{Style.BRIGHT}{Fore.MAGENTA}⚠ {msg}{Style.RESET_ALL}")
+            if beep:
+                try:
+                    import winsound
+                    winsound.Beep(800, 150)
+                except Exception:
+                    pass
+        # 事件落盘（后台线程写入，这里只入队）
+        if writer is not None:
+            writer.submit(ev)
+
+
+async def consume_closed_klines(
+    queue: asyncio.Queue,
+    monitor: SymbolMonitor,
+    tracked: set[str],
+    *,
+    close_latency: RollingQuantiles,
+    event_latency: RollingQuantiles,
+    beep: bool = False,
+    writer: EventWriter | None = None,
+    renderer: BoardRenderer | None = None,
+    metrics: MonitorMetrics | None = None,
+) -> None:
+    """事件驱动：WS 每推来一根已收盘K线，立即推进对应交易对并输出信号。"""
+    say = renderer.log if renderer is not None else print
+    while True:
+        sym, k, event_ms = await queue.get()
+        if sym not in tracked:
+            continue
+        try:
+            events = await monitor.update_symbol(sym, kline=k)
+        except Exception as e:
+            say(f"[event] {sym} 处理失败: {e!r}")
+            continue
+        # 延迟：K线收盘时刻 / 交易所事件时刻 -> 处理完成
+        done_ms = time.time() * 1000
+        close_latency.add(done_ms - (k[0] + 60_000))
+        if event_ms:
+            event_latency.add(done_ms - event_ms)
+        if events:
+            await emit_alerts(events, beep=beep, writer=writer, renderer=renderer, metrics=metrics)
+
+
+def format_latency(close_latency: RollingQuantiles, event_latency: RollingQuantiles) -> str:
+    def _q(r: RollingQuantiles, q: float) -> str:
+        v = r.quantile(q)
+        return f"{v:.0f}ms" if v is not None else "-"
+
+    return (
+        f"[event] 收盘->处理 p50={_q(close_latency, 0.5)} p99={_q(close_latency, 0.99)} | "
+        f"事件->处理 p50={_q(event_latency, 0.5)} p99={_q(event_latency, 0.99)} (n={close_latency.count})"
+    )
+
+
+def format_endpoint_stats(stats: List[dict]) -> str:
+    parts = []
+    for st in stats:
+        host = str(st["base_url"]).split("//")[-1].split(".")[0]
+        lat = st.get("latency_ms")
+        lat_s = f"{lat:.0f}ms" if lat is not None else "-"
+        cd = f" 冷却{st['cooldown_s']:.0f}s" if st["cooldown_s"] else ""
+        parts.append(f"{host} {lat_s} 错误率{st['error_rate'] * 100:.0f}% 请求{st['requests']}{cd}")
+    return "[rest] " + " | ".join(parts)
+
+
+def format_gap_metrics(m: Dict[str, int]) -> str:
+    return (
+        f"[gap] 缺口{m['gaps']}次/{m['gap_candles']}根 补拉请求{m['backfill_requests']} "
+        f"补齐{m['backfilled_candles']}根 失败{m['backfill_failures']}"
+    )
+
+
+def format_writer_stats(st: Dict[str, int]) -> str:
+    return (
+        f"[events] 已写{st['written']} 丢弃{st['dropped']} 排队{st['queued']} 高水位{st['high_water']} "
+        f"批次{st['batches']} 轮转{st['rotations']} 错误{st['errors']}"
+    )
+
+
+def format_timeframe_stats(stats: Dict[str, Dict[str, int]]) -> str:
+    # 预热：已收齐的高周期K线不足 83 根、尚未开始判断的交易对
+    return "[tf] " + " | ".join(f"{tf} 就绪{st['ready']} 预热{st['warming']}" for tf, st in stats.items())
+
+
+def format_strategy_stats(st: Dict[str, int]) -> str:
+    # 指标更新次数 / K线根数 即每根K线实际计算的指标个数（相同规格的指标被多个策略共享时只算一次）
+    return (
+        f"[strategy] 策略{st['strategies']} 指标{st['indicators']} 交易对{st['symbols']} "
+        f"K线{st['candles']} 指标计算{st['indicator_updates']} 事件{st['events']}"
+    )
+
+
+def format_cluster_stats(stats: List[dict]) -> str:
+    parts = []
+    for st in stats:
+        flag = "" if st.get("alive") else "(已退出)"
+        lag = st.get("ws_lag_ms")
+        lag_s = f" 延迟{lag:.0f}ms" if lag is not None else ""
+        parts.append(
+            f"#{st['worker']}{flag} {st.get('symbols', 0)}/{st['assigned']}对 轮次{st.get('rounds', 0)} "
+            f"上轮{st.get('last_round_ms', 0.0):.0f}ms K线{st.get('klines', 0)} 事件{st.get('events', 0)}{lag_s}"
+        )
+    return "[cluster] " + " | ".join(parts)
+
+
+def render_frame(
+    now: str,
+    top_gain: List[Tuple[str, float, float]],
+    top_lose: List[Tuple[str, float, float]],
+    delta_maps: Dict[str, Dict[int, float]],
+    windows: List[int],
+    highlight_delta: float | None,
+    status: List[str],
+) -> list:
+    """一轮的完整画面：时间标题 + 并排榜单 + 状态行（在渲染线程中调用）。"""
+    title = f"====== {now} ======"
+    lines = [[], [(f"{Style.BRIGHT}{title}{Style.RESET_ALL}", len(title))]]
+    lines.extend(board_lines(
+        "涨幅榜 Top 50", top_gain, "跌幅榜 Top 50", top_lose,
+        delta_maps=delta_maps, windows=windows, highlight_threshold=highlight_delta,
+    ))
+    lines.extend([(t, len(t))] for t in status)
+    return lines
+
+
+def format_scheduler_stats(scheduler: MinuteScheduler) -> str:
+    st = scheduler.stats
+    return (
+        f"[sched] 时钟偏移{scheduler.clock.offset_ms:+.0f}ms 轮次{st['rounds']:.0f} 请求{st['requests']:.0f} "
+        f"跳过{st['skipped']:.0f} 重试{st['retries']:.0f} 仍过期{st['stale']:.0f} 上轮耗时{st['last_round_ms']:.0f}ms"
+    )
+
+
 async def main_loop(
     once: bool = False,
     *,
@@ -44,127 +227,329 @@ async def main_loop(
     cooldown_seconds: int = 0,
     secondary_by: str = "1m",
     weights: str | None = None,
+    vector_ema: bool = False,
+    kline_store: str | None = None,
+    checkpoint: str | None = None,
+    checkpoint_every: float = 60.0,
+    ws_shard_size: int = 200,
+    ticker_ws: bool = False,
+    ticker_max_age: float = 5.0,
+    event_driven: bool = False,
+    hedge_ms: float | None = None,
+    rest_cache: bool = True,
+    minute_sync: bool = False,
+    events_flush_interval: float = 0.0,
+    events_fsync: bool = False,
+    events_rotate_mb: float | None = None,
+    events_rotate_daily: bool = False,
+    history_db: str | None = None,
+    headless: bool = False,
+    max_fps: float = 2.0,
+    workers: int = 1,
+    timeframes: list[str] | None = None,
+    strategies: list[StrategySpec] | None = None,
+    metrics_port: int | None = None,
+    metrics_host: str = "127.0.0.1",
 ):
-    client = BinanceFuturesClient()
+    # 无头模式不格式化榜单；否则榜单交给后台渲染线程（限帧率，终端下只重绘变化的单元格）
+    renderer: BoardRenderer | None = None if headless else BoardRenderer(max_fps=max_fps).start()
+    # 运行期提示一律经渲染器输出，直接 print 会滚动光标定位的屏幕
+    say = renderer.log if renderer is not None else print
+    client = BinanceFuturesClient(
+        max_in_flight=concurrency,
+        hedge_delay=hedge_ms / 1000.0 if hedge_ms else None,
+        cache_ttl=None if rest_cache else {p: 0.0 for p in DEFAULT_CACHE_TTL},
+        log=say,
+    )
+    writer: EventWriter | None = None
+    if enable_events and events_dir:
+        writer = EventWriter(
+            events_dir,
+            flush_interval=events_flush_interval,
+            fsync=events_fsync,
+            max_bytes=int(events_rotate_mb * 1024 * 1024) if events_rotate_mb else None,
+            rotate_daily=events_rotate_daily,
+            history_db=history_db,
+            log=say,
+        ).start()
+    windows = sorted(set(delta_windows or [1, 5, 15]))
+    if windows[-1] >= seed_limit:
+        # 长窗口 Δ% 需要足够的历史收盘，seed 时一并取回（单次请求上限 1500 根）
+        seed_limit = min(1500, windows[-1] + 1)
+        say(f"Δ% 最长窗口 {windows[-1]}m，seed 根数调整为 {seed_limit}")
+    if not kline_store:
+        for tf, need in seed_shortfall(timeframes, seed_limit).items():
+            # 没有本地K线仓库时高周期只能用 seed 的 1m 历史，不足的要在运行中累计满 83 根才开始判断
+            hint = f"--seed-limit {need}" if need <= 1500 else "--kline-store（持续运行积累历史）"
+            say(f"警告：{tf} 周期需约 {need} 根 1m 历史（{need / 60:.0f}h），seed_limit={seed_limit} 不足，"
+              f"约 {need / 60:.0f}h 后才开始判断；可加 {hint}")
+    cluster: ClusterCoordinator | None = None
+    # 可选：Prometheus 文本格式的 /metrics，与主循环共用事件循环；计数在抓取时从各组件读取
+    metrics: MonitorMetrics | None = MonitorMetrics() if metrics_port is not None else None
+    metrics_server: MetricsServer | None = None
     try:
-        print("初始化：获取USDT永续与本地0点基准...")
-        symbols, baselines = await build_midnight_baseline(client)
-        print(f"交易对数量：{len(symbols)}，有基准价的：{len(baselines)}")
+        if metrics is not None:
+            metrics.attach_client(client)
+            if writer is not None:
+                metrics.attach_writer(writer)
+            metrics_server = await MetricsServer(metrics.render, metrics_port, metrics_host).start()
+            say(f"指标：http://{metrics_host}:{metrics_server.port}/metrics")
+        say("初始化：获取USDT永续与本地0点基准...")
+        # 行情路径上的追加由仓库的后台线程成批写入
+        store = KlineStore(kline_store, log=say).start() if kline_store else None
+        symbols, baselines = await build_midnight_baseline(client, store=store, history_ms=seed_limit * 60_000)
+        say(f"交易对数量：{len(symbols)}，有基准价的：{len(baselines)}")
+        # 多进程分片：K线/WS/EMA 推进交给工作进程，本进程只做排名、榜单与事件落盘
+        cluster_mode = workers > 1
 
         # 可选：启动WebSocket聚合（订阅全量USDT永续 1m）
         ws_cache: dict[str, tuple[int, float, float, float, float]] = {}
         ws_feed: BinanceKlineWS | None = None
-        if ws:
-            ws_feed = BinanceKlineWS(symbols, ws_cache)
+        kline_queue: asyncio.Queue | None = asyncio.Queue() if (ws and event_driven and not cluster_mode) else None
+        if ws and not cluster_mode:
+            # 订阅随跟踪集合变化（每轮 set_symbols 按差集 SUBSCRIBE/UNSUBSCRIBE），初始为空
+            ws_feed = BinanceKlineWS([], ws_cache, shard_size=ws_shard_size, queue=kline_queue)
             await ws_feed.run_in_background()
 
-        monitor = SymbolMonitor(
-            client,
-            concurrency=concurrency,
+        # 可选：全市场 mini-ticker 流维护实时价格，过期时回退 REST
+        # 增量排名：只对价格变化的交易对调整位置
+        board = RankBoard(baselines)
+
+        ticker_feed: BinanceTickerWS | None = None
+        if ticker_ws:
+            ticker_feed = BinanceTickerWS()
+            ticker_feed.add_listener(board.update_prices)
+            await ticker_feed.run_in_background()
+            # 流只推送有变化的交易对：先用一次 REST 全量价格建立榜单，冷门交易对也有价格
+            full = await prices_map(client)
+            board.update_prices(full)
+            ticker_feed.seed(full)
+
+        monitor_kwargs = dict(
             confirm_candles=confirm_candles,
             seed_limit=seed_limit,
-            ws_cache=ws_cache if ws else None,
             min_price=min_price,
             max_price=max_price,
             min_quote_usdt=min_quote_usdt,
             cooldown_seconds=cooldown_seconds,
         )
+        monitor = SymbolMonitor(
+            client,
+            ws_cache=ws_cache if ws else None,
+            ema_engine=EMAMatrix(capacity=len(symbols)) if vector_ema else None,
+            close_ring=CloseRing(history=windows[-1] + 1, capacity=len(symbols)),
+            store=store,
+            # 高周期K线由 1m 收盘在本地聚合，不额外请求交易所
+            timeframes=build_aggregator(timeframes, monitor_kwargs, store=store, strategies=strategies),
+            # 额外策略与内置规则并行，所需指标按交易对、按根只算一次
+            strategies=build_engine(strategies, store=store),
+            **monitor_kwargs,
+        )
 
         tracked: List[str] = []
 
-        windows = sorted(set(delta_windows or [1, 5, 15]))
+        # 本地0点跨日时用已流入的K线切换基准
+        rollover = MidnightRollover(client, symbols, local_midnight_utc_ms(), ws_cache=ws_cache if ws else None)
+        monitor.add_kline_listener(rollover.observe)
+
+        # 可选：从检查点热启动，只补推停机期间缺失的分钟
+        last_checkpoint = time.monotonic()
+        if checkpoint and not cluster_mode:
+            data = load_checkpoint(checkpoint)
+            restored = restore_monitor(monitor, data) if data else []
+            if restored:
+                say(f"检查点恢复：{len(restored)} 个交易对，补推缺失K线...")
+                missed = await monitor.catch_up(restored)
+                await emit_alerts(missed, beep=False, writer=writer, renderer=renderer, metrics=metrics)
+
+        # 事件驱动模式：收盘K线即时处理，榜单仍按 interval 刷新
+        tracked_set: set[str] = set()
+        close_latency = RollingQuantiles()
+        event_latency = RollingQuantiles()
+        consumer: asyncio.Task | None = None
+        if kline_queue is not None:
+            consumer = asyncio.create_task(consume_closed_klines(
+                kline_queue, monitor, tracked_set,
+                close_latency=close_latency, event_latency=event_latency,
+                beep=beep, writer=writer, renderer=renderer, metrics=metrics,
+            ))
+
+        # 分钟对齐调度：按服务器时间在每分钟收盘后只更新缺该分钟的交易对
+        scheduler: MinuteScheduler | None = None
+        sched_task: asyncio.Task | None = None
+        if minute_sync and consumer is None and not once and not cluster_mode:
+            scheduler = MinuteScheduler(monitor, ServerClock(client), log=say)
+
+            async def _emit(events: List[dict]) -> None:
+                await emit_alerts(events, beep=beep, writer=writer, renderer=renderer, metrics=metrics)
+
+            sched_task = asyncio.create_task(scheduler.run(lambda: tracked_set, _emit))
+
+        if cluster_mode:
+            # 工作进程跟踪全部有基准的交易对（等同 --scan-all），各自持有检查点 <checkpoint>.w<i>
+            cluster = ClusterCoordinator(
+                sorted(s for s in symbols if s in baselines),
+                workers,
+                windows=windows,
+                concurrency=concurrency,
+                checkpoint=checkpoint,
+                interval_seconds=interval_seconds,
+                once=once,
+                ws=ws,
+                ws_shard_size=ws_shard_size,
+                event_driven=event_driven,
+                minute_sync=minute_sync,
+                vector_ema=vector_ema,
+                kline_store=kline_store,
+                checkpoint_every=checkpoint_every,
+                timeframes=list(timeframes or []),
+                strategies=list(strategies or []),
+                monitor_kwargs=monitor_kwargs,
+                log=say,
+            )
+
+            async def _emit_cluster(events: List[dict]) -> None:
+                await emit_alerts(events, beep=beep, writer=writer, renderer=renderer, metrics=metrics)
+
+            # 初始化（基准等）已完成，协调进程此后只用保留的那部分 IP 额度
+            client.limiter.set_share(COORDINATOR_WEIGHT_SHARE)
+            await cluster.start(on_events=_emit_cluster, on_kline=rollover.observe)
+            say(f"多进程模式：{cluster.workers} 个工作进程，每个约 {len(cluster.symbols) // cluster.workers} 个交易对")
+            if once:
+                await cluster.wait_rounds(1)
+
+        if metrics is not None:
+            metrics.attach_monitor(monitor, tracked_set)
+            if ws_feed is not None:
+                metrics.attach_kline_ws(ws_feed)
+            if ticker_feed is not None:
+                metrics.attach_ticker_ws(ticker_feed)
+            if consumer is not None:
+                metrics.attach_latency(close_latency, event_latency)
+            if scheduler is not None:
+                metrics.attach_scheduler(scheduler)
+            if cluster is not None:
+                metrics.attach_cluster(cluster)
+        timer = RoundTimer(metrics)
 
         while True:
+            timer.start()
             now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            # 1) 获取全量价格
-            price = await prices_map(client)
+            new_baselines = rollover.poll()
+            if new_baselines is not None:
+                baselines = new_baselines
+                board.set_baselines(baselines)
+                say(f"跨日：已切换至新的0点基准（{len(baselines)} 个交易对）")
+            # 1) 获取全量价格（优先使用实时 ticker 流）
+            # ticker 流新鲜时排名已由其回调增量维护，否则以 REST 价格更新变化的交易对
+            if ticker_feed is None or not ticker_feed.is_fresh(ticker_max_age):
+                full = await prices_map(client)
+                board.update_prices(full)
+                if ticker_feed is not None:
+                    ticker_feed.seed(full)
+            timer.mark("prices")
             # 2) 排名
-            top_gain, top_lose = rank_top(symbols, baselines, price, topn=50)
+            top_gain, top_lose = board.top(50), board.bottom(50)
+            timer.mark("rank")
 
             # 3) 维护监控集合（并集）并计算1m涨跌幅
-            if scan_all:
+            if cluster is not None:
+                # 多进程模式：交易对已固定分配给各工作进程
+                new_tracked = cluster.symbols
+            elif scan_all:
                 # 跟踪全部USDT永续（已成功建立基准的）
                 new_tracked = sorted([s for s in symbols if s in baselines])
             else:
                 # 仅跟踪当前榜单中出现的交易对
                 new_tracked = sorted(list({*[s for s, _, _ in top_gain], *[s for s, _, _ in top_lose]}))
-            await monitor.ensure_states(new_tracked)
-            delta_maps = monitor.multi_change_map(new_tracked, windows)
-            # 供二次排序使用的 1mΔ%
-            one_min_map = {s: m.get(1) for s, m in (delta_maps or {}).items() if m and 1 in m}
-            five_min_map = {s: m.get(5) for s, m in (delta_maps or {}).items() if m and 5 in m}
-            fifteen_min_map = {s: m.get(15) for s, m in (delta_maps or {}).items() if m and 15 in m}
-
-            # 4) 二次排序（可选）并打印榜单（含1mΔ%列）
-            from .console import print_board, print_boards_side_by_side
-            if secondary_by_delta:
-                sort_map = one_min_map
-                if secondary_by == "5m":
-                    sort_map = five_min_map
-                elif secondary_by == "15m":
-                    sort_map = fifteen_min_map
-                elif secondary_by == "weighted":
-                    w1, w5, w15 = 1.0, 0.5, 0.25
-                    try:
-                        if weights:
-                            parts = [p.strip() for p in weights.split(',') if p.strip()]
-                            if len(parts) >= 3:
-                                w1, w5, w15 = float(parts[0]), float(parts[1]), float(parts[2])
-                    except Exception:
-                        pass
-                    # 以绝对值加权，突出波动强度
-                    keys = set(one_min_map.keys()) | set(five_min_map.keys()) | set(fifteen_min_map.keys())
-                    sort_map = {}
-                    for s in keys:
-                        v1 = abs(one_min_map.get(s, 0.0) or 0.0)
-                        v5 = abs(five_min_map.get(s, 0.0) or 0.0)
-                        v15 = abs(fifteen_min_map.get(s, 0.0) or 0.0)
-                        sort_map[s] = w1 * v1 + w5 * v5 + w15 * v15
-                top_gain = secondary_sort_by_delta(top_gain, sort_map, mode='gainers')
-                top_lose = secondary_sort_by_delta(top_lose, sort_map, mode='losers')
-            print(f"\n{Style.BRIGHT}====== {now} ======{Style.RESET_ALL}")
-            # 并排对齐展示榜单
-            print_boards_side_by_side(
-                "涨幅榜 Top 50", top_gain, "跌幅榜 Top 50", top_lose,
-                delta_maps=delta_maps, windows=windows,
-                highlight_threshold=highlight_delta,
-            )
-
-            # 移除不再跟踪的（可选）
-            for s in list(monitor.states.keys()):
-                if s not in new_tracked:
-                    await monitor.drop_state(s)
-
-            # 5) 对入选币种进行1m K线更新与交叉/信号检测
-            alerts = await monitor.update_many(new_tracked)
-            for ev in alerts:
-                msg = ev.get("message", "")
-                if ev.get("kind") == "signal":
-                    print(f"{Style.BRIGHT}{Fore.YELLOW}★ {msg}{Style.RESET_ALL}")
-                    if beep:
-                        try:
-                            import winsound
-                            winsound.Beep(1200, 250); winsound.Beep(1200, 250)
-                        except Exception:
-                            pass
+            if cluster is None:
+                await monitor.ensure_states(new_tracked)
+            tracked_set.clear()
+            tracked_set.update(new_tracked)
+            if ws_feed is not None:
+                ws_feed.set_symbols(new_tracked)
+            timer.mark("track")
+            # 无头模式：只维护跟踪集合与信号，跳过 Δ%/二次排序/榜单格式化
+            if renderer is not None:
+                # Δ% 只用于榜单展示与二次排序，仅对上榜交易对计算
+                board_syms = [s for s, _, _ in top_gain] + [s for s, _, _ in top_lose]
+                if cluster is not None:
+                    delta_maps = cluster.change_map(board_syms)
                 else:
-                    print(f"{Style.BRIGHT}{Fore.MAGENTA}⚠ {msg}{Style.RESET_ALL}")
-                    if beep:
+                    delta_maps = monitor.multi_change_map(board_syms, windows)
+                # 供二次排序使用的 1mΔ%
+                one_min_map = {s: m.get(1) for s, m in (delta_maps or {}).items() if m and 1 in m}
+                five_min_map = {s: m.get(5) for s, m in (delta_maps or {}).items() if m and 5 in m}
+                fifteen_min_map = {s: m.get(15) for s, m in (delta_maps or {}).items() if m and 15 in m}
+
+                # 4) 二次排序（可选）并提交榜单画面（含Δ%列）
+                if secondary_by_delta:
+                    sort_map = one_min_map
+                    if secondary_by == "5m":
+                        sort_map = five_min_map
+                    elif secondary_by == "15m":
+                        sort_map = fifteen_min_map
+                    elif secondary_by == "weighted":
+                        w1, w5, w15 = 1.0, 0.5, 0.25
                         try:
-                            import winsound
-                            winsound.Beep(800, 150)
+                            if weights:
+                                parts = [p.strip() for p in weights.split(',') if p.strip()]
+                                if len(parts) >= 3:
+                                    w1, w5, w15 = float(parts[0]), float(parts[1]), float(parts[2])
                         except Exception:
                             pass
-                # 事件落盘
-                if enable_events and events_dir:
-                    try:
-                        from .events import append_event
-                        await append_event(events_dir, ev)
-                    except Exception:
-                        pass
+                        # 以绝对值加权，突出波动强度
+                        keys = set(one_min_map.keys()) | set(five_min_map.keys()) | set(fifteen_min_map.keys())
+                        sort_map = {}
+                        for s in keys:
+                            v1 = abs(one_min_map.get(s, 0.0) or 0.0)
+                            v5 = abs(five_min_map.get(s, 0.0) or 0.0)
+                            v15 = abs(fifteen_min_map.get(s, 0.0) or 0.0)
+                            sort_map[s] = w1 * v1 + w5 * v5 + w15 * v15
+                    top_gain = secondary_sort_by_delta(top_gain, sort_map, mode='gainers')
+                    top_lose = secondary_sort_by_delta(top_lose, sort_map, mode='losers')
+                # 状态行在事件循环中生成（只读计数器），榜单格式化与输出在渲染线程完成
+                status = [format_endpoint_stats(client.endpoint_stats()) + f" | 缓存命中{client.cache_hits} 合并{client.coalesced}"]
+                if ws_feed is not None:
+                    status.append(format_ws_stats(ws_feed.stats()))
+                if consumer is not None:
+                    status.append(format_latency(close_latency, event_latency))
+                if monitor.metrics["gaps"]:
+                    status.append(format_gap_metrics(monitor.metrics))
+                if scheduler is not None:
+                    status.append(format_scheduler_stats(scheduler))
+                if monitor.timeframes is not None:
+                    status.append(format_timeframe_stats(monitor.timeframes.stats()))
+                if monitor.strategies is not None and not cluster_mode:
+                    status.append(format_strategy_stats(monitor.strategies.stats()))
+                if writer is not None and (writer.dropped or writer.errors):
+                    status.append(format_writer_stats(writer.stats()))
+                if cluster is not None:
+                    status.append(format_cluster_stats(cluster.stats()))
+                renderer.submit(functools.partial(
+                    render_frame, now, top_gain, top_lose, delta_maps, windows, highlight_delta, status,
+                ))
+                timer.mark("board")
+
+            # 移除不再跟踪的（可选）；全市场交易对固定，高周期状态保留到重新入选时补推
+            for s in list(monitor.states.keys()):
+                if s not in new_tracked:
+                    await monitor.drop_state(s, keep_timeframes=True)
+
+            # 5) 对入选币种进行1m K线更新与交叉/信号检测（事件驱动/分钟对齐模式下由后台协程处理）
+            if consumer is None and sched_task is None and cluster is None:
+                alerts = await monitor.update_many(new_tracked)
+                await emit_alerts(alerts, beep=beep, writer=writer, renderer=renderer, metrics=metrics)
+                timer.mark("klines")
 
             tracked = new_tracked
 
+            if checkpoint and cluster is None and time.monotonic() - last_checkpoint >= checkpoint_every:
+                await save_checkpoint_async(monitor, checkpoint)
+                last_checkpoint = time.monotonic()
+                timer.mark("checkpoint")
+            timer.finish()
+
             if once:
                 # 仅运行一轮，便于冒烟测试
                 break
@@ -172,10 +557,29 @@ async def main_loop(
             await asyncio.sleep(max(1.0, float(interval_seconds)))
     finally:
         try:
+            if cluster is not None:
+                # 先停工作进程，收尾事件仍会经协调进程落盘
+                await cluster.stop()
+            if 'consumer' in locals() and consumer is not None:
+                consumer.cancel()
+            if 'sched_task' in locals() and sched_task is not None:
+                sched_task.cancel()
+            if checkpoint and cluster is None and 'monitor' in locals():
+                await save_checkpoint_async(monitor, checkpoint)
             if 'ws_feed' in locals() and ws_feed is not None:
                 await ws_feed.stop()
+            if 'ticker_feed' in locals() and ticker_feed is not None:
+                await ticker_feed.stop()
         finally:
+            if metrics_server is not None:
+                await metrics_server.stop()
             await client.aclose()
+            if 'store' in locals() and store is not None:
+                await asyncio.to_thread(store.close)
+            if writer is not None:
+                await asyncio.to_thread(writer.close)
+            if renderer is not None:
+                await asyncio.to_thread(renderer.close)
 
 
 def run():
@@ -188,20 +592,49 @@ def run():
         parser.add_argument("--confirm-candles", type=int, default=5, help="Number of 1m candles to confirm after cross (default 5)")
         parser.add_argument("--interval-seconds", type=float, default=20.0, help="Polling interval seconds (default 20)")
         parser.add_argument("--scan-all", action="store_true", help="Track all USDT perpetual symbols for EMA cross scan")
-        parser.add_argument("--concurrency", type=int, default=20, help="Max concurrent requests for symbol updates")
+        parser.add_argument("--concurrency", type=int, default=20, help="Max concurrent REST requests (shared weight-aware limiter)")
         parser.add_argument("--seed-limit", type=int, default=600, help="Initial 1m close count for EMA seeding (>=100)")
         parser.add_argument("--beep", action="store_true", help="Play a short beep on alerts (Windows)")
         parser.add_argument("--delta-columns", type=str, default="1,5,15", help="Comma-separated minute windows for Δ%% columns, e.g. 1,5,15")
         parser.add_argument("--ws", action="store_true", help="Use WebSocket 1m kline feed to reduce REST calls (subscribes all symbols)")
         parser.add_argument("--events-dir", type=str, default="logs", help="Directory to write alert events (CSV and JSONL)")
         parser.add_argument("--no-events", action="store_true", help="Disable writing events to files")
+        parser.add_argument("--events-flush-interval", type=float, default=0.0, help="Flush event files at most every N seconds (0 = after every batch)")
+        parser.add_argument("--events-fsync", action="store_true", help="fsync event files on every flush")
+        parser.add_argument("--events-rotate-mb", type=float, default=None, help="Rotate alerts.jsonl/alerts.csv when alerts.jsonl exceeds N MB")
+        parser.add_argument("--history-db", type=str, default=None, help="Also store alerts in an indexed SQLite database at this path (query with python -m realtime_monitor.history)")
+        parser.add_argument("--events-rotate-daily", action="store_true", help="Rotate event files at local midnight")
         parser.add_argument("--min-price", type=float, default=None, help="Min last close price filter")
         parser.add_argument("--max-price", type=float, default=None, help="Max last close price filter")
         parser.add_argument("--min-quote-usdt", type=float, default=None, help="Min 1m quote volume (USDT) to allow alerts")
         parser.add_argument("--cooldown-seconds", type=int, default=0, help="Cooldown seconds between alerts for the same symbol")
         parser.add_argument("--secondary-by", type=str, choices=["1m","5m","15m","weighted"], default="1m", help="Secondary sort source: 1m/5m/15m or weighted")
         parser.add_argument("--weights", type=str, default=None, help="Weights for weighted sort, format: w1,w5,w15")
+        parser.add_argument("--vector-ema", action="store_true", help="Advance EMAs of all tracked symbols as one NumPy batch per round")
+        parser.add_argument("--kline-store", type=str, default=None, help="Directory of the local 1m kline store; only the missing tail is fetched on startup")
+        parser.add_argument("--checkpoint", type=str, default=None, help="Path of the monitor state checkpoint (restored on boot, saved periodically and on exit)")
+        parser.add_argument("--checkpoint-every", type=float, default=60.0, help="Seconds between periodic checkpoints (default 60)")
+        parser.add_argument("--ws-shard-size", type=int, default=200, help="Max kline streams per WebSocket connection (default 200)")
+        parser.add_argument("--ticker-ws", action="store_true", help="Keep live prices from the all-market mini-ticker stream; REST ticker only as stale fallback")
+        parser.add_argument("--ticker-max-age", type=float, default=5.0, help="Seconds without ticker stream updates before falling back to REST (default 5)")
+        parser.add_argument("--event-driven", action="store_true", help="With --ws, evaluate signals as soon as each kline closes instead of on the polling interval")
+        parser.add_argument("--minute-sync", action="store_true", help="Fetch klines once per minute just after close (server-time aligned) instead of every polling round")
+        parser.add_argument("--no-rest-cache", action="store_true", help="Disable the short-TTL REST response cache (identical in-flight requests are still coalesced)")
+        parser.add_argument("--headless", action="store_true", help="Do not format or draw the boards; only track symbols and emit alerts (for servers)")
+        parser.add_argument("--max-fps", type=float, default=2.0, help="Max board redraws per second; on a terminal only changed cells are redrawn (default 2)")
+        parser.add_argument("--workers", type=int, default=1, help="Split all symbols across N worker processes (each with its own WS shard, REST budget share and monitor); implies --scan-all")
+        parser.add_argument("--timeframes", type=str, default=None, help="Also detect EMA crosses on these timeframes aggregated locally from 1m closes, e.g. 5m,15m,1h")
+        parser.add_argument("--strategies", type=str, default=None, help="Extra strategies run alongside the built-in EMA rule, e.g. rsi_reversal,atr_breakout:mult=3,ema_cross:fast=9/21:slow=50/60")
+        parser.add_argument("--strategy-config", type=str, default=None, help="JSON file with strategy definitions: [{\"name\": ..., \"params\": {...}, \"id\": ...}]")
+        parser.add_argument("--metrics-port", type=int, default=None, help="Serve Prometheus metrics at http://HOST:PORT/metrics from the monitor's event loop (off by default)")
+        parser.add_argument("--metrics-host", type=str, default="127.0.0.1", help="Bind address for --metrics-port (default 127.0.0.1; use 0.0.0.0 for remote scrapers)")
+        parser.add_argument("--hedge-ms", type=float, default=None, help="Hedge latest-kline REST calls to a second endpoint after this many ms (off by default)")
         args = parser.parse_args()
+        try:
+            timeframes = parse_timeframes(args.timeframes) if args.timeframes else None
+            strategies = load_strategy_specs(args.strategies, args.strategy_config)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
 
         def _parse_windows(s: str) -> list[int]:
             out: list[int] = []
@@ -232,12 +665,35 @@ def run():
                 ws=args.ws,
                 events_dir=args.events_dir,
                 enable_events=(not args.no_events),
+                events_flush_interval=args.events_flush_interval,
+                events_fsync=args.events_fsync,
+                events_rotate_mb=args.events_rotate_mb,
+                events_rotate_daily=args.events_rotate_daily,
+                history_db=args.history_db,
                 min_price=args.min_price,
                 max_price=args.max_price,
                 min_quote_usdt=args.min_quote_usdt,
                 cooldown_seconds=args.cooldown_seconds,
                 secondary_by=args.secondary_by,
                 weights=args.weights,
+                vector_ema=args.vector_ema,
+                kline_store=args.kline_store,
+                checkpoint=args.checkpoint,
+                checkpoint_every=args.checkpoint_every,
+                ws_shard_size=args.ws_shard_size,
+                ticker_ws=args.ticker_ws,
+                ticker_max_age=args.ticker_max_age,
+                event_driven=args.event_driven,
+                hedge_ms=args.hedge_ms,
+                rest_cache=not args.no_rest_cache,
+                minute_sync=args.minute_sync,
+                headless=args.headless,
+                max_fps=args.max_fps,
+                workers=args.workers,
+                timeframes=timeframes,
+                strategies=strategies,
+                metrics_port=args.metrics_port,
+                metrics_host=args.metrics_host,
             )
         )
     except KeyboardInterrupt:
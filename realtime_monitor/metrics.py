@@ -0,0 +1,472 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from bisect import bisect_left
+from typing import TYPE_CHECKING, Any, Callable, Collection, Dict, Iterable, List, Optional, Tuple
+
+from .stats import RollingQuantiles
+from .strategies import BUILTIN_STRATEGY
+
+if TYPE_CHECKING:
+    from .binance_client import BinanceFuturesClient
+    from .cluster import ClusterCoordinator
+    from .events import EventWriter
+    from .monitor import SymbolMonitor
+    from .scheduler import MinuteScheduler
+    from .ws_client import BinanceKlineWS, BinanceTickerWS
+
+# REST 请求延迟（秒）
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 一轮/各阶段耗时（秒）
+ROUND_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _fmt(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    if math.isnan(v):
+        return "NaN"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def _escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def rest_request_histogram(registry: Optional["MetricsRegistry"] = None, name: str = "rtmon_rest_request_seconds", labelnames: Iterable[str] = ("path", "status")) -> "Histogram":
+    help = "REST request latency by path and HTTP status (error = no response)"
+    if registry is not None:
+        return registry.histogram(name, help, labelnames)
+    return Histogram(name, help, labelnames)
+
+
+def observe_request(hist: "Histogram", base_url: str, path: str, status: Optional[int], seconds: float) -> None:
+    """BinanceFuturesClient 请求回调：按 path/状态码记录耗时，无响应记为 error。"""
+    hist.observe(seconds, path=path, status=status if status is not None else "error")
+
+
+def rate_limited_counts(ban_counts: Dict[Tuple[str, str], int]) -> Dict[str, int]:
+    """由端点冷却原因统计 418/429 次数。"""
+    out = {"418": 0, "429": 0}
+    for (_ep, reason), n in ban_counts.items():
+        code = reason[len("status-"):] if reason.startswith("status-") else ""
+        if code in out:
+            out[code] += n
+    return out
+
+
+def _label_str(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def clear(self) -> None:
+        """清空全部标签组合（采集器按当前集合重建，如已移除的 WS 分片）。"""
+        self._values.clear()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, v in self._values.items():
+            lines.append(f"{self.name}{_label_str(self.labelnames, key)} {_fmt(v)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value: float, **labels: Any) -> None:
+        """镜像外部已累计的总数（如 WS 消息数），值须单调不减。"""
+        self._values[self._key(labels)] = value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: Optional[float], **labels: Any) -> None:
+        key = self._key(labels)
+        if value is None:
+            self._values.pop(key, None)
+        else:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        st = self._values.get(key)
+        if st is None:
+            # [各桶（非累计）计数..., +Inf 桶计数, 总和]
+            st = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        st[bisect_left(self.buckets, value)] += 1
+        st[-1] += value
+
+    def snapshot(self) -> Dict[Tuple[str, ...], List[float]]:
+        """各标签组合的桶计数副本（可 pickle，供工作进程转发）。"""
+        return {key: list(st) for key, st in self._values.items()}
+
+    def set_state(self, state: List[float], **labels: Any) -> None:
+        """镜像其他进程累计的桶计数（snapshot() 中的一项，桶边界须相同）。"""
+        self._values[self._key(labels)] = list(state)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, st in self._values.items():
+            acc = 0
+            for bound, n in zip((*self.buckets, math.inf), st[:-1]):
+                acc += n
+                le = 'le="%s"' % _fmt(bound)
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, le)} {acc}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {_fmt(st[-1])}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {acc}")
+        return lines
+
+
+class MetricsRegistry:
+    """进程内指标注册表，输出 Prometheus 文本格式（0.0.4）。
+
+    - 热路径只做计数器/直方图的字典累加；
+    - 来自现有统计（WS 分片、端点池、写线程...）的数值由采集器在每次抓取时读取，平时零开销。
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self.collector_errors = 0
+
+    def _add(self, metric: _Metric) -> Any:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (), *, buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, fn: Callable[[], None]) -> None:
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        for fn in self._collectors:
+            try:
+                fn()
+            except Exception:
+                # 某个来源暂时不可读时不影响其余指标
+                self.collector_errors += 1
+        lines: List[str] = []
+        for m in self._metrics.values():
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """在当前事件循环中提供 GET /metrics 的极简 HTTP 服务（每个请求一次渲染，响应后关闭连接）。"""
+
+    def __init__(self, render: Callable[[], str], port: int, host: str = "127.0.0.1"):
+        self.render = render
+        self.host = host
+        self.port = int(port)
+        self.requests = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> "MetricsServer":
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        # 端口为 0 时取系统分配的端口
+        self.port = self._server.sockets[0].getsockname()[1]  # type: ignore[attr-defined]
+        return self
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5.0)
+            parts = head.split(b"\r\n", 1)[0].decode("latin-1").split()
+            method, target = (parts[0], parts[1]) if len(parts) >= 2 else ("", "")
+            path = target.split("?", 1)[0]
+            if method not in ("GET", "HEAD"):
+                status, body = "405 Method Not Allowed", b"method not allowed\n"
+            elif path == "/metrics":
+                self.requests += 1
+                status, body = "200 OK", self.render().encode("utf-8")
+            else:
+                status, body = "404 Not Found", b"see /metrics\n"
+            headers = (
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode("ascii")
+            writer.write(headers if method == "HEAD" else headers + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            try:
+                await asyncio.wait_for(self._server.wait_closed(), timeout=2.0)
+            except asyncio.TimeoutError:
+                pass
+
+
+class RoundTimer:
+    """按阶段记录一轮主循环的耗时；未启用指标时什么也不做。"""
+
+    def __init__(self, metrics: Optional["MonitorMetrics"]):
+        self.metrics = metrics
+        self._t0 = self._last = 0.0
+
+    def start(self) -> None:
+        if self.metrics is not None:
+            self._t0 = self._last = time.perf_counter()
+
+    def mark(self, stage: str) -> None:
+        if self.metrics is not None:
+            now = time.perf_counter()
+            self.metrics.round_stage_seconds.observe(now - self._last, stage=stage)
+            self._last = now
+
+    def finish(self) -> None:
+        if self.metrics is not None:
+            self.metrics.round_seconds.observe(time.perf_counter() - self._t0)
+
+
+class MonitorMetrics:
+    """监控进程的指标定义；attach_* 把各组件的现有统计接入注册表（抓取时读取）。"""
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        r = self.registry = registry or MetricsRegistry()
+        r.gauge("rtmon_start_time_seconds", "Unix time the monitor process started").set(time.time())
+        self.round_seconds = r.histogram("rtmon_round_seconds", "Duration of one main-loop round", buckets=ROUND_BUCKETS)
+        self.round_stage_seconds = r.histogram(
+            "rtmon_round_stage_seconds", "Duration of each main-loop round stage", ("stage",), buckets=ROUND_BUCKETS
+        )
+        self.rest_seconds = rest_request_histogram(r)
+        self.events = r.counter("rtmon_events_total", "Alerts emitted", ("kind", "timeframe", "strategy"))
+        self._render_seconds = r.gauge("rtmon_metrics_render_seconds", "Time spent collecting and rendering the previous scrape")
+        self._last_render = 0.0
+        r.add_collector(lambda: self._render_seconds.set(self._last_render))
+
+    def render(self) -> str:
+        t0 = time.perf_counter()
+        out = self.registry.render()
+        self._last_render = time.perf_counter() - t0
+        return out
+
+    def count_events(self, events: Iterable[dict]) -> None:
+        for ev in events:
+            self.events.inc(
+                kind=ev.get("kind", ""),
+                timeframe=ev.get("timeframe") or "1m",
+                strategy=ev.get("strategy") or BUILTIN_STRATEGY,
+            )
+
+    def observe_request(self, base_url: str, path: str, status: Optional[int], seconds: float) -> None:
+        observe_request(self.rest_seconds, base_url, path, status, seconds)
+
+    def attach_client(self, client: "BinanceFuturesClient") -> None:
+        r = self.registry
+        client.add_request_listener(self.observe_request)
+        bans = r.counter("rtmon_rest_endpoint_bans_total", "Endpoint cooldowns (requests rotate to another endpoint) by reason", ("endpoint", "reason"))
+        limited = r.counter("rtmon_rest_rate_limited_total", "HTTP 418/429 responses", ("status",))
+        cooldown = r.gauge("rtmon_rest_endpoint_cooldown_seconds", "Remaining cooldown per endpoint", ("endpoint",))
+        latency = r.gauge("rtmon_rest_endpoint_latency_seconds", "EWMA latency of successful requests per endpoint", ("endpoint",))
+        error_rate = r.gauge("rtmon_rest_endpoint_error_rate", "EWMA error rate per endpoint", ("endpoint",))
+        cache_hits = r.counter("rtmon_rest_cache_hits_total", "REST responses served from the short-TTL cache")
+        coalesced = r.counter("rtmon_rest_coalesced_total", "REST requests coalesced into an identical in-flight request")
+        used_weight = r.gauge("rtmon_rest_used_weight_1m", "Last X-MBX-USED-WEIGHT-1M reported by the exchange")
+        tokens = r.gauge("rtmon_rest_weight_tokens", "Request weight currently available to the limiter")
+        waited = r.counter("rtmon_rest_limiter_wait_seconds_total", "Time requests spent waiting for weight")
+
+        def _collect() -> None:
+            for st in client.endpoint_stats():
+                ep = str(st["base_url"])
+                cooldown.set(st["cooldown_s"], endpoint=ep)
+                latency.set(st["latency_ms"] / 1000.0 if st["latency_ms"] is not None else None, endpoint=ep)
+                error_rate.set(st["error_rate"], endpoint=ep)
+            ban_counts = client.ban_counts()
+            for (ep, reason), n in ban_counts.items():
+                bans.set(n, endpoint=ep, reason=reason)
+            for code, n in rate_limited_counts(ban_counts).items():
+                limited.set(n, status=code)
+            cache_hits.set(client.cache_hits)
+            coalesced.set(client.coalesced)
+            lim = client.limiter.stats()
+            used_weight.set(lim["used_weight_1m"])
+            tokens.set(lim["tokens"])
+            waited.set(lim["waited_seconds"])
+
+        r.add_collector(_collect)
+
+    def attach_kline_ws(self, feed: "BinanceKlineWS") -> None:
+        r = self.registry
+        messages = r.counter("rtmon_ws_messages_total", "Kline stream messages received", ("shard",))
+        rate = r.gauge("rtmon_ws_messages_per_second", "Kline stream message rate since the previous scrape", ("shard",))
+        reconnects = r.counter("rtmon_ws_reconnects_total", "Kline stream reconnects", ("shard",))
+        connected = r.gauge("rtmon_ws_connected", "1 if the kline stream shard is connected", ("shard",))
+        streams = r.gauge("rtmon_ws_streams", "Kline streams subscribed per shard", ("shard",))
+        lag = r.gauge("rtmon_ws_event_lag_seconds", "EWMA of receive time minus exchange event time", ("shard",))
+
+        def _collect() -> None:
+            for m in (messages, rate, reconnects, connected, streams, lag):
+                m.clear()
+            for st in feed.stats(reader="metrics"):
+                sh = st["shard"]
+                messages.set(st["messages"], shard=sh)
+                rate.set(st["msg_rate"], shard=sh)
+                reconnects.set(st["reconnects"], shard=sh)
+                connected.set(1 if st["connected"] else 0, shard=sh)
+                streams.set(st["streams"], shard=sh)
+                lag.set(st["lag_ms"] / 1000.0 if st["lag_ms"] is not None else None, shard=sh)
+
+        r.add_collector(_collect)
+
+    def attach_ticker_ws(self, feed: "BinanceTickerWS") -> None:
+        r = self.registry
+        messages = r.counter("rtmon_ticker_ws_messages_total", "Mini-ticker stream messages received")
+        reconnects = r.counter("rtmon_ticker_ws_reconnects_total", "Mini-ticker stream reconnects")
+        age = r.gauge("rtmon_ticker_ws_age_seconds", "Seconds since the last mini-ticker update")
+
+        def _collect() -> None:
+            messages.set(feed.messages)
+            reconnects.set(feed.reconnects)
+            age.set(time.monotonic() - feed.last_update if feed.last_update is not None else None)
+
+        r.add_collector(_collect)
+
+    def attach_latency(self, close_latency: RollingQuantiles, event_latency: RollingQuantiles) -> None:
+        """事件驱动模式下收盘/交易所事件时刻到处理完成的延迟（最近样本的分位数）。"""
+        r = self.registry
+        pairs = [
+            (close_latency, "rtmon_kline_close_lag_seconds", "Kline close time to processing done"),
+            (event_latency, "rtmon_kline_event_lag_seconds", "Exchange event time to processing done"),
+        ]
+        gauges = [(q, r.gauge(name, f"{text} (rolling quantiles)", ("quantile",)), r.counter(name + "_samples_total", f"{text} samples")) for q, name, text in pairs]
+
+        def _collect() -> None:
+            for rq, g, n in gauges:
+                for q in (0.5, 0.9, 0.99):
+                    v = rq.quantile(q)
+                    g.set(v / 1000.0 if v is not None else None, quantile=q)
+                n.set(rq.count)
+
+        r.add_collector(_collect)
+
+    def attach_monitor(self, monitor: "SymbolMonitor", tracked: Collection[str]) -> None:
+        r = self.registry
+        tracked_g = r.gauge("rtmon_tracked_symbols", "Symbols currently tracked for signals")
+        states = r.gauge("rtmon_symbol_states", "Symbols with EMA state in this process")
+        gaps = r.counter("rtmon_kline_gaps_total", "Missing-minute gaps detected", ("kind",))
+        tf_symbols = r.gauge("rtmon_timeframe_symbols", "Symbols per aggregated timeframe by readiness", ("timeframe", "state"))
+        strat = r.counter("rtmon_strategy_work_total", "Strategy engine candles and shared indicator updates", ("kind",))
+
+        def _collect() -> None:
+            tracked_g.set(len(tracked))
+            states.set(len(monitor.states))
+            for k, v in monitor.metrics.items():
+                gaps.set(v, kind=k)
+            if monitor.timeframes is not None:
+                for tf, st in monitor.timeframes.stats().items():
+                    tf_symbols.set(st["ready"], timeframe=tf, state="ready")
+                    tf_symbols.set(st["warming"], timeframe=tf, state="warming")
+            if monitor.strategies is not None:
+                st = monitor.strategies.stats()
+                strat.set(st["candles"], kind="candles")
+                strat.set(st["indicator_updates"], kind="indicator_updates")
+
+        r.add_collector(_collect)
+
+    def attach_writer(self, writer: "EventWriter") -> None:
+        r = self.registry
+        depth = r.gauge("rtmon_event_writer_queue_depth", "Events queued for the writer thread")
+        high = r.gauge("rtmon_event_writer_queue_high_water", "Highest writer queue depth seen")
+        counts = r.counter("rtmon_event_writer_events_total", "Writer thread results", ("result",))
+
+        def _collect() -> None:
+            st = writer.stats()
+            depth.set(st["queued"])
+            high.set(st["high_water"])
+            for k in ("written", "dropped", "errors", "rotations"):
+                counts.set(st[k], result=k)
+
+        r.add_collector(_collect)
+
+    def attach_scheduler(self, scheduler: "MinuteScheduler") -> None:
+        r = self.registry
+        counts = r.counter("rtmon_scheduler_total", "Minute scheduler rounds and per-symbol outcomes", ("kind",))
+        last = r.gauge("rtmon_scheduler_last_round_seconds", "Duration of the last minute-aligned round")
+        offset = r.gauge("rtmon_server_clock_offset_seconds", "Exchange server clock minus local clock")
+
+        def _collect() -> None:
+            st = scheduler.stats
+            for k in ("rounds", "requests", "skipped", "retries", "stale"):
+                counts.set(st[k], kind=k)
+            last.set(st["last_round_ms"] / 1000.0)
+            offset.set(scheduler.clock.offset_ms / 1000.0)
+
+        r.add_collector(_collect)
+
+    def attach_cluster(self, cluster: "ClusterCoordinator") -> None:
+        r = self.registry
+        alive = r.gauge("rtmon_worker_alive", "1 if the worker process is running", ("worker",))
+        symbols = r.gauge("rtmon_worker_symbols", "Symbols with state in the worker", ("worker",))
+        totals = r.counter("rtmon_worker_total", "Worker rounds, klines, events and REST requests", ("worker", "kind"))
+        last = r.gauge("rtmon_worker_last_round_seconds", "Duration of the worker's last round", ("worker",))
+        lag = r.gauge("rtmon_worker_ws_lag_seconds", "Worker kline stream event lag", ("worker",))
+        # 工作进程的 REST 流量：延迟直方图与冷却/限流计数随 stats 消息转发，这里原样镜像
+        rest = rest_request_histogram(r, "rtmon_worker_rest_request_seconds", ("worker", "path", "status"))
+        bans = r.counter("rtmon_worker_rest_endpoint_bans_total", "Worker endpoint cooldowns by reason", ("worker", "endpoint", "reason"))
+        limited = r.counter("rtmon_worker_rest_rate_limited_total", "Worker HTTP 418/429 responses", ("worker", "status"))
+
+        def _collect() -> None:
+            for st in cluster.stats():
+                w = st["worker"]
+                for (path, status), state in (st.get("rest_seconds") or {}).items():
+                    rest.set_state(state, worker=w, path=path, status=status)
+                ban_counts = st.get("ban_counts") or {}
+                for (ep, reason), n in ban_counts.items():
+                    bans.set(n, worker=w, endpoint=ep, reason=reason)
+                for code, n in rate_limited_counts(ban_counts).items():
+                    limited.set(n, worker=w, status=code)
+                alive.set(1 if st.get("alive") else 0, worker=w)
+                symbols.set(st.get("symbols", 0), worker=w)
+                for k in ("rounds", "klines", "events", "requests", "ws_reconnects"):
+                    if k in st:
+                        totals.set(st[k], worker=w, kind=k)
+                last.set(st.get("last_round_ms", 0.0) / 1000.0, worker=w)
+                lag.set(st["ws_lag_ms"] / 1000.0 if st.get("ws_lag_ms") is not None else None, worker=w)
+
+        r.add_collector(_collect)
@@ -1,17 +1,28 @@
 from __future__ import annotations
 
 import asyncio
+import warnings
 from dataclasses import dataclass, field
-from typing import Dict, Optional, Tuple, List
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Tuple, List
 from collections import deque
-import time
+
+import numpy as np
 
 from .ema import EMASet, detect_cross
+from .ema_vec import CROSS_NAMES, EMAMatrix, seed_ema_batch
+from .close_ring import CloseRing
 from .binance_client import (
     BinanceFuturesClient,
+    fetch_klines_since,
     fetch_latest_closed_kline,
-    fetch_recent_closes,
+    fetch_recent_klines,
 )
+from .kline_store import KlineStore, sync_tail
+from .strategies import BUILTIN_STRATEGY, StrategyEngine
+from .time_utils import now_ms_utc
+
+if TYPE_CHECKING:
+    from .timeframes import TimeframeAggregator
 
 
 @dataclass
@@ -25,7 +36,7 @@ class CrossWatch:
 @dataclass
 class SymbolState:
     symbol: str
-    ema: EMASet
+    ema: EMASet  # 向量化模式下为 ema_vec.EMARow（接口相同）
     last_open_time: Optional[int] = None
     prev_snapshot: Optional[Tuple[float, float, float, float]] = None
     watch: Optional[CrossWatch] = None
@@ -39,7 +50,6 @@ class SymbolMonitor:
     def __init__(
         self,
         client: BinanceFuturesClient,
-        concurrency: int = 20,
         confirm_candles: int = 5,
         seed_limit: int = 600,
         ws_cache: Optional[Dict[str, Tuple[int, float, float, float, float, float]]] = None,
@@ -48,10 +58,14 @@ class SymbolMonitor:
         max_price: Optional[float] = None,
         min_quote_usdt: Optional[float] = None,
         cooldown_seconds: int = 0,
+        ema_engine: Optional[EMAMatrix] = None,
+        store: Optional[KlineStore] = None,
+        close_ring: Optional[CloseRing] = None,
+        timeframes: Optional["TimeframeAggregator"] = None,
+        strategies: Optional[StrategyEngine] = None,
     ):
         self.client = client
         self.states: Dict[str, SymbolState] = {}
-        self._sem = asyncio.Semaphore(concurrency)
         self.confirm_candles = max(1, int(confirm_candles))
         self.seed_limit = max(100, int(seed_limit))  # 至少保证>83
         self.ws_cache = ws_cache or {}
@@ -61,61 +75,274 @@ class SymbolMonitor:
         self.min_quote_usdt = float(min_quote_usdt) if min_quote_usdt is not None else None
         self.cooldown_seconds = max(0, int(cooldown_seconds))
         self._last_alert_at: Dict[str, int] = {}
+        # 可选：全体交易对共享的数组化EMA引擎（update_many 时批量推进）
+        self.ema_engine = ema_engine
+        # 可选：本地K线仓库（seed 只补尾部，收盘K线随时落盘）
+        self.store = store
+        # 可选：全体交易对共享的收盘价环形缓冲（多窗口 Δ% 一次向量化计算，支持长窗口）
+        self.close_ring = close_ring
+        # 可选：由 1m 收盘聚合的高周期K线（5m/15m/1h...）及其独立的交叉判断
+        self.timeframes = timeframes
+        # 可选：与内置规则并行的可插拔指标/策略引擎（指标按交易对、按根共享计算）
+        self.strategies = strategies
+        # 本监控器判断所用的K线周期（高周期聚合器内部的监控器会改写）
+        self.timeframe = "1m"
+        # 每根已处理的收盘K线回调 (symbol, (t, o, h, l, c, qv))
+        self._kline_listeners: List[Callable[[str, tuple], None]] = []
+        # 同一交易对的K线须串行、按时间顺序推进（事件驱动、补缺与补推可能并发）
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # 缺口统计：检测到的缺口次数/缺失根数、区间补拉请求数/补齐根数/失败次数
+        self.metrics: Dict[str, int] = {
+            "gaps": 0,
+            "gap_candles": 0,
+            "backfill_requests": 0,
+            "backfilled_candles": 0,
+            "backfill_failures": 0,
+        }
+
+    def add_kline_listener(self, fn: Callable[[str, tuple], None]) -> None:
+        self._kline_listeners.append(fn)
 
     async def ensure_state(self, symbol: str):
-        if symbol in self.states:
-            return
-        # 初始化EMA（取至少 seed_limit 根，保证 seed 充足）
-        closes = [c for _, c in await fetch_recent_closes(self.client, symbol, limit=self.seed_limit)]
-        ema = EMASet.create_seeded(closes)
-        prev_close = closes[-2] if len(closes) >= 2 else None
-        last_close = closes[-1] if len(closes) >= 1 else None
+        await self.ensure_states([symbol])
+
+    async def _fetch_seed(self, symbol: str) -> np.ndarray:
+        # 初始化EMA（取至少 seed_limit 根，保证 seed 充足；仅保留已收盘K线）
+        # 并发与权重由客户端共享的限流器统一调度
+        now_ms = now_ms_utc()
+        if self.store is not None:
+            since_ms = now_ms - self.seed_limit * 60_000
+            await sync_tail(self.client, self.store, symbol, since_ms=since_ms, now_ms=now_ms)
+            # 只用刚同步的这段窗口：本地旧数据早于 since_ms 时 sync_tail 会保留缺口，tail() 可能跨过缺口
+            arr = np.array(self.store.range(symbol, since_ms))
+            if len(arr) >= 83:
+                return arr
+        return await fetch_recent_klines(self.client, symbol, limit=self.seed_limit, closed_before_ms=now_ms)
+
+    def _install_states(self, symbols: List[str], arrays: List[np.ndarray]) -> None:
+        """按K线根数分组，每组以二维批量一次性 seed 四条EMA，再建立 SymbolState。"""
+        groups: Dict[int, List[int]] = {}
+        for i, s in enumerate(symbols):
+            if s not in self.states:
+                groups.setdefault(len(arrays[i]), []).append(i)
+        for idxs in groups.values():
+            values = seed_ema_batch(np.stack([arrays[i][:, 4] for i in idxs]))
+            for row, i in zip(values, idxs):
+                self._install_state(symbols[i], arrays[i], row)
+
+    def _install_state(self, symbol: str, arr: np.ndarray, ema_values: np.ndarray) -> None:
+        if self.ema_engine is not None:
+            ema = self.ema_engine.add(symbol, ema_values)
+        else:
+            ema = EMASet.from_values(ema_values)
+        closes = arr[-64:, 4].tolist()
+        if self.close_ring is not None:
+            self.close_ring.load(symbol, arr[:, 0], arr[:, 4])
+        if self.strategies is not None:
+            self.strategies.seed(symbol, arr)
+        if self.timeframes is not None:
+            self.timeframes.seed(symbol, arr)
         self.states[symbol] = SymbolState(
             symbol=symbol,
             ema=ema,
-            last_open_time=None,
+            # seed 已包含到这根为止的全部已收盘K线，避免下一轮重复推进同一根
+            last_open_time=int(arr[-1, 0]),
             prev_snapshot=ema.snapshot(),
-            prev_close=prev_close,
-            last_close=last_close,
-            recent_closes=deque(closes[-64:], maxlen=64),
+            prev_close=closes[-2] if len(closes) >= 2 else None,
+            last_close=closes[-1],
+            recent_closes=deque(closes, maxlen=64),
         )
 
-    async def drop_state(self, symbol: str):
-        self.states.pop(symbol, None)
+    async def drop_state(self, symbol: str, *, keep_timeframes: bool = False):
+        """移除交易对的状态；keep_timeframes 时保留高周期聚合状态（交易对仍在全市场中，只是暂时不跟踪）。
 
-    async def update_symbol_once(self, symbol: str) -> Optional[dict]:
-        # 返回可能的提示文本（入场信号）
+        与 update_symbol 共用该交易对的锁：正在补拉缺口的更新先完成，再归还 EMA 行与收盘缓冲行。
+        """
+        async with self._lock(symbol):
+            self.states.pop(symbol, None)
+            if self.ema_engine is not None:
+                self.ema_engine.remove(symbol)
+            if self.close_ring is not None:
+                self.close_ring.remove(symbol)
+            if self.strategies is not None:
+                self.strategies.drop(symbol)
+            if self.timeframes is not None and not keep_timeframes:
+                self.timeframes.drop(symbol)
+
+    async def _latest_kline(self, symbol: str) -> Optional[Tuple[int, float, float, float, float, float]]:
         # 优先使用 WebSocket 缓存的已收盘K线
         k = self.ws_cache.get(symbol) if self.ws_cache else None
         if k is None:
-            async with self._sem:
-                k = await fetch_latest_closed_kline(self.client, symbol)
-        if not k:
-            return None
-        # 兼容 ws/REST：均为 (t, o, h, l, c, qv)
-        open_time, _o, high, low, close = k[:5]
-        quote_vol = float(k[5]) if len(k) > 5 else None
+            k = await fetch_latest_closed_kline(self.client, symbol)
+        return k or None
+
+    async def _fresh_state(self, symbol: str, k) -> Optional[SymbolState]:
+        """返回需要处理该K线的 SymbolState；若K线不是新的则返回 None。"""
         st = self.states.get(symbol)
         if st is None:
             await self.ensure_state(symbol)
-            st = self.states[symbol]
-
-        if st.last_open_time is not None and open_time <= st.last_open_time:
+            st = self.states.get(symbol)
+            if st is None:
+                return None  # seed 期间已被移除
+        if st.last_open_time is not None and k[0] <= st.last_open_time:
             return None  # 没有新K线
+        return st
+
+    def _lock(self, symbol: str) -> asyncio.Lock:
+        lock = self._locks.get(symbol)
+        if lock is None:
+            lock = self._locks[symbol] = asyncio.Lock()
+        return lock
+
+    async def update_symbol_once(self, symbol: str, kline: Optional[tuple] = None) -> Optional[dict]:
+        """已弃用，请改用 update_symbol()。
+
+        只返回本次产生的第一条内置规则（1m ema_cross）事件：补齐缺口时的其余内置事件、
+        策略引擎与高周期事件都会丢失（冷却时间照常记录）。
+        """
+        warnings.warn("update_symbol_once() 会丢失事件，请改用 update_symbol()", DeprecationWarning, stacklevel=2)
+        events = await self.update_symbol(symbol, kline)
+        return next(
+            (ev for ev in events if ev.get("strategy") == BUILTIN_STRATEGY and ev.get("timeframe") == self.timeframe),
+            None,
+        )
+
+    async def update_symbol(self, symbol: str, kline: Optional[tuple] = None) -> List[dict]:
+        """推进该交易对到最新已收盘K线，返回全部事件（含补齐缺口时产生的，按时间顺序）。
 
+        kline 由调用方直接给出时（事件驱动）不再查缓存/REST。
+        """
+        k = kline if kline is not None else await self._latest_kline(symbol)
+        if not k:
+            return []
+        async with self._lock(symbol):
+            st = await self._fresh_state(symbol, k)
+            if st is None:
+                return []
+            events = await self._fill_gap(st, k)
+            if self.states.get(symbol) is not st:
+                # 补拉期间状态已被移除或重建：旧 EMA 行可能已分给其他交易对，不能再推进
+                return []
+            events.extend(self._advance(st, k))
+        return events
+
+    def _advance(self, st: SymbolState, k) -> List[dict]:
+        # 单根K线推进EMA（标量路径）
         prev = st.ema.snapshot()
-        st.ema.update(close)
+        st.ema.update(k[4])
         cur = st.ema.snapshot()
+        return self._closed_events(st, k, prev, cur, detect_cross(prev, cur))
+
+    def _closed_events(
+        self,
+        st: SymbolState,
+        k,
+        prev: Tuple[float, float, float, float],
+        cur: Tuple[float, float, float, float],
+        cross: Optional[str],
+    ) -> List[dict]:
+        """本根K线的事件（内置规则与策略引擎），以及它收齐的高周期K线产生的事件。"""
+        ev = self._on_closed_kline(st, k, prev, cur, cross)
+        out = [ev] if ev else []
+        if self.strategies is not None:
+            for sev in self.strategies.on_kline(st.symbol, k):
+                allowed = self._maybe_allow_event(
+                    st.symbol, sev, sev["open_time"], sev["price"], sev["quote_volume"], None, sev["high"], sev["low"]
+                )
+                if allowed:
+                    out.append(allowed)
+        if self.timeframes is not None:
+            out.extend(self.timeframes.on_kline(st.symbol, k))
+        return out
+
+    def _replay(self, st: SymbolState, arr: np.ndarray, before_ms: Optional[int] = None) -> List[dict]:
+        """按时间顺序推进一段已收盘K线 (n, 6)，跳过已处理过的与不早于 before_ms 的。"""
+        out: List[dict] = []
+        for row in arr:
+            k = (int(row[0]), float(row[1]), float(row[2]), float(row[3]), float(row[4]), float(row[5]))
+            if st.last_open_time is not None and k[0] <= st.last_open_time:
+                continue
+            if before_ms is not None and k[0] >= before_ms:
+                break
+            out.extend(self._advance(st, k))
+        return out
+
+    async def _closed_klines_since(self, symbol: str, start_ms: int, end_ms: Optional[int] = None) -> np.ndarray:
+        now_ms = now_ms_utc()
+        if self.store is not None:
+            await sync_tail(self.client, self.store, symbol, since_ms=start_ms, now_ms=now_ms)
+            arr = self.store.range(symbol, start_ms, end_ms)
+            if len(arr) and int(arr[0, 0]) == start_ms:
+                return np.array(arr)
+        return await fetch_klines_since(self.client, symbol, start_ms, end_ms=end_ms, closed_before_ms=now_ms)
+
+    async def _fill_gap(self, st: SymbolState, k) -> List[dict]:
+        """k 与上一根之间有缺失分钟（WS 重连、轮询过慢）时，用区间 klines 补齐并按顺序推进。"""
+        last = st.last_open_time
+        if last is None or k[0] <= last + 60_000:
+            return []
+        self.metrics["gaps"] += 1
+        self.metrics["gap_candles"] += (k[0] - last) // 60_000 - 1
+        try:
+            arr = await self._closed_klines_since(st.symbol, last + 60_000, end_ms=k[0] - 60_000)
+        except Exception:
+            self.metrics["backfill_failures"] += 1
+            return []
+        self.metrics["backfill_requests"] += 1
+        if self.states.get(st.symbol) is not st:
+            return []
+        before = st.last_open_time
+        out = self._replay(st, arr, before_ms=k[0])
+        if st.last_open_time is not None and before is not None:
+            self.metrics["backfilled_candles"] += (st.last_open_time - before) // 60_000
+        return out
+
+    async def catch_up(self, symbols: List[str]) -> List[dict]:
+        """将已有状态（如从检查点恢复）补推到最新已收盘K线，只拉取缺失的分钟。
+
+        返回补推过程中产生的事件（按交易对、时间顺序）。
+        """
+        async def _one(symbol: str) -> List[dict]:
+            st = self.states.get(symbol)
+            if st is None or st.last_open_time is None:
+                return []
+            async with self._lock(symbol):
+                arr = await self._closed_klines_since(symbol, st.last_open_time + 60_000)
+                if self.states.get(symbol) is not st:
+                    return []
+                return self._replay(st, arr)
+
+        results = await asyncio.gather(*[_one(s) for s in symbols])
+        return [ev for evs in results for ev in evs]
+
+    def _on_closed_kline(
+        self,
+        st: SymbolState,
+        k,
+        prev: Tuple[float, float, float, float],
+        cur: Tuple[float, float, float, float],
+        cross: Optional[str],
+    ) -> Optional[dict]:
+        """EMA 已推进到本根收盘后的状态维护与信号判断。"""
+        symbol = st.symbol
+        # 兼容 ws/REST：均为 (t, o, h, l, c, qv)
+        open_time, _o, high, low, close = k[:5]
+        quote_vol = float(k[5]) if len(k) > 5 else None
         st.last_open_time = open_time
         # 维护1m收盘价对比
         st.prev_close = st.last_close
         st.last_close = close
         # 维护滚动收盘窗口（用于 1/5/15m Δ% 计算）
         st.recent_closes.append(close)
+        if self.close_ring is not None:
+            self.close_ring.push(symbol, open_time, close)
         st.last_quote_volume = quote_vol
+        if self.store is not None:
+            self.store.append_row(symbol, [open_time, _o, high, low, close, quote_vol or 0.0])
+        for fn in self._kline_listeners:
+            fn(symbol, k)
 
         # 交叉检测
-        cross = detect_cross(prev, cur)
         if cross:
             # 记录观察窗口：交叉后统计接下来5根K线
             st.watch = CrossWatch(
@@ -144,6 +371,21 @@ class SymbolMonitor:
                         out_tip = f"[{symbol}] 下穿后反弹本根涨破EMA21但收盘未站上EMA21 -> 提示"
                     st.watch.broken = True
 
+            tip_event: Optional[dict] = None
+            if out_tip:
+                tip_event = {
+                    "symbol": symbol,
+                    "kind": "tip",
+                    "direction": st.watch.direction,
+                    "open_time": open_time,
+                    "price": close,
+                    "ema21": ema21,
+                    "high": high,
+                    "low": low,
+                    "quote_volume": quote_vol,
+                    "message": out_tip,
+                }
+
             # 统计根数递减，到第N根收盘时判断
             st.watch.candles_left -= 1
             if st.watch.candles_left <= 0:
@@ -164,24 +406,12 @@ class SymbolMonitor:
                     }
                 st.watch = None
                 # 若前面已有提示，优先返回提示；否则返回信号
-                return self._maybe_allow_event(symbol, out_tip, open_time, close, quote_vol, ema21, high, low) or (
+                return self._maybe_allow_event(symbol, tip_event, open_time, close, quote_vol, ema21, high, low) or (
                     self._maybe_allow_event(symbol, event_sig, open_time, close, quote_vol, ema21, high, low) if event_sig else None
                 )
 
             # 若未到期，但有提示，立即返回提示
-            if out_tip:
-                tip_event = {
-                    "symbol": symbol,
-                    "kind": "tip",
-                    "direction": st.watch.direction,
-                    "open_time": open_time,
-                    "price": close,
-                    "ema21": ema21,
-                    "high": high,
-                    "low": low,
-                    "quote_volume": quote_vol,
-                    "message": out_tip,
-                }
+            if tip_event:
                 return self._maybe_allow_event(symbol, tip_event, open_time, close, quote_vol, ema21, high, low)
 
         st.prev_snapshot = cur
@@ -194,7 +424,7 @@ class SymbolMonitor:
         open_time: int,
         close: float,
         quote_vol: Optional[float],
-        ema21: float,
+        ema21: Optional[float],
         high: float,
         low: float,
     ) -> Optional[dict]:
@@ -208,30 +438,68 @@ class SymbolMonitor:
         # 成交额过滤（1m报价量，单位约等于USDT）
         if self.min_quote_usdt is not None and (quote_vol is None or quote_vol < self.min_quote_usdt):
             return None
-        # 冷却时间
+        # 冷却时间（内置规则按交易对，策略引擎按 交易对@策略 分别计）
         now_s = open_time // 1000
-        last = self._last_alert_at.get(symbol, 0)
+        key = f"{symbol}@{event['strategy']}" if event.get("strategy") else symbol
+        last = self._last_alert_at.get(key, 0)
         if self.cooldown_seconds > 0 and now_s - last < self.cooldown_seconds:
             return None
         # 通过，记录时间戳并返回
-        self._last_alert_at[symbol] = now_s
+        self._last_alert_at[key] = now_s
         # 附带补充字段（冗余安全）
         event.setdefault("ts", now_s)
+        event.setdefault("timeframe", self.timeframe)
+        event.setdefault("strategy", BUILTIN_STRATEGY)
         return event
 
     async def update_many(self, symbols: List[str]) -> List[dict]:
         # 初始化缺失state
-        tasks_init = [self.ensure_state(s) for s in symbols if s not in self.states]
-        if tasks_init:
-            await asyncio.gather(*tasks_init)
-        # 并发轮询
-        results: List[Optional[dict]] = await asyncio.gather(*[self.update_symbol_once(s) for s in symbols])
-        return [r for r in results if r]
+        await self.ensure_states(symbols)
+        if self.ema_engine is None:
+            # 并发轮询
+            results: List[List[dict]] = await asyncio.gather(*[self.update_symbol(s) for s in symbols])
+            return [ev for evs in results for ev in evs]
+        return await self._update_many_batched(symbols)
+
+    async def _update_many_batched(self, symbols: List[str]) -> List[dict]:
+        # 先并发取K线，再对所有有新收盘的交易对一次性推进EMA并做交叉掩码
+        klines = await asyncio.gather(*[self._latest_kline(s) for s in symbols])
+        fresh: List[Tuple[SymbolState, tuple]] = []
+        for s, k in zip(symbols, klines):
+            if not k:
+                continue
+            st = await self._fresh_state(s, k)
+            if st is not None:
+                fresh.append((st, k))
+        if not fresh:
+            return []
+        # 本轮所有缺口并发补拉（由客户端限流器统一调度），补齐后再批量推进新K线
+        out: List[dict] = []
+        for evs in await asyncio.gather(*[self._fill_gap(st, k) for st, k in fresh]):
+            out.extend(evs)
+        # 等待期间被移除的交易对不再推进（其 EMA 行可能已归还或分给其他交易对）
+        fresh = [(st, k) for st, k in fresh if self.states.get(st.symbol) is st]
+        if not fresh:
+            return out
+        assert self.ema_engine is not None
+        prev, cur, crosses = self.ema_engine.step([st.symbol for st, _ in fresh], [k[4] for _, k in fresh])
+        for i, (st, k) in enumerate(fresh):
+            out.extend(self._closed_events(
+                st,
+                k,
+                tuple(map(float, prev[i])),
+                tuple(map(float, cur[i])),
+                CROSS_NAMES.get(int(crosses[i])),
+            ))
+        return out
 
     async def ensure_states(self, symbols: List[str]):
-        tasks_init = [self.ensure_state(s) for s in symbols if s not in self.states]
-        if tasks_init:
-            await asyncio.gather(*tasks_init)
+        missing = [s for s in symbols if s not in self.states]
+        if not missing:
+            return
+        # 并发拉取原始K线，解析为数组后按批 seed
+        arrays = await asyncio.gather(*[self._fetch_seed(s) for s in missing])
+        self._install_states(missing, list(arrays))
 
     def minute_change_map(self, symbols: List[str]) -> Dict[str, float]:
         out: Dict[str, float] = {}
@@ -244,6 +512,8 @@ class SymbolMonitor:
 
     def multi_change_map(self, symbols: List[str], windows: List[int]) -> Dict[str, Dict[int, float]]:
         # 返回 {symbol: {window: pct, ...}, ...}
+        if self.close_ring is not None:
+            return self.close_ring.change_map(symbols, windows)
         res: Dict[str, Dict[int, float]] = {}
         uniq_windows = sorted(set(int(w) for w in windows if int(w) > 0))
         for s in symbols:
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+# U本位合约 REST 默认每分钟请求权重上限（IP 维度）
+WEIGHT_LIMIT_1M = 2400
+# 多进程模式下协调进程（全量价格、基准等）保留的额度比例，其余由工作进程平分
+COORDINATOR_WEIGHT_SHARE = 0.1
+
+
+def request_weight(path: str, params: Optional[Dict[str, Any]] = None) -> int:
+    """各端点的请求权重（参见交易所文档）。"""
+    params = params or {}
+    if path == "/fapi/v1/klines":
+        limit = int(params.get("limit", 500))
+        if limit < 100:
+            return 1
+        if limit < 500:
+            return 2
+        if limit <= 1000:
+            return 5
+        return 10
+    if path == "/fapi/v1/ticker/price":
+        return 1 if params.get("symbol") else 2
+    return 1
+
+
+class WeightLimiter:
+    """按分钟权重上限调度 REST 请求的令牌桶，由同一客户端的所有调用方共享。
+
+    - 令牌按 limit * headroom / 60 每秒匀速补充，桶容量为一分钟的额度，有余量时不等待；
+    - observe() 读取响应头 X-MBX-USED-WEIGHT-1M，按服务器口径下调本地剩余额度；
+    - penalize() 在 418/429 后按 Retry-After 暂停全部请求；
+    - max_in_flight 同时限制并发请求数（取代各调用方各自的信号量）；
+    - share 为本限流器占 IP 额度的比例（多进程共用一个 IP 时）：容量按比例缩小，
+      响应头中的已用权重是整个 IP 的合计，也按同一比例折算后再扣减。
+    """
+
+    def __init__(
+        self,
+        limit_per_min: int = WEIGHT_LIMIT_1M,
+        *,
+        headroom: float = 0.9,
+        max_in_flight: int = 20,
+        share: float = 1.0,
+    ):
+        self._ip_capacity = float(limit_per_min) * float(headroom)
+        self.share = min(1.0, max(1e-3, float(share)))
+        self.capacity = self._ip_capacity * self.share
+        self._rate = self.capacity / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+        self._in_flight = asyncio.Semaphore(max(1, int(max_in_flight)))
+        # 统计
+        self.used_weight_1m: Optional[int] = None
+        self.waited_seconds = 0.0
+        self.penalties = 0
+
+    def set_share(self, share: float) -> None:
+        """调整占 IP 额度的比例（如单进程初始化完成后切换为多进程协调进程）。"""
+        self._refill(time.monotonic())
+        self.share = min(1.0, max(1e-3, float(share)))
+        self.capacity = self._ip_capacity * self.share
+        self._rate = self.capacity / 60.0
+        self._tokens = min(self._tokens, self.capacity)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    async def acquire(self, weight: int) -> None:
+        # 串行排队，保证先到先得，避免大权重请求被小请求饿死
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    delay = self._blocked_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= weight:
+                        self._tokens -= weight
+                        return
+                    delay = (weight - self._tokens) / self._rate
+                self.waited_seconds += delay
+                await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def slot(self, weight: int) -> AsyncIterator[None]:
+        await self.acquire(weight)
+        async with self._in_flight:
+            yield
+
+    def observe(self, used_weight_1m: Optional[str | int]) -> None:
+        if used_weight_1m is None:
+            return
+        try:
+            used = int(used_weight_1m)
+        except (TypeError, ValueError):
+            return
+        self.used_weight_1m = used
+        self._refill(time.monotonic())
+        self._tokens = min(self._tokens, self.capacity - used * self.share)
+
+    def penalize(self, seconds: float) -> None:
+        self.penalties += 1
+        self._tokens = min(self._tokens, 0.0)
+        self._blocked_until = max(self._blocked_until, time.monotonic() + max(0.0, float(seconds)))
+
+    def stats(self) -> Dict[str, Any]:
+        self._refill(time.monotonic())
+        return {
+            "tokens": self._tokens,
+            "capacity": self.capacity,
+            "share": self.share,
+            "used_weight_1m": self.used_weight_1m,
+            "waited_seconds": self.waited_seconds,
+            "penalties": self.penalties,
+        }
@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from .kline_store import MINUTE_MS, KlineStore
+from .monitor import SymbolMonitor
+from .strategies import BUILTIN_STRATEGY, build_engine, load_strategy_specs
+from .timeframes import build_aggregator, parse_timeframes
+from .time_utils import parse_time_ms
+
+
+class StoreClient:
+    """以 KlineStore 代替 BinanceFuturesClient 的只读客户端（仅实现 monitor 用到的 klines）。
+
+    now_ms 为回放的虚拟时钟：不带 endTime 的请求只返回此前已收盘的K线。
+    """
+
+    def __init__(self, store: KlineStore, now_ms: Optional[int] = None):
+        self.store = store
+        self.now_ms = now_ms
+
+    async def klines(
+        self,
+        symbol: str,
+        interval: str = "1m",
+        limit: int = 500,
+        startTime: Optional[int] = None,
+        endTime: Optional[int] = None,
+        *,
+        hedge: bool = False,
+    ) -> List[List[Any]]:
+        if interval != "1m":
+            raise ValueError(f"StoreClient 仅支持 1m，收到 {interval}")
+        end = endTime
+        if self.now_ms is not None:
+            closed = self.now_ms - MINUTE_MS
+            end = closed if end is None else min(end, closed)
+        arr = self.store.range(symbol, startTime, end)
+        arr = arr[: int(limit)] if startTime is not None else arr[-int(limit):]
+        # 还原为交易所K线格式：openTime, open, high, low, close, volume, closeTime, quoteVolume
+        return [[int(t), o, h, l, c, 0.0, int(t) + MINUTE_MS - 1, qv] for t, o, h, l, c, qv in arr.tolist()]
+
+    async def aclose(self) -> None:
+        pass
+
+
+@dataclass
+class ReplayResult:
+    symbols: int = 0
+    candles: int = 0
+    seconds: float = 0.0
+    events: List[dict] = field(default_factory=list)
+
+    @property
+    def candles_per_sec(self) -> float:
+        return self.candles / self.seconds if self.seconds > 0 else 0.0
+
+    def merge(self, other: "ReplayResult") -> None:
+        self.symbols += other.symbols
+        self.candles += other.candles
+        self.events.extend(other.events)
+
+
+async def _replay_async(
+    store: KlineStore,
+    symbols: List[str],
+    start_ms: int,
+    end_ms: Optional[int],
+    monitor_kwargs: Dict[str, Any],
+) -> ReplayResult:
+    client = StoreClient(store, now_ms=start_ms)
+    kwargs = dict(monitor_kwargs)
+    # 高周期由回放的 1m 聚合；仓库尾部不是回放起点前的历史，不用于 seed（不足 83 根的周期在回放中预热）
+    # 策略引擎同理只用回放起点前的 seed 预热
+    specs = kwargs.pop("strategies", None)
+    timeframes = build_aggregator(kwargs.pop("timeframes", None), kwargs, strategies=specs)
+    monitor = SymbolMonitor(client, timeframes=timeframes, strategies=build_engine(specs), **kwargs)  # type: ignore[arg-type]
+    res = ReplayResult()
+    for sym in symbols:
+        # 逐个交易对回放：seed 取 start_ms 之前的 seed_limit 根，再按时间顺序逐根推进
+        client.now_ms = start_ms
+        try:
+            await monitor.ensure_states([sym])
+        except ValueError:
+            continue  # 起点前历史不足以 seed
+        if sym not in monitor.states:
+            continue
+        rows = store.range(sym, start_ms, end_ms - MINUTE_MS if end_ms is not None else None)
+        client.now_ms = None  # 缺口补拉按 endTime 取区间，不再受虚拟时钟限制
+        for t, o, h, l, c, qv in rows.tolist():
+            res.events.extend(await monitor.update_symbol(sym, kline=(int(t), o, h, l, c, qv)))
+        res.candles += len(rows)
+        res.symbols += 1
+        await monitor.drop_state(sym)
+    return res
+
+
+def replay_symbols(
+    store_root: str,
+    symbols: List[str],
+    start_ms: int,
+    end_ms: Optional[int] = None,
+    **monitor_kwargs: Any,
+) -> ReplayResult:
+    """在当前进程内回放一组交易对（可作为进程池任务）。"""
+    t0 = time.perf_counter()
+    res = asyncio.run(_replay_async(KlineStore(store_root), symbols, start_ms, end_ms, monitor_kwargs))
+    res.seconds = time.perf_counter() - t0
+    return res
+
+
+def replay(
+    store_root: str,
+    symbols: Optional[List[str]] = None,
+    *,
+    start_ms: int,
+    end_ms: Optional[int] = None,
+    workers: int = 1,
+    **monitor_kwargs: Any,
+) -> ReplayResult:
+    """回放 [start_ms, end_ms) 内的K线，返回按 (open_time, symbol) 排序的事件与吞吐统计。
+
+    workers > 1 时按交易对分片到多个进程（交易对之间状态独立）。
+    """
+    store = KlineStore(store_root)
+    syms = sorted(symbols) if symbols else store.symbols()
+    t0 = time.perf_counter()
+    total = ReplayResult()
+    workers = max(1, min(int(workers), len(syms) or 1))
+    if workers == 1:
+        total.merge(replay_symbols(store_root, syms, start_ms, end_ms, **monitor_kwargs))
+    else:
+        # 按K线数量轮流分配，使各进程负载接近
+        syms.sort(key=store.count, reverse=True)
+        chunks = [syms[i::workers] for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            futs = [ex.submit(replay_symbols, store_root, ch, start_ms, end_ms, **monitor_kwargs) for ch in chunks]
+            for f in futs:
+                total.merge(f.result())
+    total.seconds = time.perf_counter() - t0
+    total.events.sort(key=lambda ev: (ev.get("open_time", 0), ev.get("symbol", "")))
+    return total
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay stored 1m klines through SymbolMonitor")
+    parser.add_argument("--kline-store", type=str, required=True, help="KlineStore directory to replay from")
+    parser.add_argument("--start", type=str, required=True, help="Replay start (ms or ISO date/time, local)")
+    parser.add_argument("--end", type=str, default=None, help="Replay end, exclusive (default: end of stored data)")
+    parser.add_argument("--symbols", type=str, default=None, help="Comma-separated symbols (default: all in the store)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (default: CPU count)")
+    parser.add_argument("--confirm-candles", type=int, default=5)
+    parser.add_argument("--seed-limit", type=int, default=600)
+    parser.add_argument("--min-price", type=float, default=None)
+    parser.add_argument("--max-price", type=float, default=None)
+    parser.add_argument("--min-quote-usdt", type=float, default=None)
+    parser.add_argument("--cooldown-seconds", type=int, default=0)
+    parser.add_argument("--timeframes", type=str, default=None, help="Also detect crosses on these aggregated timeframes, e.g. 5m,15m,1h")
+    parser.add_argument("--strategies", type=str, default=None, help="Extra strategies run alongside the built-in rule, e.g. rsi_reversal,atr_breakout:mult=3")
+    parser.add_argument("--strategy-config", type=str, default=None, help="JSON file with strategy definitions (name/params/id)")
+    parser.add_argument("--out", type=str, default=None, help="Write events as JSON lines to this file")
+    args = parser.parse_args(argv)
+    try:
+        strategies = load_strategy_specs(args.strategies, args.strategy_config)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    start_ms = parse_time_ms(args.start)
+    assert start_ms is not None
+    start_ms = start_ms // MINUTE_MS * MINUTE_MS
+    res = replay(
+        args.kline_store,
+        [s.strip().upper() for s in args.symbols.split(",") if s.strip()] if args.symbols else None,
+        start_ms=start_ms,
+        end_ms=parse_time_ms(args.end),
+        workers=args.workers,
+        confirm_candles=args.confirm_candles,
+        seed_limit=args.seed_limit,
+        min_price=args.min_price,
+        max_price=args.max_price,
+        min_quote_usdt=args.min_quote_usdt,
+        cooldown_seconds=args.cooldown_seconds,
+        timeframes=parse_timeframes(args.timeframes) if args.timeframes else None,
+        strategies=strategies,
+    )
+    if args.out:
+        d = os.path.dirname(args.out)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            for ev in res.events:
+                f.write(json.dumps(ev, ensure_ascii=False) + "\n")
+    kinds: Dict[str, int] = {}
+    for ev in res.events:
+        tf, strat = ev.get("timeframe", "1m"), ev.get("strategy", BUILTIN_STRATEGY)
+        key = ":".join([*([tf] if tf != "1m" else []), *([strat] if strat != BUILTIN_STRATEGY else []), ev.get("kind", "?")])
+        kinds[key] = kinds.get(key, 0) + 1
+    print(
+        f"回放完成：{res.symbols} 个交易对，{res.candles} 根K线，事件 {len(res.events)} 个 {kinds}，"
+        f"耗时 {res.seconds:.1f}s，{res.candles_per_sec:,.0f} 根/秒"
+    )
+
+
+if __name__ == "__main__":
+    main()
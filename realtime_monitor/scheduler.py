@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from .binance_client import BinanceFuturesClient
+from .monitor import SymbolMonitor
+
+MINUTE_MS = 60_000
+
+
+class ServerClock:
+    """本地时钟相对交易所服务器时间的偏移估计。
+
+    取多次 /fapi/v1/time 中往返最短的一次：offset = serverTime - 往返中点。
+    """
+
+    def __init__(self, client: BinanceFuturesClient, *, samples: int = 3, resync_seconds: float = 1800.0):
+        self.client = client
+        self.samples = max(1, int(samples))
+        self.resync_seconds = resync_seconds
+        self.offset_ms = 0.0
+        self.rtt_ms: Optional[float] = None
+        self._synced_at: Optional[float] = None
+
+    async def sync(self) -> float:
+        best: Optional[tuple] = None
+        for _ in range(self.samples):
+            t0 = time.time() * 1000
+            try:
+                server = await self.client.server_time()
+            except Exception:
+                continue
+            t1 = time.time() * 1000
+            if best is None or t1 - t0 < best[0]:
+                best = (t1 - t0, server - (t0 + t1) / 2)
+        if best is not None:
+            self.rtt_ms, self.offset_ms = best
+            self._synced_at = time.monotonic()
+        return self.offset_ms
+
+    async def maybe_resync(self) -> None:
+        if self._synced_at is None or time.monotonic() - self._synced_at >= self.resync_seconds:
+            await self.sync()
+
+    def now_ms(self) -> float:
+        return time.time() * 1000 + self.offset_ms
+
+
+class MinuteScheduler:
+    """按交易所分钟边界调度K线更新，取代固定间隔轮询。
+
+    - 每分钟收盘后 delay_ms（服务器时间）触发一次，只请求尚未拿到该分钟K线的交易对；
+    - 拿到旧K线（交易所尚未滚动）的交易对每 retry_ms 重试，最多 max_retries 次；
+    - 同一分钟内已处理过的交易对不再发请求，REST 权重约为 20s 轮询的 1/3。
+    """
+
+    def __init__(
+        self,
+        monitor: SymbolMonitor,
+        clock: ServerClock,
+        *,
+        delay_ms: int = 1500,
+        retry_ms: int = 1000,
+        max_retries: int = 5,
+        log: Callable[[str], None] = print,
+    ):
+        self.monitor = monitor
+        self.log = log
+        self.clock = clock
+        self.delay_ms = int(delay_ms)
+        self.retry_ms = int(retry_ms)
+        self.max_retries = int(max_retries)
+        self.stats: Dict[str, float] = {
+            "rounds": 0,
+            "requests": 0,
+            "skipped": 0,
+            "retries": 0,
+            "stale": 0,
+            "last_round_ms": 0.0,
+        }
+
+    def target_minute(self, now_ms: Optional[float] = None) -> int:
+        """最近一根已收盘K线的 open_time。"""
+        now = self.clock.now_ms() if now_ms is None else now_ms
+        return int(now) // MINUTE_MS * MINUTE_MS - MINUTE_MS
+
+    def _pending(self, symbols: Iterable[str], target: int) -> List[str]:
+        out: List[str] = []
+        for s in symbols:
+            st = self.monitor.states.get(s)
+            if st is None or st.last_open_time is None or st.last_open_time < target:
+                out.append(s)
+        return out
+
+    async def sleep_until_next(self) -> int:
+        """睡到下一分钟收盘 + delay_ms，返回该分钟K线的 open_time。"""
+        now = self.clock.now_ms()
+        boundary = (int(now) // MINUTE_MS + 1) * MINUTE_MS
+        await asyncio.sleep(max(0.0, (boundary + self.delay_ms - now) / 1000.0))
+        return boundary - MINUTE_MS
+
+    async def run_minute(self, symbols: List[str], target: int) -> List[dict]:
+        """推进 symbols 到 target 分钟；返回产生的事件。"""
+        t0 = time.monotonic()
+        pending = self._pending(symbols, target)
+        self.stats["skipped"] += len(symbols) - len(pending)
+        out: List[dict] = []
+        for attempt in range(self.max_retries + 1):
+            if not pending:
+                break
+            if attempt:
+                self.stats["retries"] += len(pending)
+                await asyncio.sleep(self.retry_ms / 1000.0)
+            self.stats["requests"] += len(pending)
+            out.extend(await self.monitor.update_many(pending))
+            pending = self._pending(pending, target)
+        self.stats["stale"] += len(pending)
+        self.stats["rounds"] += 1
+        self.stats["last_round_ms"] = (time.monotonic() - t0) * 1000
+        return out
+
+    async def run(
+        self,
+        get_symbols: Callable[[], Iterable[str]],
+        on_events: Callable[[List[dict]], Awaitable[None]],
+    ) -> None:
+        await self.clock.sync()
+        while True:
+            target = await self.sleep_until_next()
+            try:
+                await self.clock.maybe_resync()
+                events = await self.run_minute(sorted(get_symbols()), target)
+            except Exception as e:
+                self.log(f"[sched] 本分钟更新失败: {e!r}")
+                continue
+            if events:
+                await on_events(events)
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Deque, Optional
+
+
+class RollingQuantiles:
+    """最近 N 个样本的滚动分位数（用于延迟等观测值的 p50/p99）。"""
+
+    def __init__(self, size: int = 1024):
+        self._buf: Deque[float] = deque(maxlen=max(1, int(size)))
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        self._buf.append(float(value))
+        self.count += 1
+
+    def __len__(self) -> int:
+        return len(self._buf)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self._buf:
+            return None
+        data = sorted(self._buf)
+        idx = min(len(data) - 1, max(0, int(round(q * (len(data) - 1)))))
+        return data[idx]
@@ -0,0 +1,415 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Type
+
+import numpy as np
+
+from .indicators import Indicator, create_indicator, indicator_key
+from .kline_store import KlineStore
+
+# 监控器内置的 1m EMA13/21 × EMA72/83 交叉 + 确认规则在事件中的策略名（保留，不可作为自定义策略 id）
+BUILTIN_STRATEGY = "ema_cross"
+
+
+@dataclass
+class StrategySpec:
+    """一条策略配置：注册名、参数（缺省取该策略的默认值）与事件中的策略 id（缺省自动生成）。"""
+
+    name: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    id: Optional[str] = None
+
+
+class Strategy:
+    """策略基类：声明所需指标（规格字符串），每根已收盘K线由引擎传入这些指标的本根/上一根数值。
+
+    on_candle 返回 None 或 {"kind", "direction", "message", ...}，其余公共字段由引擎补齐；
+    state 为该策略在该交易对上的私有状态（dict，可原地修改）。
+    """
+
+    name = ""
+    defaults: Dict[str, Any] = {}
+
+    def __init__(self, params: Optional[Dict[str, Any]] = None, sid: Optional[str] = None):
+        params = dict(params or {})
+        unknown = sorted(set(params) - set(self.defaults))
+        if unknown:
+            raise ValueError(f"策略 {self.name} 不支持参数 {', '.join(unknown)}（可选：{', '.join(self.defaults)}）")
+        self.params = {k: _coerce(self.name, k, d, params[k]) if k in params else d for k, d in self.defaults.items()}
+        overrides = [k for k in self.defaults if self.params[k] != self.defaults[k]]
+        self.id = sid or (
+            self.name + ":" + ",".join(f"{k}={_fmt(self.params[k])}" for k in overrides) if overrides else self.name
+        )
+        self.setup()
+
+    def setup(self) -> None:
+        """参数就绪后的初始化（如换算指标 key）。"""
+
+    def indicators(self) -> List[str]:
+        return []
+
+    def on_candle(
+        self,
+        symbol: str,
+        state: Dict[str, Any],
+        bar: tuple,
+        prev_bar: Optional[tuple],
+        cur: Dict[str, Optional[float]],
+        prev: Dict[str, Optional[float]],
+    ) -> Optional[dict]:
+        raise NotImplementedError
+
+
+def _coerce(name: str, key: str, default: Any, value: Any) -> Any:
+    """按默认值的类型转换参数（CLI 传入的都是字符串；列表用 / 分隔）。"""
+    try:
+        if isinstance(default, tuple):
+            items = value.split("/") if isinstance(value, str) else list(value)
+            out = tuple(int(v) for v in items)
+            if not out:
+                raise ValueError
+            return out
+        if isinstance(default, bool):
+            return str(value).lower() in ("1", "true", "yes", "on")
+        if isinstance(default, int):
+            return int(value)
+        if isinstance(default, float):
+            return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"策略 {name} 参数 {key}={value!r} 非法") from None
+    return value
+
+
+def _fmt(v: Any) -> str:
+    return "/".join(map(str, v)) if isinstance(v, tuple) else f"{v:g}" if isinstance(v, float) else str(v)
+
+
+STRATEGIES: Dict[str, Type[Strategy]] = {}
+
+
+def register_strategy(name: str) -> Callable[[Type[Strategy]], Type[Strategy]]:
+    """注册策略类；name 即 --strategies / 配置文件中使用的名字。"""
+    def deco(cls: Type[Strategy]) -> Type[Strategy]:
+        cls.name = name
+        STRATEGIES[name] = cls
+        return cls
+    return deco
+
+
+def create_strategy(spec: StrategySpec) -> Strategy:
+    cls = STRATEGIES.get(spec.name)
+    if cls is None:
+        raise ValueError(f"未知策略 {spec.name}（可选：{', '.join(sorted(STRATEGIES))}）")
+    return cls(spec.params, spec.id)
+
+
+@register_strategy("ema_cross")
+class EMACrossStrategy(Strategy):
+    """与内置规则相同的判断，周期可配：快线组全部上穿/下穿慢线组后观察 confirm 根，
+    期间跌破（上穿）/涨破（下穿）anchor 均线且收盘未站上 -> 提示，第 confirm 根收盘仍未破 -> 入场信号。
+    """
+
+    defaults = {"fast": (13, 21), "slow": (72, 83), "anchor": 21, "confirm": 5}
+
+    def setup(self) -> None:
+        if self.params["confirm"] < 1:
+            raise ValueError("策略 ema_cross 的 confirm 须 >= 1")
+        self._fast = [indicator_key(f"ema:{p}") for p in self.params["fast"]]
+        self._slow = [indicator_key(f"ema:{p}") for p in self.params["slow"]]
+        self._anchor = indicator_key(f"ema:{self.params['anchor']}")
+
+    def indicators(self) -> List[str]:
+        return [*self._fast, *self._slow, self._anchor]
+
+    def on_candle(self, symbol, state, bar, prev_bar, cur, prev):
+        keys = self.indicators()
+        if any(cur[k] is None or prev[k] is None for k in keys):
+            return None
+        pf, ps = [prev[k] for k in self._fast], [prev[k] for k in self._slow]
+        cf, cs = [cur[k] for k in self._fast], [cur[k] for k in self._slow]
+        if min(pf) <= max(ps) and min(cf) > max(cs):
+            state["watch"] = ["up", self.params["confirm"], False]
+        elif max(pf) >= min(ps) and max(cf) < min(cs):
+            state["watch"] = ["down", self.params["confirm"], False]
+        watch = state.get("watch")
+        if not watch:
+            return None
+        _, high, low, close = bar[1:5]
+        anchor = cur[self._anchor]
+        label = f"EMA{self.params['anchor']}"
+        tip = None
+        if watch[0] == "up" and low < anchor:
+            if close <= anchor:
+                tip = f"[{symbol}] 上穿后回调本根跌破{label}且收盘未站上{label} -> 提示"
+            watch[2] = True
+        elif watch[0] == "down" and high > anchor:
+            if close <= anchor:
+                tip = f"[{symbol}] 下穿后反弹本根涨破{label}但收盘未站上{label} -> 提示"
+            watch[2] = True
+        watch[1] -= 1
+        direction, done, broken = watch[0], watch[1] <= 0, watch[2]
+        if done:
+            state["watch"] = None
+        if tip:
+            return {"kind": "tip", "direction": direction, "message": tip}
+        if done and not broken:
+            n = self.params["confirm"]
+            return {
+                "kind": "signal",
+                "direction": direction,
+                "confirm_candles": n,
+                "message": f"[{symbol}] {direction.upper()} 交叉后第{n}根K线未{'跌破' if direction == 'up' else '涨破'} {label} -> 入场信号",
+            }
+        return None
+
+
+@register_strategy("rsi_reversal")
+class RSIReversalStrategy(Strategy):
+    """RSI 自超买区回落（收盘 RSI 由 >= upper 降到 < upper）-> 做空信号；自超卖区回升 -> 做多信号。"""
+
+    defaults = {"period": 14, "upper": 70.0, "lower": 30.0}
+
+    def setup(self) -> None:
+        self._rsi = indicator_key(f"rsi:{self.params['period']}")
+
+    def indicators(self) -> List[str]:
+        return [self._rsi]
+
+    def on_candle(self, symbol, state, bar, prev_bar, cur, prev):
+        v, pv = cur[self._rsi], prev[self._rsi]
+        if v is None or pv is None:
+            return None
+        upper, lower, p = self.params["upper"], self.params["lower"], self.params["period"]
+        if pv >= upper > v:
+            return {"kind": "signal", "direction": "down", "message": f"[{symbol}] DOWN RSI{p} 自超买区(≥{upper:g})回落至 {v:.1f} -> 入场信号"}
+        if pv <= lower < v:
+            return {"kind": "signal", "direction": "up", "message": f"[{symbol}] UP RSI{p} 自超卖区(≤{lower:g})回升至 {v:.1f} -> 入场信号"}
+        return None
+
+
+@register_strategy("atr_breakout")
+class ATRBreakoutStrategy(Strategy):
+    """本根收盘相对上一根收盘的变动超过 mult × ATR（取上一根的 ATR，不含本根）-> 突破提示。"""
+
+    defaults = {"period": 14, "mult": 2.0}
+
+    def setup(self) -> None:
+        self._atr = indicator_key(f"atr:{self.params['period']}")
+
+    def indicators(self) -> List[str]:
+        return [self._atr]
+
+    def on_candle(self, symbol, state, bar, prev_bar, cur, prev):
+        atr = prev[self._atr]
+        if atr is None or prev_bar is None or atr <= 0:
+            return None
+        move = bar[4] - prev_bar[4]
+        mult = self.params["mult"]
+        if abs(move) <= mult * atr:
+            return None
+        direction = "up" if move > 0 else "down"
+        return {
+            "kind": "tip",
+            "direction": direction,
+            "message": f"[{symbol}] {direction.upper()} 单根变动 {move / atr:+.1f}×ATR{self.params['period']}（阈值 {mult:g}）-> 提示",
+        }
+
+
+@register_strategy("vwap_cross")
+class VWAPCrossStrategy(Strategy):
+    """收盘价上穿/下穿 VWAP（period=0 为当日 VWAP，否则为最近 period 根的滚动 VWAP）-> 提示。"""
+
+    defaults = {"period": 0}
+
+    def setup(self) -> None:
+        p = self.params["period"]
+        self._vwap = indicator_key(f"vwap:{p}" if p > 0 else "vwap")
+
+    def indicators(self) -> List[str]:
+        return [self._vwap]
+
+    def on_candle(self, symbol, state, bar, prev_bar, cur, prev):
+        v, pv = cur[self._vwap], prev[self._vwap]
+        if v is None or pv is None or prev_bar is None:
+            return None
+        c, pc = bar[4], prev_bar[4]
+        if pc <= pv and c > v:
+            direction = "up"
+        elif pc >= pv and c < v:
+            direction = "down"
+        else:
+            return None
+        verb = "上穿" if direction == "up" else "下穿"
+        return {"kind": "tip", "direction": direction, "message": f"[{symbol}] 收盘{verb} VWAP {v:.6g} -> 提示"}
+
+
+def parse_strategies(spec: str) -> List[StrategySpec]:
+    """解析 "rsi_reversal,ema_cross:fast=9/21:slow=50/60" —— 逗号分隔策略，冒号分隔 key=value 参数；
+    额外的 id=xxx 指定事件中的策略 id。"""
+    out: List[StrategySpec] = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, *pairs = part.split(":")
+        params: Dict[str, Any] = {}
+        sid: Optional[str] = None
+        for pair in pairs:
+            k, sep, v = pair.partition("=")
+            if not sep or not k.strip():
+                raise ValueError(f"策略参数须为 key=value：{part}")
+            if k.strip() == "id":
+                sid = v.strip()
+            else:
+                params[k.strip()] = v.strip()
+        out.append(StrategySpec(name.strip().lower(), params, sid))
+    return out
+
+
+def load_strategy_config(path: str) -> List[StrategySpec]:
+    """读取 JSON 策略配置：[{"name": ..., "params": {...}, "id": ...}, ...]，或外层包一层 {"strategies": [...]}。"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("strategies") or []
+    out: List[StrategySpec] = []
+    for item in data:
+        if isinstance(item, str):
+            out.extend(parse_strategies(item))
+            continue
+        if not isinstance(item, dict) or "name" not in item:
+            raise ValueError(f"{path}: 每条策略须包含 name")
+        out.append(StrategySpec(str(item["name"]).lower(), dict(item.get("params") or {}), item.get("id")))
+    return out
+
+
+def load_strategy_specs(spec: Optional[str], config_path: Optional[str] = None) -> Optional[List[StrategySpec]]:
+    """合并配置文件与命令行中的策略（先文件后命令行），并按引擎的规则校验；都未配置时返回 None。"""
+    specs: List[StrategySpec] = []
+    if config_path:
+        specs.extend(load_strategy_config(config_path))
+    specs.extend(parse_strategies(spec or ""))
+    if not specs:
+        return None
+    StrategyEngine(specs)  # 未知策略/参数、id 重复时在启动前报错
+    return specs
+
+
+class _Book:
+    """单个交易对的指标实例、最近两根的指标数值、上一根K线与各策略状态。"""
+
+    __slots__ = ("indicators", "values", "prev", "bar", "states")
+
+    def __init__(self, indicators: List[Indicator], n_strategies: int):
+        self.indicators = indicators
+        self.values: Dict[str, Optional[float]] = {ind.key: None for ind in indicators}
+        self.prev = self.values
+        self.bar: Optional[tuple] = None
+        self.states: List[Dict[str, Any]] = [{} for _ in range(n_strategies)]
+
+
+class StrategyEngine:
+    """可插拔的指标 + 策略引擎，作为 SymbolMonitor 的可选组件，与内置 EMA 交叉规则并行运行。
+
+    - 启用的策略声明所需指标，引擎按规格去重：每个交易对每根收盘K线上同一指标只计算一次，由全部策略共享；
+    - seed 时用已取得的历史预热指标（本地K线仓库有更长历史时优先用仓库），不产生事件；
+      从检查点恢复、未经 seed 的交易对在首根K线时从仓库补建，无仓库时随实时K线预热；
+    - 事件带 strategy 字段（策略 id）与 indicators（该策略所用指标的本根数值），
+      经监控器同样的价格/成交额过滤与按 (交易对, 策略) 计的冷却。
+    """
+
+    def __init__(self, specs: Sequence[StrategySpec], *, store: Optional[KlineStore] = None):
+        self.strategies = [create_strategy(s) for s in specs]
+        seen: set[str] = set()
+        for s in self.strategies:
+            if s.id == BUILTIN_STRATEGY:
+                raise ValueError(f"策略 {s.id} 与内置的 1m 规则重复：请修改参数或指定 id")
+            if s.id in seen:
+                raise ValueError(f"策略 id 重复：{s.id}（可用 id=... 区分）")
+            seen.add(s.id)
+        self.keys: List[str] = list(dict.fromkeys(k for s in self.strategies for k in s.indicators()))
+        self._uses = [s.indicators() for s in self.strategies]
+        self.store = store
+        self._books: Dict[str, _Book] = {}
+        self.metrics: Dict[str, int] = {"candles": 0, "indicator_updates": 0, "events": 0}
+
+    def history_minutes(self) -> int:
+        """预热全部指标建议的K线根数。"""
+        return max((create_indicator(k).warmup for k in self.keys), default=0)
+
+    def _new_book(self) -> _Book:
+        return _Book([create_indicator(k) for k in self.keys], len(self.strategies))
+
+    def _step(self, book: _Book, k: tuple) -> None:
+        t, o, h, l, c = int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4])
+        qv = float(k[5]) if len(k) > 5 and k[5] is not None else 0.0
+        book.prev = book.values
+        book.values = {ind.key: ind.update(t, o, h, l, c, qv) for ind in book.indicators}
+        book.bar = (t, o, h, l, c, qv)
+
+    def seed(self, symbol: str, arr: np.ndarray) -> None:
+        """以该交易对的已收盘历史预热指标（SymbolMonitor 建立状态时调用）。"""
+        need = self.history_minutes()
+        if self.store is not None and 0 < len(arr) < need:
+            longer = np.array(self.store.tail(symbol, need))
+            if len(longer) > len(arr) and int(longer[-1, 0]) == int(arr[-1, 0]):
+                arr = longer
+        book = self._new_book()
+        for row in np.asarray(arr, dtype=np.float64).tolist():
+            self._step(book, row)
+        self._books[symbol] = book
+
+    def drop(self, symbol: str) -> None:
+        self._books.pop(symbol, None)
+
+    def on_kline(self, symbol: str, k: tuple) -> List[dict]:
+        """推进一根已收盘K线：先更新共享指标，再依次运行各策略，返回（未过滤的）事件。"""
+        book = self._books.get(symbol)
+        if book is None:
+            hist = np.array(self.store.tail(symbol, self.history_minutes() + 1)) if self.store is not None else np.empty((0, 6))
+            if len(hist):
+                self.seed(symbol, hist[hist[:, 0] < int(k[0])])
+                book = self._books[symbol]
+            else:
+                book = self._books[symbol] = self._new_book()
+        prev_bar = book.bar
+        self._step(book, k)
+        self.metrics["candles"] += 1
+        self.metrics["indicator_updates"] += len(book.indicators)
+        cur, prev, bar = book.values, book.prev, book.bar
+        out: List[dict] = []
+        for strat, state, uses in zip(self.strategies, book.states, self._uses):
+            ev = strat.on_candle(symbol, state, bar, prev_bar, cur, prev)
+            if not ev:
+                continue
+            event = {
+                "symbol": symbol,
+                "strategy": strat.id,
+                "open_time": bar[0],
+                "price": bar[4],
+                "high": bar[2],
+                "low": bar[3],
+                "quote_volume": bar[5],
+                "indicators": {key: cur[key] for key in uses},
+            }
+            event.update(ev)
+            out.append(event)
+        self.metrics["events"] += len(out)
+        return out
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "strategies": len(self.strategies),
+            "indicators": len(self.keys),
+            "symbols": len(self._books),
+            **self.metrics,
+        }
+
+
+def build_engine(specs: Optional[Sequence[StrategySpec]], *, store: Optional[KlineStore] = None) -> Optional[StrategyEngine]:
+    """按策略配置构造引擎；未配置策略时返回 None。"""
+    if not specs:
+        return None
+    return StrategyEngine(specs, store=store)
@@ -1,29 +1,123 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Dict, List, Tuple
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from .binance_client import BinanceFuturesClient, fetch_usdt_perp_symbols, fetch_midnight_close
-from .time_utils import local_midnight_utc_ms
+from .kline_store import KlineStore, sync_tail
+from .time_utils import local_midnight_utc_ms, now_ms_utc
 
 
-async def build_midnight_baseline(client: BinanceFuturesClient) -> Tuple[List[str], Dict[str, float]]:
+async def build_midnight_baseline(
+    client: BinanceFuturesClient,
+    *,
+    store: Optional[KlineStore] = None,
+    history_ms: int = 0,
+) -> Tuple[List[str], Dict[str, float]]:
+    """返回 (全部USDT永续, {symbol: 本地0点1m收盘价})。
+
+    提供 store 时，先把每个交易对的本地K线补齐到当前（至少覆盖 0 点与最近 history_ms），
+    基准价直接从本地读取；重启时只需拉取缺失的尾部。
+    """
     symbols = await fetch_usdt_perp_symbols(client)
     base_ts = local_midnight_utc_ms()
     baselines: Dict[str, float] = {}
+    since_ms = min(base_ts, now_ms_utc() - int(history_ms))
 
-    sem = asyncio.Semaphore(20)
-
+    # 并发与权重由 client.limiter 统一调度
     async def _one(sym: str):
-        async with sem:
+        if store is not None:
+            await sync_tail(client, store, sym, since_ms=since_ms)
+            v = store.close_at(sym, base_ts)
+        else:
             v = await fetch_midnight_close(client, sym, base_ts)
-            if v is not None and v > 0:
-                baselines[sym] = v
+        if v is not None and v > 0:
+            baselines[sym] = v
 
     await asyncio.gather(*[_one(s) for s in symbols])
     return symbols, baselines
 
 
+class MidnightRollover:
+    """本地0点跨日时自动切换基准，无需重启、无额外 REST 突发。
+
+    - 跨日后，新基准取新0点那根1m K线的收盘价（与 build_midnight_baseline 一致）；
+    - 数据来源为已流经 SymbolMonitor 的K线（通过 observe 回调）及 WS 缓存；
+    - 收齐全部交易对（或超过宽限期）后一次性返回新的基准字典，调用方整体替换；
+    - 宽限期后仍缺失的交易对以低并发 REST 补齐，补齐前继续沿用旧基准。
+    """
+
+    def __init__(
+        self,
+        client: BinanceFuturesClient,
+        symbols: List[str],
+        base_ts: int,
+        *,
+        ws_cache: Optional[Dict[str, tuple]] = None,
+        grace_ms: int = 120_000,
+        fill_concurrency: int = 2,
+    ):
+        self.client = client
+        self.symbols = symbols
+        self.base_ts = base_ts
+        self.ws_cache = ws_cache
+        self.grace_ms = grace_ms
+        self.fill_concurrency = max(1, int(fill_concurrency))
+        self._pending_ts: Optional[int] = None
+        self._collected: Dict[str, float] = {}
+        self._fill_task: Optional[asyncio.Task] = None
+
+    def observe(self, symbol: str, k: tuple) -> None:
+        # 作为 SymbolMonitor 的K线回调：记录新0点那根的收盘价
+        if self._pending_ts is not None and int(k[0]) == self._pending_ts:
+            self._collected[symbol] = float(k[4])
+
+    async def _fill_missing(self, ts: int, missing: List[str]) -> None:
+        sem = asyncio.Semaphore(self.fill_concurrency)
+
+        async def _one(sym: str):
+            async with sem:
+                try:
+                    v = await fetch_midnight_close(self.client, sym, ts)
+                except Exception:
+                    return
+                if v is not None and v > 0:
+                    self._collected.setdefault(sym, v)
+
+        await asyncio.gather(*[_one(s) for s in missing])
+
+    def poll(self, now_ms: Optional[int] = None) -> Optional[Dict[str, float]]:
+        """每轮调用；跨日完成时返回新的基准字典，否则返回 None。"""
+        new_ts = local_midnight_utc_ms()
+        if self._pending_ts is None:
+            if new_ts == self.base_ts:
+                return None
+            self._pending_ts = new_ts
+            self._collected = {}
+        ts = self._pending_ts
+        if self.ws_cache:
+            for sym, k in list(self.ws_cache.items()):
+                if int(k[0]) == ts:
+                    self._collected[sym] = float(k[4])
+
+        now_ms = now_ms_utc() if now_ms is None else int(now_ms)
+        missing = [s for s in self.symbols if s not in self._collected]
+        if missing and now_ms < ts + 60_000 + self.grace_ms:
+            return None
+        if missing and self._fill_task is None:
+            self._fill_task = asyncio.create_task(self._fill_missing(ts, missing))
+        if self._fill_task is not None and not self._fill_task.done():
+            return None
+
+        new_baselines = {s: v for s, v in self._collected.items() if v > 0}
+        self.base_ts = ts
+        self._pending_ts = None
+        self._collected = {}
+        self._fill_task = None
+        return new_baselines
+
+
 def rank_top(symbols: List[str], baselines: Dict[str, float], prices: Dict[str, float], topn: int = 50) -> Tuple[List[Tuple[str, float, float]], List[Tuple[str, float, float]]]:
     rows: List[Tuple[str, float, float]] = []  # (symbol, price, pct)
     for s in symbols:
@@ -37,6 +131,85 @@ def rank_top(symbols: List[str], baselines: Dict[str, float], prices: Dict[str,
     top_lose = sorted(rows, key=lambda x: x[2])[:topn]
     return top_gain, top_lose
 
+class RankBoard:
+    """相对0点基准涨跌幅的增量排名（有序列表 + 二分），取代每轮两次全量排序。
+
+    - 有序列表保存 (pct, symbol)，价格变化时二分删除旧键、插入新键，未变化的交易对不动；
+    - top(n)/bottom(n) 直接切片，返回与 rank_top 相同的 (symbol, price, pct) 行；
+    - 单次变化的交易对过多时（超过 1/4）整体重排更快，自动切换。
+    """
+
+    def __init__(self, baselines: Optional[Dict[str, float]] = None):
+        self._baselines: Dict[str, float] = {}
+        self._prices: Dict[str, float] = {}
+        self._pct: Dict[str, float] = {}
+        self._order: List[Tuple[float, str]] = []
+        self.updates = 0
+        if baselines:
+            self.set_baselines(baselines)
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def set_baselines(self, baselines: Dict[str, float]) -> None:
+        """替换基准（如跨日），按已有价格整体重排。"""
+        self._baselines = {s: b for s, b in baselines.items() if b}
+        prices, self._prices = self._prices, {}
+        self._pct.clear()
+        self._order.clear()
+        self.update_prices(prices)
+
+    def _pct_of(self, symbol: str, price: float) -> Optional[float]:
+        b = self._baselines.get(symbol)
+        if not b or not price:
+            return None
+        return (price - b) / b * 100.0
+
+    def update(self, symbol: str, price: float) -> bool:
+        """更新单个交易对价格；排名位置有变化时返回 True。"""
+        if self._prices.get(symbol) == price:
+            return False
+        pct = self._pct_of(symbol, price)
+        if pct is None:
+            return False
+        self._prices[symbol] = price
+        old = self._pct.get(symbol)
+        if old is not None:
+            i = bisect_left(self._order, (old, symbol))
+            del self._order[i]
+        self._pct[symbol] = pct
+        insort(self._order, (pct, symbol))
+        self.updates += 1
+        return True
+
+    def update_prices(self, prices: Dict[str, float], symbols: Optional[Iterable[str]] = None) -> int:
+        """批量更新（symbols 指定时只看这些交易对），返回发生变化的数量。"""
+        changed = [
+            (s, p) for s in (symbols if symbols is not None else prices)
+            if (p := prices.get(s)) is not None and self._prices.get(s) != p and s in self._baselines
+        ]
+        if len(changed) * 4 > max(len(self._order), 1):
+            for s, p in changed:
+                pct = self._pct_of(s, p)
+                if pct is None:
+                    continue
+                self._prices[s] = p
+                self._pct[s] = pct
+            self._order = sorted((pct, s) for s, pct in self._pct.items())
+            self.updates += len(changed)
+            return len(changed)
+        return sum(1 for s, p in changed if self.update(s, p))
+
+    def _row(self, pct: float, symbol: str) -> Tuple[str, float, float]:
+        return symbol, self._prices[symbol], pct
+
+    def top(self, n: int = 50) -> List[Tuple[str, float, float]]:
+        return [self._row(p, s) for p, s in reversed(self._order[-n:])] if n > 0 else []
+
+    def bottom(self, n: int = 50) -> List[Tuple[str, float, float]]:
+        return [self._row(p, s) for p, s in self._order[:n]]
+
+
 def secondary_sort_by_delta(
     rows: List[Tuple[str, float, float]],
     delta_map: Dict[str, float],
@@ -32,3 +32,12 @@ def to_utc_ms(dt: datetime) -> int:
 
 def now_ms_utc() -> int:
     return int(datetime.now(timezone.utc).timestamp() * 1000)
+
+
+def parse_time_ms(s: str | None) -> int | None:
+    """毫秒时间戳或 ISO 日期/时间（无时区按本地时间）转 UTC 毫秒。"""
+    if not s:
+        return None
+    if s.isdigit():
+        return int(s)
+    return int(datetime.fromisoformat(s).astimezone().timestamp() * 1000)
@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .ema_vec import PERIODS
+from .kline_store import KlineStore
+from .monitor import SymbolMonitor
+from .strategies import StrategySpec, build_engine
+
+MINUTE_MS = 60_000
+
+# 支持由 1m 聚合的周期（分钟数）
+TIMEFRAME_MINUTES: Dict[str, int] = {"5m": 5, "15m": 15, "30m": 30, "1h": 60, "2h": 120, "4h": 240}
+
+
+def parse_timeframes(spec: str) -> List[str]:
+    """解析 "5m,15m,1h"，忽略重复与 1m，按周期长短排序；不支持的周期抛 ValueError。"""
+    out: List[str] = []
+    for part in (spec or "").split(","):
+        tf = part.strip().lower()
+        if not tf or tf == "1m" or tf in out:
+            continue
+        if tf not in TIMEFRAME_MINUTES:
+            raise ValueError(f"不支持的周期 {tf}（可选：{', '.join(TIMEFRAME_MINUTES)}）")
+        out.append(tf)
+    return sorted(out, key=TIMEFRAME_MINUTES.__getitem__)
+
+
+def aggregate_bars(arr: np.ndarray, minutes: int) -> tuple:
+    """把按时间升序的 1m K线 (n, 6) 聚合为 minutes 周期的K线。
+
+    返回 (closed, forming)：closed 为完整的已收盘K线 (m, 6)，首根若不是从周期起点开始则丢弃，
+    中间缺了分钟的K线同样丢弃；forming 为末尾尚未收齐、且至今不缺分钟的那根（列表），没有则为 None。
+    """
+    span = minutes * MINUTE_MS
+    if len(arr) == 0:
+        return np.empty((0, 6)), None
+    t = arr[:, 0].astype(np.int64)
+    bucket = t - t % span
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(arr)] - 1
+    bars = np.empty((len(starts), 6), dtype=np.float64)
+    bars[:, 0] = bucket[starts]
+    bars[:, 1] = arr[starts, 1]
+    bars[:, 2] = np.maximum.reduceat(arr[:, 2], starts)
+    bars[:, 3] = np.minimum.reduceat(arr[:, 3], starts)
+    bars[:, 4] = arr[ends, 4]
+    bars[:, 5] = np.add.reduceat(arr[:, 5], starts)
+    # openTime 严格递增，桶内根数等于从周期起点到末根的分钟数即不缺分钟
+    contiguous = (t[starts] == bucket[starts]) & ((t[ends] - bucket[starts]) // MINUTE_MS == ends - starts)
+    complete = contiguous & (t[ends] == bucket[ends] + span - MINUTE_MS)
+    forming = None
+    if not complete[-1] and contiguous[-1]:
+        forming = bars[-1].tolist()
+    return bars[complete], forming
+
+
+class TimeframeAggregator:
+    """把已收盘的 1m K线在内存中滚动聚合为 5m/15m/1h 等高周期K线，并按周期独立做 EMA 交叉 + 确认判断。
+
+    - 作为 SymbolMonitor 的可选组件：每根 1m 收盘后调用 on_kline，收齐一根高周期K线即推进该周期；
+    - 每个周期各有一个 SymbolMonitor（只用其 EMASet/CrossWatch 状态与过滤逻辑，不发请求），
+      确认根数、价格/成交额过滤与冷却沿用 1m 的配置，成交额按该周期K线累计；
+    - seed 时用已取得的 1m 历史（本地K线仓库有更长历史时优先用仓库）聚合出高周期K线；
+      不足 83 根的周期先累计，收齐后再开始判断，全程不额外请求交易所；
+    - 交易对只是暂时退出跟踪（榜单轮换）时保留其状态，重新入选时用 seed 的 1m 历史补推其间的K线，
+      不必重新预热；仅在补推覆盖不到缺口时才重建；
+    - 配置了策略时每个周期各有一个策略引擎，指标按该周期K线计算；
+    - 产生的事件带 timeframe 字段，消息前加 [5m] 等标记。
+    """
+
+    def __init__(
+        self,
+        timeframes: List[str],
+        *,
+        confirm_candles: int = 5,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_quote_usdt: Optional[float] = None,
+        cooldown_seconds: int = 0,
+        store: Optional[KlineStore] = None,
+        strategies: Optional[List[StrategySpec]] = None,
+    ):
+        self.timeframes = [tf for tf in timeframes if tf in TIMEFRAME_MINUTES]
+        self.store = store
+        self.monitors: Dict[str, SymbolMonitor] = {}
+        for tf in self.timeframes:
+            m = SymbolMonitor(
+                None,  # type: ignore[arg-type]
+                confirm_candles=confirm_candles,
+                min_price=min_price,
+                max_price=max_price,
+                min_quote_usdt=min_quote_usdt,
+                cooldown_seconds=cooldown_seconds,
+                strategies=build_engine(strategies),
+            )
+            m.timeframe = tf
+            self.monitors[tf] = m
+        # 正在形成的K线 [openTime, open, high, low, close, quoteVolume]
+        self._forming: Dict[str, Dict[str, List[float]]] = {tf: {} for tf in self.timeframes}
+        # 尚不足 83 根、未能 seed 的周期先累计已收盘K线
+        self._warmup: Dict[str, Dict[str, List[List[float]]]] = {tf: {} for tf in self.timeframes}
+        self._known: set[str] = set()
+        # 每个交易对最后推进的 1m openTime，重新 seed 时据此补推
+        self._last_minute: Dict[str, int] = {}
+
+    def history_minutes(self) -> int:
+        """seed 最长周期所需的 1m 根数（含一根用于对齐的余量）。"""
+        if not self.timeframes:
+            return 0
+        return (max(PERIODS) + 1) * max(TIMEFRAME_MINUTES[tf] for tf in self.timeframes)
+
+    def seed(self, symbol: str, arr: np.ndarray) -> None:
+        """以该交易对的 1m 已收盘历史重建各周期状态（SymbolMonitor 建立状态时调用）。"""
+        if self._resume(symbol, arr):
+            return
+        self.drop(symbol)
+        self._known.add(symbol)
+        need = self.history_minutes()
+        if self.store is not None and len(arr) < need and len(arr):
+            # 仓库已由 seed 同步到最新，且只读本地文件
+            longer = np.array(self.store.tail(symbol, need))
+            if len(longer) > len(arr) and int(longer[-1, 0]) == int(arr[-1, 0]):
+                arr = longer
+        for tf in self.timeframes:
+            closed, forming = aggregate_bars(np.asarray(arr, dtype=np.float64), TIMEFRAME_MINUTES[tf])
+            if len(closed) >= max(PERIODS):
+                self.monitors[tf]._install_states([symbol], [closed])
+            elif len(closed):
+                self._warmup[tf][symbol] = closed.tolist()
+            if forming is not None:
+                self._forming[tf][symbol] = forming
+        if len(arr):
+            self._last_minute[symbol] = int(arr[-1, 0])
+
+    def _resume(self, symbol: str, arr: np.ndarray) -> bool:
+        """已保留状态且 arr 与上次推进的分钟首尾相接时，补推其间的 1m K线并返回 True。
+
+        补推产生的事件丢弃：与 1m seed 一样，不对历史K线报警。
+        """
+        last = self._last_minute.get(symbol)
+        if last is None or not len(arr) or int(arr[0, 0]) > last + MINUTE_MS:
+            return False
+        for row in arr[arr[:, 0] > last]:
+            self.on_kline(symbol, (int(row[0]), float(row[1]), float(row[2]), float(row[3]), float(row[4]), float(row[5])))
+        return True
+
+    def drop(self, symbol: str) -> None:
+        self._known.discard(symbol)
+        self._last_minute.pop(symbol, None)
+        for tf in self.timeframes:
+            self.monitors[tf].states.pop(symbol, None)
+            self._forming[tf].pop(symbol, None)
+            self._warmup[tf].pop(symbol, None)
+
+    def on_kline(self, symbol: str, k: tuple) -> List[dict]:
+        """推进一根已收盘 1m K线，返回由它收齐的高周期K线产生的事件。"""
+        if symbol not in self._known and self.store is not None:
+            # 从检查点恢复的交易对没有经过 seed：用仓库中此前的历史补建
+            hist = np.array(self.store.tail(symbol, self.history_minutes() + 1))
+            if len(hist):
+                self.seed(symbol, hist[hist[:, 0] < int(k[0])])
+        self._known.add(symbol)
+        t, o, h, l, c = int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4])
+        prev = self._last_minute.get(symbol)
+        self._last_minute[symbol] = t
+        # 与上一根 1m 不相接：正在形成的K线缺了分钟
+        gap = prev is not None and t != prev + MINUTE_MS
+        qv = float(k[5]) if len(k) > 5 and k[5] is not None else 0.0
+        out: List[dict] = []
+        for tf in self.timeframes:
+            span = TIMEFRAME_MINUTES[tf] * MINUTE_MS
+            start = t - t % span
+            forming = self._forming[tf]
+            bar = forming.get(symbol)
+            if bar is not None and (bar[0] != start or gap):
+                # 缺了分钟（停机/缺口未补齐）：不完整的K线不参与判断
+                bar = None
+            if bar is None:
+                if t != start:
+                    # 从周期中途开始的K线同样丢弃，等下一个周期起点
+                    forming.pop(symbol, None)
+                    continue
+                bar = [start, o, h, l, c, qv]
+            else:
+                bar[2] = max(bar[2], h)
+                bar[3] = min(bar[3], l)
+                bar[4] = c
+                bar[5] += qv
+            if t + MINUTE_MS == start + span:
+                forming.pop(symbol, None)
+                out.extend(self._on_bar(tf, symbol, bar))
+            else:
+                forming[symbol] = bar
+        return out
+
+    def _on_bar(self, tf: str, symbol: str, bar: List[float]) -> List[dict]:
+        mon = self.monitors[tf]
+        st = mon.states.get(symbol)
+        if st is None:
+            warm = self._warmup[tf].setdefault(symbol, [])
+            warm.append(bar)
+            if len(warm) >= max(PERIODS):
+                mon._install_states([symbol], [np.array(warm, dtype=np.float64)])
+                del self._warmup[tf][symbol]
+            return []
+        events = mon._advance(st, (int(bar[0]), bar[1], bar[2], bar[3], bar[4], bar[5]))
+        for ev in events:
+            ev["message"] = f"[{tf}] {ev.get('message', '')}"
+        return events
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            tf: {"ready": len(self.monitors[tf].states), "warming": len(self._warmup[tf])}
+            for tf in self.timeframes
+        }
+
+
+def seed_shortfall(timeframes: Optional[List[str]], seed_limit: int) -> Dict[str, int]:
+    """seed_limit 根 1m 历史不足以直接 seed 的周期 -> 所需 1m 根数。"""
+    out: Dict[str, int] = {}
+    for tf in timeframes or []:
+        need = (max(PERIODS) + 1) * TIMEFRAME_MINUTES[tf]
+        if need > seed_limit:
+            out[tf] = need
+    return out
+
+
+# 高周期判断沿用的 1m 监控参数
+_SHARED_KWARGS = ("confirm_candles", "min_price", "max_price", "min_quote_usdt", "cooldown_seconds")
+
+
+def build_aggregator(
+    timeframes: Optional[List[str]],
+    monitor_kwargs: Dict[str, object],
+    *,
+    store: Optional[KlineStore] = None,
+    strategies: Optional[List[StrategySpec]] = None,
+) -> Optional[TimeframeAggregator]:
+    """按 SymbolMonitor 的参数构造聚合器；未指定周期时返回 None。"""
+    if not timeframes:
+        return None
+    shared = {k: monitor_kwargs[k] for k in _SHARED_KWARGS if k in monitor_kwargs}
+    return TimeframeAggregator(list(timeframes), store=store, strategies=strategies, **shared)  # type: ignore[arg-type]
@@ -2,70 +2,346 @@ from __future__ import annotations
 
 import asyncio
 import json
-from typing import Dict, List, Tuple
+import os
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
 import websockets
 
-WS_ENDPOINT = "wss://fstream.binance.com/stream?streams="
+# 可通过 BINANCE_WS_URL 指向其他服务（例如本地模拟器 ws://127.0.0.1:8081）
+WS_BASE_URL = os.getenv("BINANCE_WS_URL", "wss://fstream.binance.com").rstrip("/")
+WS_ENDPOINT = WS_BASE_URL + "/stream?streams="
+
+# 单连接订阅的流数量上限（交易所限制为 1024，这里保守取值，同时控制 URL 长度）
+MAX_STREAMS_PER_CONN = 200
+# 交易所限制每连接每秒最多 10 条入站控制消息
+_CONTROL_INTERVAL = 0.15
+_PARAMS_PER_MESSAGE = 100
 
 # 缓存类型：symbol -> (open_time_ms, open, high, low, close, quote_volume)
 WsCache = Dict[str, Tuple[int, float, float, float, float, float]]
 
 
+def _stream_name(symbol: str) -> str:
+    return f"{symbol.lower()}@kline_1m"
+
+
 def _build_streams(symbols: List[str]) -> str:
     # e.g. btcusdt@kline_1m/ethusdt@kline_1m
-    parts = [f"{s.lower()}@kline_1m" for s in symbols]
+    parts = [_stream_name(s) for s in symbols]
     return WS_ENDPOINT + "/".join(parts)
 
 
+def parse_kline_message(msg) -> Optional[Tuple[str, Tuple[int, float, float, float, float, float], int]]:
+    """解析组合流中的 kline 消息；仅返回已收盘K线 (symbol, kline, event_time_ms)。"""
+    data = json.loads(msg).get("data")
+    if not data:
+        return None  # SUBSCRIBE/UNSUBSCRIBE 的应答等
+    k = data.get("k")
+    if not k or not k.get("x"):
+        # 未收盘的K线，不处理
+        return None
+    sym = k.get("s")
+    if not sym:
+        return None
+    kline = (
+        int(k.get("t")),
+        float(k.get("o")),
+        float(k.get("h")),
+        float(k.get("l")),
+        float(k.get("c")),
+        float(k.get("q", 0.0)),
+    )
+    return sym, kline, int(data.get("E") or 0)
+
+
+class _Shard:
+    """一条 WS 连接及其负责的交易对子集，独立重连。"""
+
+    def __init__(self, idx: int, feed: "BinanceKlineWS"):
+        self.idx = idx
+        self.feed = feed
+        self.symbols: Set[str] = set()
+        self._ops: asyncio.Queue = asyncio.Queue()
+        self._changed = asyncio.Event()
+        self._ws = None
+        self._msg_id = 0
+        self.task: asyncio.Task | None = None
+        # 统计
+        self.connected = False
+        self.messages = 0
+        self.reconnects = 0
+        self.lag_ms: Optional[float] = None
+        # 每个读取方（控制台状态行、/metrics 抓取...）各自的速率起点，互不重置
+        self._created = time.monotonic()
+        self._rate_marks: Dict[str, Tuple[float, int]] = {}
+
+    def subscribe(self, symbols: List[str]) -> None:
+        self.symbols.update(symbols)
+        self._ops.put_nowait(("SUBSCRIBE", symbols))
+        self._changed.set()
+
+    def unsubscribe(self, symbols: List[str]) -> None:
+        self.symbols.difference_update(symbols)
+        self._ops.put_nowait(("UNSUBSCRIBE", symbols))
+
+    async def _control(self, ws) -> None:
+        # 连接存续期间，将订阅变更以 SUBSCRIBE/UNSUBSCRIBE 消息发出（限速）
+        while True:
+            method, symbols = await self._ops.get()
+            for i in range(0, len(symbols), _PARAMS_PER_MESSAGE):
+                self._msg_id += 1
+                params = [_stream_name(s) for s in symbols[i : i + _PARAMS_PER_MESSAGE]]
+                await ws.send(json.dumps({"method": method, "params": params, "id": self._msg_id}))
+                await asyncio.sleep(_CONTROL_INTERVAL)
+
+    async def run(self) -> None:
+        stop = self.feed._stop
+        backoff = 1.0
+        while not stop.is_set():
+            if not self.symbols:
+                self._changed.clear()
+                await self._changed.wait()
+                continue
+            # 重连时 URL 直接携带当前完整订阅集，之前排队的变更已包含在内
+            url = _build_streams(sorted(self.symbols))
+            while not self._ops.empty():
+                self._ops.get_nowait()
+            try:
+                async with websockets.connect(url, ping_interval=20, ping_timeout=20) as ws:
+                    self._ws = ws
+                    self.connected = True
+                    backoff = 1.0
+                    ctl = asyncio.create_task(self._control(ws))
+                    try:
+                        async for msg in ws:
+                            if stop.is_set():
+                                break
+                            self.messages += 1
+                            try:
+                                parsed = parse_kline_message(msg)
+                            except Exception:
+                                # 忽略单条解析错误
+                                continue
+                            if parsed is None:
+                                continue
+                            sym, kline, event_ms = parsed
+                            if sym not in self.feed._owner:
+                                continue  # 已退订、退订应答前仍在途的消息
+                            self.feed._cache[sym] = kline
+                            if self.feed._queue is not None:
+                                self.feed._queue.put_nowait((sym, kline, event_ms))
+                            if event_ms:
+                                lag = time.time() * 1000 - event_ms
+                                self.lag_ms = lag if self.lag_ms is None else self.lag_ms * 0.9 + lag * 0.1
+                    finally:
+                        ctl.cancel()
+            except Exception:
+                pass
+            finally:
+                self._ws = None
+                self.connected = False
+            if stop.is_set():
+                break
+            # 自动重连，指数退避至 30s 最大
+            self.reconnects += 1
+            await asyncio.sleep(backoff)
+            backoff = min(30.0, backoff * 2.0)
+
+    async def close(self) -> None:
+        ws = self._ws
+        if ws is not None:
+            try:
+                await ws.close()
+            except Exception:
+                pass
+
+    def stats(self, reader: str = "") -> Dict[str, object]:
+        now = time.monotonic()
+        t0, n0 = self._rate_marks.get(reader, (self._created, 0))
+        rate = (self.messages - n0) / (now - t0) if now > t0 else 0.0
+        self._rate_marks[reader] = (now, self.messages)
+        return {
+            "shard": self.idx,
+            "streams": len(self.symbols),
+            "connected": self.connected,
+            "messages": self.messages,
+            "msg_rate": rate,
+            "lag_ms": self.lag_ms,
+            "reconnects": self.reconnects,
+        }
+
+
 class BinanceKlineWS:
-    def __init__(self, symbols: List[str], cache: WsCache):
-        self._symbols = symbols
+    """1m kline 组合流，按 shard_size 将交易对分片到多条连接。
+
+    - 每个分片独立连接、独立重连，单个连接异常不影响其他分片；
+    - set_symbols() 根据差集向对应分片发送 SUBSCRIBE/UNSUBSCRIBE，不重建连接，退订的交易对同时移出缓存；
+    - stats() 返回每个分片的消息速率、事件延迟与重连次数；
+    - 提供 queue 时，每根已收盘K线同时以 (symbol, kline, event_time_ms) 推入队列，供事件驱动消费。
+    """
+
+    def __init__(
+        self,
+        symbols: List[str],
+        cache: WsCache,
+        *,
+        shard_size: int = MAX_STREAMS_PER_CONN,
+        queue: Optional[asyncio.Queue] = None,
+    ):
         self._cache = cache
+        self._queue = queue
+        self._shard_size = max(1, min(int(shard_size), 1024))
+        self._shards: List[_Shard] = []
+        self._owner: Dict[str, _Shard] = {}
         self._task: asyncio.Task | None = None
         self._stop = asyncio.Event()
+        self.set_symbols(symbols)
+
+    @property
+    def symbols(self) -> List[str]:
+        return sorted(self._owner)
+
+    def set_symbols(self, symbols: List[str]) -> None:
+        wanted = set(symbols)
+        removed = [s for s in self._owner if s not in wanted]
+        by_shard: Dict[int, List[str]] = {}
+        for s in removed:
+            by_shard.setdefault(self._owner.pop(s).idx, []).append(s)
+            self._cache.pop(s, None)
+        for idx, syms in by_shard.items():
+            self._shards[idx].unsubscribe(syms)
+
+        added = sorted(s for s in wanted if s not in self._owner)
+        pending: Dict[int, List[str]] = {}
+        for s in added:
+            shard = next((sh for sh in self._shards if len(sh.symbols) + len(pending.get(sh.idx, [])) < self._shard_size), None)
+            if shard is None:
+                shard = _Shard(len(self._shards), self)
+                self._shards.append(shard)
+                if self._task is not None:
+                    shard.task = asyncio.create_task(shard.run())
+            pending.setdefault(shard.idx, []).append(s)
+            self._owner[s] = shard
+        for idx, syms in pending.items():
+            self._shards[idx].subscribe(syms)
 
     async def start(self):
-        url = _build_streams(self._symbols)
+        for sh in self._shards:
+            if sh.task is None:
+                sh.task = asyncio.create_task(sh.run())
+        await self._stop.wait()
+
+    async def run_in_background(self):
+        self._task = asyncio.create_task(self.start())
+
+    def stats(self, reader: str = "") -> List[Dict[str, object]]:
+        """各分片统计；msg_rate 为该 reader 上次读取以来的速率（不同读取方传入不同 reader）。"""
+        return [sh.stats(reader) for sh in self._shards]
+
+    async def stop(self):
+        self._stop.set()
+        for sh in self._shards:
+            sh._changed.set()
+            await sh.close()
+        tasks = [t for t in [self._task, *(sh.task for sh in self._shards)] if t is not None]
+        if tasks:
+            try:
+                await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), timeout=5)
+            except Exception:
+                pass
+
+
+# 全市场精简 ticker（每秒推送一次有变化的交易对）
+TICKER_STREAM = "!miniTicker@arr"
+
+
+class BinanceTickerWS:
+    """全市场 mini-ticker 流，维护 symbol -> 最新价 的内存映射。
+
+    - prices 原地更新，可直接作为 rank_top 的价格来源；
+    - 流只推送最近一秒有变化的交易对，冷门交易对可能很久不出现：调用方需先用一次 REST 全量价格 seed()，
+      此前 is_fresh() 恒为 False；
+    - is_fresh() 判断流是否仍在更新，过期时调用方应回退到 REST（并可用 REST 结果再次 seed）；
+    - add_listener() 注册回调，每条消息以 {symbol: price}（仅本条消息中变化的交易对）调用。
+    """
+
+    def __init__(self, prices: Optional[Dict[str, float]] = None):
+        self.prices: Dict[str, float] = prices if prices is not None else {}
+        self.last_update: Optional[float] = None
+        self.seeded = False
+        self.messages = 0
+        self.reconnects = 0
+        self._task: asyncio.Task | None = None
+        self._stop = asyncio.Event()
+        self._ws = None
+        self._listeners: List[Callable[[Dict[str, float]], object]] = []
+
+    def add_listener(self, fn: Callable[[Dict[str, float]], object]) -> None:
+        self._listeners.append(fn)
+
+    def seed(self, prices: Dict[str, float]) -> None:
+        """写入一份全量价格（REST）；流中尚未出现的交易对由此获得初值。"""
+        self.prices.update(prices)
+        self.seeded = True
+
+    def is_fresh(self, max_age: float = 5.0) -> bool:
+        return self.seeded and self.last_update is not None and time.monotonic() - self.last_update <= max_age
+
+    def _apply(self, msg) -> None:
+        data = json.loads(msg).get("data")
+        if not isinstance(data, list):
+            return
+        changes: Dict[str, float] = {}
+        for t in data:
+            try:
+                changes[t["s"]] = float(t["c"])
+            except (KeyError, TypeError, ValueError):
+                continue
+        self.prices.update(changes)
+        self.last_update = time.monotonic()
+        for fn in self._listeners:
+            try:
+                fn(changes)
+            except Exception:
+                pass
+
+    async def start(self):
+        url = WS_ENDPOINT + TICKER_STREAM
         backoff = 1.0
         while not self._stop.is_set():
             try:
                 async with websockets.connect(url, ping_interval=20, ping_timeout=20) as ws:
+                    self._ws = ws
                     backoff = 1.0
                     async for msg in ws:
                         if self._stop.is_set():
                             break
+                        self.messages += 1
                         try:
-                            data = json.loads(msg)
-                            k = data.get("data", {}).get("k")
-                            if not k:
-                                continue
-                            if not k.get("x"):
-                                # 未收盘的K线，不处理
-                                continue
-                            sym = k.get("s")
-                            if not sym:
-                                continue
-                            open_time = int(k.get("t"))
-                            o = float(k.get("o"))
-                            h = float(k.get("h"))
-                            l = float(k.get("l"))
-                            c = float(k.get("c"))
-                            q = float(k.get("q", 0.0))
-                            self._cache[sym] = (open_time, o, h, l, c, q)
+                            self._apply(msg)
                         except Exception:
-                            # 忽略单条解析错误
                             continue
             except Exception:
-                # 自动重连，指数退避至 30s 最大
-                await asyncio.sleep(backoff)
-                backoff = min(30.0, backoff * 2.0)
+                pass
+            finally:
+                self._ws = None
+            if self._stop.is_set():
+                break
+            self.reconnects += 1
+            await asyncio.sleep(backoff)
+            backoff = min(30.0, backoff * 2.0)
 
     async def run_in_background(self):
         self._task = asyncio.create_task(self.start())
 
     async def stop(self):
         self._stop.set()
+        if self._ws is not None:
+            try:
+                await self._ws.close()
+            except Exception:
+                pass
         if self._task:
             try:
                 await asyncio.wait_for(self._task, timeout=5)
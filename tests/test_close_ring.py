@@ -0,0 +1,60 @@
+import asyncio
+
+import numpy as np
+
+from benchmarks.synthetic import SyntheticClient, SyntheticMarket
+from realtime_monitor.close_ring import CloseRing
+from realtime_monitor.monitor import SymbolMonitor
+
+WINDOWS = [1, 5, 15, 60]
+
+
+def _monitors():
+    market = SyntheticMarket(20, minutes=900, seed=5)
+    client = SyntheticClient(market, now_minute=700)
+    plain = SymbolMonitor(client, seed_limit=600)  # type: ignore[arg-type]
+    ring = SymbolMonitor(client, seed_limit=600, close_ring=CloseRing(history=64, capacity=8))  # type: ignore[arg-type]
+    return market, client, plain, ring
+
+
+def _assert_maps_equal(a, b):
+    assert a.keys() == b.keys()
+    for s in a:
+        assert a[s].keys() == b[s].keys()
+        np.testing.assert_allclose([a[s][w] for w in sorted(a[s])], [b[s][w] for w in sorted(b[s])], rtol=1e-12)
+
+
+def test_change_map_matches_multi_change_map():
+    market, client, plain, ring = _monitors()
+
+    async def run():
+        await plain.ensure_states(market.symbols)
+        await ring.ensure_states(market.symbols)
+        _assert_maps_equal(ring.multi_change_map(market.symbols, WINDOWS), plain.multi_change_map(market.symbols, WINDOWS))
+        for _ in range(30):
+            client.now_minute += 1
+            await plain.update_many(market.symbols)
+            await ring.update_many(market.symbols)
+            _assert_maps_equal(
+                ring.multi_change_map(market.symbols, WINDOWS), plain.multi_change_map(market.symbols, WINDOWS)
+            )
+
+    asyncio.run(run())
+
+
+def test_change_map_gaps_and_removal():
+    ring = CloseRing(history=16, capacity=2)
+    ring.load("A", [m * 60_000 for m in range(10)], [100.0 + m for m in range(10)])
+    # 跳过 10..11 分钟：缺失的分钟为 NaN，以它们为起点的窗口省略
+    ring.push("A", 12 * 60_000, 120.0)
+    mp = ring.change_map(["A"], [1, 2, 3])
+    assert set(mp["A"]) == {3}
+    assert mp["A"][3] == (120.0 - 109.0) / 109.0 * 100.0
+    # 早于最新分钟的K线忽略
+    ring.push("A", 11 * 60_000, 1.0)
+    assert ring.last_close("A") == 120.0
+    ring.remove("A")
+    assert "A" not in ring and ring.change_map(["A"], [1]) == {}
+    # 行被复用时不残留旧数据
+    ring.push("B", 0, 1.0)
+    assert ring.change_map(["B"], [1]) == {}
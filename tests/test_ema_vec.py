@@ -0,0 +1,73 @@
+import numpy as np
+
+from benchmarks.synthetic import SyntheticMarket
+from realtime_monitor.ema import EMASet, detect_cross
+from realtime_monitor.ema_vec import CROSS_NAMES, EMAMatrix, seed_ema_batch
+
+SEED_CANDLES = 200
+STEPS = 400
+
+
+def _closes(n_symbols: int = 30) -> np.ndarray:
+    # 合成行情带趋势切换，400 根内每个交易对都有多次交叉
+    market = SyntheticMarket(n_symbols, minutes=SEED_CANDLES + STEPS, seed=7)
+    return market.data[:, :, 4]
+
+
+def test_seed_ema_batch_matches_create_seeded():
+    closes = _closes()
+    batch = seed_ema_batch(closes[:, :SEED_CANDLES])
+    for i, row in enumerate(closes[:, :SEED_CANDLES]):
+        expected = EMASet.create_seeded(row).snapshot()
+        np.testing.assert_allclose(batch[i], expected, rtol=1e-12, atol=0)
+    # 单个交易对的一维输入
+    np.testing.assert_allclose(
+        seed_ema_batch(closes[0, :SEED_CANDLES]), EMASet.create_seeded(closes[0, :SEED_CANDLES]).snapshot(), rtol=1e-12, atol=0,
+    )
+
+
+def test_step_matches_emaset_update_and_detect_cross():
+    closes = _closes()
+    symbols = [f"S{i}" for i in range(closes.shape[0])]
+    seeded = seed_ema_batch(closes[:, :SEED_CANDLES])
+    # 从同一组初值出发，逐根推进结果应逐位一致
+    matrix = EMAMatrix(capacity=8)  # 小容量，顺带覆盖扩容
+    sets = {}
+    for s, values in zip(symbols, seeded):
+        matrix.add(s, values)
+        sets[s] = EMASet.from_values(values)
+
+    crosses = 0
+    for t in range(SEED_CANDLES, SEED_CANDLES + STEPS):
+        prev, cur, cross = matrix.step(symbols, closes[:, t])
+        for i, s in enumerate(symbols):
+            p = sets[s].snapshot()
+            c = sets[s].update(float(closes[i, t]))
+            assert tuple(prev[i]) == p
+            assert tuple(cur[i]) == c
+            assert CROSS_NAMES.get(int(cross[i])) == detect_cross(p, c)
+            crosses += cross[i] != 0
+    assert crosses > 0
+    for s in symbols:
+        assert matrix.row(s).snapshot() == sets[s].snapshot()
+
+
+def test_step_subset_and_removal():
+    closes = _closes(6)
+    symbols = [f"S{i}" for i in range(closes.shape[0])]
+    matrix = EMAMatrix(capacity=4)
+    seeded = seed_ema_batch(closes[:, :SEED_CANDLES])
+    sets = {s: EMASet.from_values(v) for s, v in zip(symbols, seeded)}
+    for s, v in zip(symbols, seeded):
+        matrix.add(s, v)
+    matrix.remove("S2")
+    assert "S2" not in matrix and len(matrix) == 5
+    # 每分钟只推进有新收盘的部分交易对，未推进的行保持不变
+    for t in range(SEED_CANDLES, SEED_CANDLES + 50):
+        batch = [s for j, s in enumerate(symbols) if s != "S2" and (t + j) % 2 == 0]
+        matrix.step(batch, [closes[int(s[1:]), t] for s in batch])
+        for s in batch:
+            sets[s].update(float(closes[int(s[1:]), t]))
+    for s in symbols:
+        if s != "S2":
+            assert matrix.row(s).snapshot() == sets[s].snapshot()
@@ -0,0 +1,43 @@
+import sqlite3
+
+from realtime_monitor.history import AlertHistory
+
+
+def _event(**kw):
+    ev = {"ts": 1_767_225_600, "symbol": "BTCUSDT", "kind": "tip", "open_time": 1_767_225_600_000, "price": 1.0, "message": "x"}
+    ev.update(kw)
+    return ev
+
+
+def test_reimport_without_direction_is_idempotent(tmp_path):
+    hist = AlertHistory(str(tmp_path / "alerts.db"))
+    batch = [_event(direction=None), _event(direction=""), _event(kind="signal", direction="up")]
+    assert hist.insert_many(batch) == 2
+    assert hist.insert_many(batch) == 0
+    assert hist.count() == 2
+    hist.close()
+
+
+def test_migrates_null_direction_duplicates(tmp_path):
+    path = str(tmp_path / "alerts.db")
+    # 旧版本的表：direction 可为 NULL，唯一索引对 NULL 不去重
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(
+            "CREATE TABLE alerts (id INTEGER PRIMARY KEY, ts INTEGER, ts_iso TEXT, symbol TEXT NOT NULL,"
+            " timeframe TEXT NOT NULL DEFAULT '1m', strategy TEXT NOT NULL DEFAULT 'ema_cross', kind TEXT NOT NULL,"
+            " direction TEXT, open_time INTEGER NOT NULL, price REAL, ema21 REAL, high REAL, low REAL,"
+            " quote_volume REAL, confirm_candles INTEGER, message TEXT)"
+        )
+        conn.execute(
+            "CREATE UNIQUE INDEX alerts_uniq_key ON alerts (symbol, timeframe, strategy, kind, direction, open_time)"
+        )
+        for _ in range(3):
+            conn.execute(
+                "INSERT INTO alerts (symbol, kind, direction, open_time) VALUES ('ETHUSDT', 'tip', NULL, 60000)"
+            )
+    conn.close()
+    hist = AlertHistory(path)
+    assert hist.count() == 1
+    assert hist.insert_many([_event(symbol="ETHUSDT", open_time=60000, ts=60)]) == 0
+    hist.close()
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from realtime_monitor.kline_store import KlineStore
+
+MINUTE_MS = 60_000
+
+
+def _row(i: int) -> list:
+    return [i * MINUTE_MS, 1.0, 2.0, 0.5, float(i), 10.0]
+
+
+def test_failed_write_keeps_rows_queued(tmp_path, monkeypatch):
+    store = KlineStore(str(tmp_path))
+    store.append("BTCUSDT", np.array([_row(0), _row(1)]))
+    store._thread = object()  # 模拟已 start()：append_row 只排队
+    for i in range(2, 5):
+        assert store.append_row("BTCUSDT", _row(i))
+
+    real_open = open
+
+    def failing_open(path, mode="r", *args, **kwargs):
+        if "a" in mode:
+            raise OSError(28, "No space left on device")
+        return real_open(path, mode, *args, **kwargs)
+
+    monkeypatch.setattr("builtins.open", failing_open)
+    with pytest.raises(OSError):
+        store.flush()
+    # 写入期间继续排队的行接在失败的批次之后
+    assert store.append_row("BTCUSDT", _row(5))
+    monkeypatch.setattr("builtins.open", real_open)
+
+    assert store.last_open_time("BTCUSDT") == 5 * MINUTE_MS
+    store.flush()
+    store._thread = None
+    data = store.read("BTCUSDT")
+    assert data[:, 4].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0, 5.0]
+    # 新实例从文件读到的末行与内存一致，sync_tail 不会留下缺口
+    assert KlineStore(str(tmp_path)).last_open_time("BTCUSDT") == 5 * MINUTE_MS
+
+
+def test_append_read_range_and_tail(tmp_path):
+    store = KlineStore(str(tmp_path))
+    assert store.last_open_time("ETHUSDT") is None
+    assert store.append("ETHUSDT", np.array([_row(i) for i in range(5)])) == 5
+    # 不晚于本地最后一根的行被丢弃
+    assert store.append("ETHUSDT", np.array([_row(3), _row(4), _row(5)])) == 1
+    with pytest.raises(ValueError):
+        store.append("ETHUSDT", np.array([_row(8), _row(7)]))
+    assert store.count("ETHUSDT") == 6
+    assert store.range("ETHUSDT", 2 * MINUTE_MS, 4 * MINUTE_MS)[:, 4].tolist() == [2.0, 3.0, 4.0]
+    assert store.tail("ETHUSDT", 2)[:, 4].tolist() == [4.0, 5.0]
+    assert store.symbols() == ["ETHUSDT"]
+
+
+def test_queued_rows_visible_before_background_flush(tmp_path):
+    store = KlineStore(str(tmp_path), flush_interval=3600).start()
+    try:
+        store.append("BTCUSDT", np.array([_row(0)]))
+        for i in range(1, 4):
+            assert store.append_row("BTCUSDT", _row(i))
+        assert not store.append_row("BTCUSDT", _row(2))
+        assert store.last_open_time("BTCUSDT") == 3 * MINUTE_MS
+        # 读取前先写出该交易对的排队行
+        assert store.tail("BTCUSDT", 10)[:, 4].tolist() == [0.0, 1.0, 2.0, 3.0]
+        # append() 排在已排队的行之后
+        store.append_row("BTCUSDT", _row(4))
+        assert store.append("BTCUSDT", np.array([_row(4), _row(5)])) == 1
+        store.append_row("BTCUSDT", _row(6))
+    finally:
+        store.close()
+    assert KlineStore(str(tmp_path)).read("BTCUSDT")[:, 4].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
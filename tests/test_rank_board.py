@@ -0,0 +1,55 @@
+import numpy as np
+
+from realtime_monitor.symbols import RankBoard, rank_top
+
+N = 120
+
+
+def _market(seed: int = 3):
+    rng = np.random.default_rng(seed)
+    symbols = [f"S{i:03d}USDT" for i in range(N)]
+    baselines = {s: float(b) for s, b in zip(symbols, rng.uniform(0.5, 100.0, N))}
+    return rng, symbols, baselines
+
+
+def _assert_same(board: RankBoard, symbols, baselines, prices, n: int = 20):
+    gain, lose = rank_top(symbols, baselines, prices, topn=n)
+    assert board.top(n) == gain
+    assert board.bottom(n) == lose
+
+
+def test_incremental_updates_match_rank_top():
+    rng, symbols, baselines = _market()
+    prices = {s: b * float(rng.uniform(0.8, 1.2)) for s, b in baselines.items()}
+    board = RankBoard(baselines)
+    board.update_prices(prices)
+    _assert_same(board, symbols, baselines, prices)
+    for _ in range(200):
+        # 小批量变价走二分插入，偶尔大批量变价走整体重排
+        k = int(rng.integers(1, 5)) if rng.random() < 0.9 else N // 2
+        changed = {s: prices[s] * float(rng.uniform(0.97, 1.03)) for s in rng.choice(symbols, size=k, replace=False)}
+        prices.update(changed)
+        board.update_prices(changed)
+        _assert_same(board, symbols, baselines, prices)
+    # 单个交易对更新
+    s = symbols[7]
+    prices[s] = baselines[s] * 5
+    assert board.update(s, prices[s])
+    assert not board.update(s, prices[s])
+    _assert_same(board, symbols, baselines, prices)
+
+
+def test_set_baselines_reranks_existing_prices():
+    rng, symbols, baselines = _market(5)
+    prices = {s: b * float(rng.uniform(0.8, 1.2)) for s, b in baselines.items()}
+    board = RankBoard(baselines)
+    board.update_prices(prices)
+    # 跨日：新基准中缺少部分交易对，其余基准改变
+    new_baselines = {s: prices[s] * float(rng.uniform(0.9, 1.1)) for s in symbols[: N - 10]}
+    board.set_baselines(new_baselines)
+    assert len(board) == N - 10
+    _assert_same(board, symbols, new_baselines, prices)
+    changed = {s: prices[s] * 1.01 for s in symbols[::7]}
+    prices.update(changed)
+    board.update_prices(changed)
+    _assert_same(board, symbols, new_baselines, prices)
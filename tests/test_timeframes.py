@@ -0,0 +1,76 @@
+import numpy as np
+
+from benchmarks.synthetic import SyntheticMarket
+from realtime_monitor.ema import EMASet
+from realtime_monitor.timeframes import TimeframeAggregator, aggregate_bars
+
+MINUTE_MS = 60_000
+
+
+def _bars(minutes, closes=None):
+    # 人工 1m K线：openTime 为 minutes 中的分钟数
+    rows = []
+    for i, m in enumerate(minutes):
+        c = float(closes[i]) if closes is not None else float(m)
+        rows.append([m * MINUTE_MS, c - 0.5, c + 1.0, c - 1.0, c, 1.0])
+    return np.array(rows, dtype=np.float64)
+
+
+def test_aggregate_bars_drops_partial_and_gapped_buckets():
+    # 分钟 3..19：首个桶 [0,5) 从中途开始；桶 [10,15) 缺第 12 分钟；末桶 [15,20) 完整
+    minutes = [m for m in range(3, 20) if m != 12] + [20, 21]
+    closed, forming = aggregate_bars(_bars(minutes), 5)
+    assert closed[:, 0].tolist() == [5 * MINUTE_MS, 15 * MINUTE_MS]
+    first = closed[0]
+    assert first[1] == 4.5 and first[4] == 9.0  # open 取首分钟开盘，close 取末分钟收盘
+    assert first[2] == 10.0 and first[3] == 4.0
+    assert first[5] == 5.0
+    # 末尾 [20,25) 只有两分钟，作为正在形成的K线返回
+    assert forming is not None and forming[0] == 20 * MINUTE_MS and forming[4] == 21.0
+
+
+def _market_rows(minutes: int) -> np.ndarray:
+    m = SyntheticMarket(1, minutes=minutes, seed=11)
+    arr = m.data[0].copy()
+    # 对齐到 5m 起点，便于对照
+    start = int(np.argmax(arr[:, 0] % (5 * MINUTE_MS) == 0))
+    return arr[start:]
+
+
+def _expected_ema(arr: np.ndarray, minutes: int):
+    closed, _ = aggregate_bars(arr, minutes)
+    return EMASet.create_seeded(closed[:, 4].tolist()).snapshot()
+
+
+def test_on_kline_matches_batch_aggregation():
+    arr = _market_rows(2000)
+    agg = TimeframeAggregator(["5m", "15m"])
+    agg.seed("X", arr[:500])
+    assert agg.stats()["5m"] == {"ready": 1, "warming": 0}
+    assert agg.stats()["15m"]["ready"] == 0
+    for row in arr[500:]:
+        agg.on_kline("X", tuple(row.tolist()))
+    np.testing.assert_allclose(agg.monitors["5m"].states["X"].ema.snapshot(), _expected_ema(arr, 5), rtol=1e-9)
+    # 15m 先以 seed 的K线预热，收齐 83 根后就绪
+    np.testing.assert_allclose(agg.monitors["15m"].states["X"].ema.snapshot(), _expected_ema(arr, 15), rtol=1e-9)
+
+
+def test_on_kline_skips_gapped_bucket_and_mid_bucket_start():
+    arr = _market_rows(800)
+    agg = TimeframeAggregator(["5m"])
+    agg.seed("X", arr[:500])
+    # 流中缺一分钟（位于某个 5m 桶中间），该桶不参与判断
+    gap = 502
+    assert int(arr[gap, 0]) % (5 * MINUTE_MS) != 0
+    stream = np.delete(arr[500:], gap - 500, axis=0)
+    for row in stream:
+        agg.on_kline("X", tuple(row.tolist()))
+    full = np.concatenate([arr[:500], stream])
+    np.testing.assert_allclose(agg.monitors["5m"].states["X"].ema.snapshot(), _expected_ema(full, 5), rtol=1e-9)
+
+    # 从未 seed 的交易对从桶中途开始推送：前面不完整的桶丢弃，之后的桶进入预热
+    fresh = TimeframeAggregator(["5m"])
+    for row in arr[2:2 + 5 * 10]:
+        fresh.on_kline("Y", tuple(row.tolist()))
+    assert fresh.stats()["5m"] == {"ready": 0, "warming": 1}
+    assert len(fresh._warmup["5m"]["Y"]) == 9